@@ -1,33 +1,116 @@
 # database_orm.py
 # Importações de bibliotecas padrão e de terceiros
 import os
-from datetime import datetime
+import csv
+import io
+from contextlib import contextmanager
+from functools import lru_cache
 from dotenv import load_dotenv
-from urllib.parse import quote_plus
 
 # Importações do SQLAlchemy para ORM
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, ForeignKey, Table
-from sqlalchemy.orm import sessionmaker, relationship, declarative_base, joinedload
+from sqlalchemy import create_engine, event, insert, make_url, select, Column, Integer, String, Text, DateTime, ForeignKey, Table, Index
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.engine import URL
+from sqlalchemy.sql import func
+from sqlalchemy.orm import sessionmaker, scoped_session, relationship, declarative_base, selectinload, raiseload
 
 # --- Configuração do banco de dados ---
-load_dotenv()  # Carrega variáveis do .env
-db_user = os.getenv("DB_USER")
-raw_password = os.getenv("DB_PASSWORD")
-db_host = os.getenv("DB_HOST")
-db_port = os.getenv("DB_PORT")
-db_name = os.getenv("DB_NAME")
-db_password = None if raw_password == None else quote_plus(raw_password)  # Codifica a senha para uso na URL
-DATABASE_URL = f"postgresql://{db_user}:{db_password}@{db_host}:{db_port}/{db_name}"
-
-DATABASE_URL = os.getenv("DATABASE_URL", DATABASE_URL)  # Permite sobrescrever via .env
- 
-# Cria o engine de conexão e a fábrica de sessões
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# O engine e a fábrica de sessões são criados sob demanda (no primeiro acesso), e não no import:
+# quem só precisa dos modelos não paga a leitura do .env nem a criação do pool.
+
+@lru_cache(maxsize=1)
+def get_database_url():
+    """Monta a URL do banco a partir do .env (DATABASE_URL sobrescreve as variáveis DB_*)."""
+    load_dotenv()  # Carrega variáveis do .env
+    database_url = os.getenv("DATABASE_URL")  # Permite sobrescrever via .env
+    if database_url:
+        return database_url
+
+    db_port = os.getenv("DB_PORT")
+    # URL.create faz o escape de usuário/senha (ex.: '@', ':' ou '/' na senha) e fixa o driver psycopg2
+    return URL.create(
+        "postgresql+psycopg2",
+        username=os.getenv("DB_USER"),
+        password=os.getenv("DB_PASSWORD"),
+        host=os.getenv("DB_HOST"),
+        port=int(db_port) if db_port else None,
+        database=os.getenv("DB_NAME"),
+    )
+
+@lru_cache(maxsize=1)
+def get_engine():
+    """Cria (uma única vez) o engine de conexão."""
+    database_url = get_database_url()
+    # insertmanyvalues_page_size: quantas linhas vão em cada INSERT multi-VALUES nos inserts em lote
+    engine_options = {
+        'insertmanyvalues_page_size': 1000,
+        # Pool: cada thread de cliente usa uma sessão própria, então o pool precisa acompanhar a concorrência
+        'pool_size': 30,
+        'max_overflow': 10,
+        'pool_pre_ping': True,  # Descarta conexões derrubadas pelo servidor antes de usá-las
+        'pool_recycle': 3600,   # Recicla conexões com mais de 1 hora
+    }
+    if make_url(database_url).drivername in ('postgresql', 'postgresql+psycopg2'):
+        # Fast execution helpers do psycopg2: executemany de UPDATE/DELETE vira execute_batch
+        engine_options['executemany_mode'] = 'values_plus_batch'
+        engine_options['executemany_batch_page_size'] = 500
+    return create_engine(database_url, **engine_options)
+
+def _raiseload_everything(orm_execute_state):
+    """Aplica raiseload("*") às consultas de topo (não aos lazy loads em si)."""
+    if (
+        orm_execute_state.is_select
+        and not orm_execute_state.is_column_load
+        and not orm_execute_state.is_relationship_load
+    ):
+        orm_execute_state.statement = orm_execute_state.statement.options(raiseload("*"))
+
+@lru_cache(maxsize=1)
+def get_sessionmaker():
+    """Cria (uma única vez) a fábrica de sessões ligada ao engine."""
+    session_factory = sessionmaker(autocommit=False, autoflush=False, bind=get_engine())
+    # Em desenvolvimento (DB_RAISELOAD=true) qualquer lazy load não previsto levanta erro em vez de
+    # disparar um SELECT silencioso (N+1). Em produção não há custo: o listener nem é registrado.
+    if os.getenv("DB_RAISELOAD", "false").lower() == "true":
+        event.listen(session_factory, "do_orm_execute", _raiseload_everything)
+    return session_factory
+
+@lru_cache(maxsize=1)
+def get_thread_sessions():
+    """Registro de sessões por thread: cada thread reaproveita a mesma Session entre requisições."""
+    return scoped_session(get_sessionmaker())
+
+@contextmanager
+def read_session():
+    """
+    Session da thread atual para consultas somente leitura.
+    Ao sair, close() encerra a transação e devolve a conexão ao pool, mas o objeto
+    Session continua na thread para a próxima requisição (não é recriado a cada uso).
+    """
+    session = get_thread_sessions()()
+    try:
+        yield session
+    finally:
+        session.close()
+
+def __getattr__(name):
+    """Mantém `engine`, `SessionLocal` e `DATABASE_URL` importáveis como antes, mas criados sob demanda."""
+    if name == "SessionLocal":
+        return get_sessionmaker()
+    if name == "engine":
+        return get_engine()
+    if name == "DATABASE_URL":
+        return get_database_url()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 Base = declarative_base()  # Classe base para os modelos ORM
 
 # --- Definição dos Modelos ---
 
+# Tamanhos máximos das colunas de texto limitadas (validados também nos endpoints)
+MAX_USERNAME_LENGTH = 64
+MAX_GROUP_NAME_LENGTH = 128
+
 # Tabela de associação para relacionamento muitos-para-muitos entre User e Grupo
 user_group_association = Table(
     "user_group_association",
@@ -39,60 +122,172 @@ user_group_association = Table(
 class User(Base):
     __tablename__ = "users"
     id = Column(Integer, primary_key=True, index=True)
-    username = Column(String, unique=True, nullable=False)
-    password_hash = Column(String, nullable=False)
+    username = Column(String(MAX_USERNAME_LENGTH), unique=True, nullable=False, index=True)
+    password_hash = Column(String(128), nullable=False)  # hash bcrypt tem 60 caracteres
     
     # Um usuário pode enviar muitas mensagens (um-para-muitos)
-    sent_messages = relationship("Message", back_populates="sender")
+    # lazy="dynamic": coleção sem limite, acessada como query (filtro/paginação) em vez de carregar tudo
+    sent_messages = relationship("Message", back_populates="sender", lazy="dynamic")
     # Um usuário pode participar de vários grupos (muitos-para-muitos)
     groups = relationship("Grupo", secondary=user_group_association, back_populates="members")
 
 class Grupo(Base):
     __tablename__ = "grupos"
     id = Column(Integer, primary_key=True, index=True)
-    name = Column(String, nullable=False, unique=False)
-    created_at = Column(DateTime, default=datetime.now)
+    name = Column(String(MAX_GROUP_NAME_LENGTH), nullable=False, unique=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)  # Preenchido pelo banco
 
     # Um grupo pode ter vários membros (muitos-para-muitos)
-    members = relationship("User", secondary=user_group_association, back_populates="groups")
+    # lazy="selectin": carrega os membros de todos os grupos da consulta com um único SELECT ... IN
+    members = relationship("User", secondary=user_group_association, back_populates="groups", lazy="selectin")
     # Um grupo pode ter várias mensagens (um-para-muitos)
-    messages = relationship("Message", back_populates="group")
+    # lazy="dynamic": coleção sem limite, acessada como query (filtro/paginação) em vez de carregar tudo
+    messages = relationship("Message", back_populates="group", lazy="dynamic")
 
 class Message(Base):
     __tablename__ = "messages"
     id = Column(Integer, primary_key=True, index=True)
-    content = Column(String, nullable=False)
-    timestamp = Column(DateTime, default=datetime.now)
+    content = Column(Text, nullable=False)
+    timestamp = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)  # Preenchido pelo banco
     
     # Cada mensagem tem um remetente (usuário) - muitos-para-um
-    sender_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    sender = relationship("User", back_populates="sent_messages")
+    sender_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    # lazy="joined": o remetente sempre é exibido junto com a mensagem
+    sender = relationship("User", back_populates="sent_messages", lazy="joined")
 
     # Cada mensagem pertence a um grupo - muitos-para-um
     group_id = Column(Integer, ForeignKey("grupos.id"), nullable=False)
-    group = relationship("Grupo", back_populates="messages")
+    group = relationship("Grupo", back_populates="messages", lazy="joined")
+
+    # Índice para "últimas N mensagens do grupo X" (filtro por grupo + ordenação por data)
+    __table_args__ = (
+        Index("ix_messages_group_time", "group_id", "timestamp"),
+    )
 
 # --- Funções de Operação Seguras ---
 
 def create_tables():
     """Cria as tabelas no banco de dados conforme os modelos definidos."""
-    Base.metadata.create_all(bind=engine)
+    Base.metadata.create_all(bind=get_engine())
     print("Tabelas verificadas/criadas com sucesso.")
 
-def add_user(session, username, password_hash):
-    """Verifica se o usuário existe e adiciona se não existir."""
-    existing_user = session.query(User).filter(User.username == username).first()
-    if existing_user:
+def get_group_with_members(session, name):
+    """Busca um grupo pelo nome já com os membros carregados; outros relacionamentos levantam erro se acessados."""
+    return (
+        session.query(Grupo)
+        .options(selectinload(Grupo.members), raiseload("*"))
+        .filter_by(name=name)
+        .first()
+    )
+
+# --- Consultas de leitura dos endpoints (só colunas, sem instanciar objetos ORM) ---
+
+def get_user_chats(session, user_id):
+    """
+    Lista os grupos do usuário com os membros de cada um em um único SELECT de colunas.
+    Retorna uma lista de dicts {'id', 'name', 'members'} ou None se o usuário não existir.
+    """
+    user_groups = user_group_association.alias("user_groups")
+    group_members = user_group_association.alias("group_members")
+    rows = session.execute(
+        select(Grupo.id, Grupo.name, User.id, User.username)
+        .select_from(user_groups)
+        .join(Grupo, Grupo.id == user_groups.c.group_id)
+        .join(group_members, group_members.c.group_id == Grupo.id)
+        .join(User, User.id == group_members.c.user_id)
+        .where(user_groups.c.user_id == user_id)
+        .order_by(Grupo.id)
+    ).all()
+    if not rows and session.scalar(select(User.id).where(User.id == user_id)) is None:
+        return None
+
+    chats = {}
+    for group_id, group_name, member_id, member_username in rows:
+        chat = chats.get(group_id)
+        if chat is None:
+            chat = chats[group_id] = {'id': group_id, 'name': group_name, 'members': []}
+        chat['members'].append({'id': member_id, 'username': member_username})
+    return list(chats.values())
+
+def get_group_messages(session, group_id):
+    """
+    Lista as mensagens do grupo (id, remetente, conteúdo, data) em ordem cronológica.
+    'timestamp' é devolvido como datetime; a serialização JSON o converte para ISO 8601.
+    Retorna None se o grupo não existir.
+    """
+    # Um único SELECT: o LEFT JOIN a partir do grupo devolve uma linha com colunas nulas
+    # quando o grupo existe mas não tem mensagens, e nenhuma linha quando ele não existe
+    rows = session.execute(
+        select(Message.id, User.username, Message.content, Message.timestamp)
+        .select_from(Grupo)
+        .outerjoin(Message, Message.group_id == Grupo.id)
+        .outerjoin(User, Message.sender_id == User.id)
+        .where(Grupo.id == group_id)
+        .order_by(Message.timestamp, Message.id)  # Usa o índice ix_messages_group_time
+    ).all()
+    if not rows:
+        return None
+    return [
+        {'id': message_id, 'sender': sender, 'content': content, 'timestamp': timestamp}
+        for message_id, sender, content, timestamp in rows
+        if message_id is not None
+    ]
+
+def get_recent_group_messages(session, group_name, limit=10):
+    """
+    Últimas `limit` mensagens do grupo com esse nome, em ordem cronológica, em um único SELECT de colunas.
+    Cada item traz também 'group_id' e 'group_name'. Retorna [] se o grupo não existir.
+    """
+    # Nomes de grupo não são únicos: usa o de menor id
+    group_id = select(Grupo.id).where(Grupo.name == group_name).order_by(Grupo.id).limit(1).scalar_subquery()
+    rows = session.execute(
+        select(Message.id, User.username, Message.content, Message.timestamp, Message.group_id)
+        .join(User, Message.sender_id == User.id)
+        .where(Message.group_id == group_id)
+        .order_by(Message.timestamp.desc(), Message.id.desc())
+        .limit(limit)
+    ).all()
+    return [
+        {'id': message_id, 'sender': sender, 'content': content, 'timestamp': timestamp,
+         'group_id': message_group_id, 'group_name': group_name}
+        for message_id, sender, content, timestamp, message_group_id in reversed(rows)
+    ]
+
+def get_group_member_list(session, group_id):
+    """Lista os membros do grupo como dicts {'id', 'username'}. Retorna None se o grupo não existir."""
+    rows = session.execute(
+        select(User.id, User.username)
+        .join(user_group_association, user_group_association.c.user_id == User.id)
+        .where(user_group_association.c.group_id == group_id)
+    ).all()
+    if not rows and session.scalar(select(Grupo.id).where(Grupo.id == group_id)) is None:
+        return None
+    return [{'id': user_id, 'username': username} for user_id, username in rows]
+
+def add_user(session, username, password_hash, commit=False):
+    """Adiciona o usuário se não existir, retornando o existente em caso de conflito.
+
+    Com commit=False apenas deixa o INSERT na transação corrente e o
+    COMMIT fica para quem chamou.
+    """
+    # INSERT ... ON CONFLICT DO NOTHING RETURNING: verificação e inserção atômicas em uma ida ao banco
+    stmt = (
+        pg_insert(User)
+        .values(username=username, password_hash=password_hash)
+        .on_conflict_do_nothing(index_elements=['username'])
+        .returning(User)
+    )
+    new_user = session.scalars(stmt).first()
+    if new_user is None:
         print(f"Usuário '{username}' já existe.")
-        return existing_user
+        return session.execute(select(User).filter_by(username=username)).scalar_one()
     
-    new_user = User(username=username, password_hash=password_hash)
-    session.add(new_user)
-    session.commit()
+    if commit:
+        session.commit()
     print(f"Usuário '{username}' adicionado.")
     return new_user
 
-def add_group(session, name):
+def add_group(session, name, commit=False):
     """Verifica se o grupo existe e adiciona se não existir."""
     existing_group = session.query(Grupo).filter(Grupo.name == name).first()
     if existing_group:
@@ -101,29 +296,83 @@ def add_group(session, name):
         
     new_group = Grupo(name=name)
     session.add(new_group)
-    session.commit()
+    if commit:
+        session.commit()
+    else:
+        session.flush()
     print(f"Grupo '{name}' adicionado.")
     return new_group
 
-def add_user_to_group(session, user, group):
+def add_user_to_group(session, user, group, commit=False):
     """Adiciona um usuário a um grupo se ele ainda não for membro."""
-    if user not in group.members:
-        group.members.append(user)
-        session.commit()
+    # Consulta direta na tabela de associação (usa a PK composta) em vez de varrer group.members
+    is_member = session.query(user_group_association).filter_by(user_id=user.id, group_id=group.id).first()
+    if is_member is None:
+        session.execute(user_group_association.insert().values(user_id=user.id, group_id=group.id))
+        if commit:
+            session.commit()
         print(f"Usuário '{user.username}' adicionado ao grupo '{group.name}'.")
     else:
         print(f"Usuário '{user.username}' já é membro do grupo '{group.name}'.")
 
-def add_message(session, user, group, content):
+def add_message(session, user, group, content, commit=False):
     """Adiciona uma nova mensagem a um grupo."""
     new_message = Message(sender_id=user.id, group_id=group.id, content=content)
     session.add(new_message)
-    session.commit()
+    if commit:
+        session.commit()
+    else:
+        session.flush()
     print(f"Mensagem de '{user.username}' adicionada ao grupo '{group.name}'.")
+    return new_message
+
+def add_messages_bulk(session, rows):
+    """
+    Insere várias mensagens de uma vez via Core insert (sem unit-of-work do ORM).
+    rows é uma lista de dicts com 'sender_id', 'group_id' e 'content'.
+    Não faz commit; quem chamou decide quando confirmar a transação.
+    """
+    if not rows:
+        return 0
+    if len(rows) >= COPY_THRESHOLD:
+        return bulk_load_messages_copy(session, rows)
+    session.execute(insert(Message), rows)
+    print(f"{len(rows)} mensagens adicionadas em lote.")
+    return len(rows)
+
+# A partir deste número de linhas o COPY compensa mais que o INSERT multi-VALUES
+COPY_THRESHOLD = 10000
+
+def bulk_load_messages_copy(session, rows):
+    """
+    Carrega muitas mensagens via COPY FROM STDIN (caminho nativo do PostgreSQL para cargas grandes).
+    rows segue o formato de add_messages_bulk; 'timestamp' é opcional e, se ausente, o banco usa now().
+    Roda na transação da sessão, sem commit.
+    """
+    if not rows:
+        return 0
+    columns = ['sender_id', 'group_id', 'content']
+    if 'timestamp' in rows[0]:
+        columns.append('timestamp')
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([row[column] for column in columns])
+    buffer.seek(0)
+
+    cursor = session.connection().connection.cursor()
+    try:
+        cursor.copy_expert(f"COPY {Message.__tablename__} ({', '.join(columns)}) FROM STDIN WITH CSV", buffer)
+    finally:
+        cursor.close()
+    print(f"{len(rows)} mensagens carregadas via COPY.")
+    return len(rows)
 
 def populate_initial_data():
-    """Popula o banco com dados iniciais de exemplo."""
-    with SessionLocal() as session:
+    """Popula o banco com dados iniciais de exemplo em uma única transação."""
+    # SessionLocal.begin() emite um único COMMIT ao sair do bloco (ou ROLLBACK em caso de erro)
+    with get_sessionmaker().begin() as session:
         print("\n--- Populando dados iniciais ---")
         
         # 1. Cria os usuários
@@ -138,9 +387,13 @@ def populate_initial_data():
         add_user_to_group(session, user_bruno, grupo_geral)
         
         # 4. Adiciona mensagens ao grupo (apenas se o grupo estiver vazio)
-        if not grupo_geral.messages:
-             add_message(session, user_ana, grupo_geral, "Oi pessoal, bem-vindos ao novo grupo!")
-             add_message(session, user_bruno, grupo_geral, "Olá, Ana! Que legal que agora temos grupos.")
+        # Verifica só se existe alguma mensagem, sem carregar a coleção inteira
+        has_messages = session.query(Message.id).filter_by(group_id=grupo_geral.id).limit(1).scalar() is not None
+        if not has_messages:
+            add_messages_bulk(session, [
+                {'sender_id': user_ana.id, 'group_id': grupo_geral.id, 'content': "Oi pessoal, bem-vindos ao novo grupo!"},
+                {'sender_id': user_bruno.id, 'group_id': grupo_geral.id, 'content': "Olá, Ana! Que legal que agora temos grupos."},
+            ])
         else:
             print("O grupo já possui mensagens. Nenhuma mensagem de exemplo foi adicionada.")
 
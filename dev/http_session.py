@@ -0,0 +1,20 @@
+#!/usr/bin/env python3
+"""Shared requests session setup for the dev test scripts"""
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Transient errors (resets, cold starts) are retried twice with a short backoff
+DEFAULT_RETRY = Retry(total=2, backoff_factor=0.3)
+JSON_HEADERS = {'Content-Type': 'application/json', 'Connection': 'keep-alive'}
+
+def make_session(pool_connections=10, pool_maxsize=10, max_retries=DEFAULT_RETRY, headers=None):
+    """Session that keeps connections alive between calls instead of a new TCP/TLS handshake per request"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=max_retries)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    if headers:
+        session.headers.update(headers)
+    return session
@@ -6,30 +6,37 @@ Run all available tests for the chat backend
 import subprocess
 import sys
 import os
-import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 def run_test(test_file, description):
-    """Run a single test file"""
-    print(f"\n{'='*60}")
-    print(f"RUNNING: {description}")
-    print(f"{'='*60}")
-    
+    """Run a single test file, capturing its output"""
     try:
-        result = subprocess.run([sys.executable, test_file], 
-                              capture_output=False, 
+        result = subprocess.run([sys.executable, os.path.abspath(test_file)], 
+                              capture_output=True, 
                               text=True, 
                               cwd=os.path.dirname(os.path.abspath(__file__)))
-        
-        if result.returncode == 0:
-            print(f"✅ {description} - PASSED")
-        else:
-            print(f"❌ {description} - FAILED (exit code: {result.returncode})")
-        
-        return result.returncode == 0
+        return result.returncode, result.stdout, result.stderr
         
     except Exception as e:
-        print(f"❌ {description} - ERROR: {e}")
-        return False
+        return None, "", f"ERROR: {e}"
+
+def report_test(description, returncode, stdout, stderr):
+    """Print the captured output of a finished test in one block, plus its verdict"""
+    # One write per stream keeps the output of concurrent tests from interleaving
+    sys.stdout.write(f"\n{'='*60}\nRUNNING: {description}\n{'='*60}\n{stdout}\n")
+    sys.stdout.flush()
+    if stderr:
+        sys.stderr.write(stderr)
+        sys.stderr.flush()
+    
+    if returncode == 0:
+        print(f"✅ {description} - PASSED")
+    elif returncode is None:
+        print(f"❌ {description} - ERROR")
+    else:
+        print(f"❌ {description} - FAILED (exit code: {returncode})")
+    
+    return returncode == 0
 
 def main():
     """Run all tests"""
@@ -38,26 +45,51 @@ def main():
     
     input("\nPress Enter to continue, or Ctrl+C to abort...")
     
+    # Independent tests run concurrently
     tests = [
-        ("dev/test_basic.py", "Basic Endpoints & System Control"),
         ("dev/test_user_groups.py", "User-Group Management"), 
         ("dev/test_notifications.py", "Long-Polling & Notifications"),
-        ("dev/test_edge_cases.py", "Error Conditions & Edge Cases"),
         ("dev/test_create_chat.py", "Create chat endpoint tests"),
         ("dev/test_chat_integration.py", "Comprehensive chat integration tests"),
         ("dev/test_subscribe_user.py", "User subscription and notifications"),
         ("dev/test_cors.py", "CORS and preflight tests"),
         ("dev/test_get_endpoints.py", "GET endpoints with query parameters"),
     ]
+    # These call /fall and /revive, which would make concurrent tests fail with 503,
+    # so they run one at a time after the parallel batch
+    stateful_tests = [
+        ("dev/test_basic.py", "Basic Endpoints & System Control"),
+        ("dev/test_edge_cases.py", "Error Conditions & Edge Cases"),
+    ]
     
     passed = 0
     total = 0
+    failed = []
     
+    available = []
     for test_file, description in tests:
+        if os.path.exists(test_file):
+            available.append((test_file, description))
+        else:
+            print(f"⚠️  Test file {test_file} not found, skipping...")
+    
+    if available:
+        with ThreadPoolExecutor(max_workers=len(available)) as executor:
+            futures = {executor.submit(run_test, f, d): d for f, d in available}
+            for future in as_completed(futures):
+                total += 1
+                if report_test(futures[future], *future.result()):
+                    passed += 1
+                else:
+                    failed.append(futures[future])
+    
+    for test_file, description in stateful_tests:
         if os.path.exists(test_file):
             total += 1
-            if run_test(test_file, description):
+            if report_test(description, *run_test(test_file, description)):
                 passed += 1
+            else:
+                failed.append(description)
         else:
             print(f"⚠️  Test file {test_file} not found, skipping...")
     
@@ -73,7 +105,9 @@ def main():
         print("🎉 ALL TESTS PASSED!")
         return True
     else:
-        print(f"❌ {total - passed} test(s) failed")
+        print(f"❌ {total - passed} test(s) failed:")
+        for description in failed:
+            print(f"   - {description}")
         return False
 
 if __name__ == "__main__":
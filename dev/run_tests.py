@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Run the login, notification, subscription and register suites in one process
+
+Unlike run_all_tests.py, which starts one interpreter per test file, this
+imports the suites once and runs them on a shared thread pool, so the
+imports, the sessions and their keep-alive connections are reused.
+"""
+
+import argparse
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import test_login
+import test_notifications
+import test_register
+import test_subscribe_user
+import test_subscribe_user_send
+
+DEFAULT_BASE_URL = "https://bondy-backend-python-mi3a.onrender.com"
+
+SUITES = {
+    'login': lambda base_url: test_login.run_suite("SELECTED", base_url),
+    'notify': test_notifications.run_suite,
+    'subscribe': test_subscribe_user.demo_subscription_workflow,
+    'subscribe-send': lambda base_url: asyncio.run(test_subscribe_user_send.demo_subscription_workflow(base_url)),
+    'register': test_register.register,
+}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--suite', choices=[*SUITES, 'all'], default='all')
+    parser.add_argument('--base-url', default=DEFAULT_BASE_URL)
+    parser.add_argument('--parallel', type=int, default=min(32, (os.cpu_count() or 1) * 5),
+                        help="worker threads used when running every suite")
+    args = parser.parse_args()
+    base_url = args.base_url.rstrip('/')
+
+    if args.suite != 'all':
+        SUITES[args.suite](base_url)
+        return
+
+    with ThreadPoolExecutor(max_workers=args.parallel) as executor:
+        list(executor.map(lambda suite: suite(base_url), SUITES.values()))
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,11 @@
 #!/usr/bin/env python3
 
 import requests
+from http_session import make_session
 import json
 
+SESSION = make_session()
+
 # Configuration
 BASE_URL = "https://bondy-backend-python-mi3a.onrender.com"
 BASE_URL = "http://localhost:8082"  # Uncomment for local testing
@@ -23,7 +26,7 @@ def test_basic_endpoints():
     for method, path, description in endpoints:
         try:
             print(f"\n{description}: {method} {path}") 
-            response = requests.get(f"{BASE_URL}{path}", timeout=10)
+            response = SESSION.get(f"{BASE_URL}{path}", timeout=10)
             print(f"Status: {response.status_code}")
             print(f"Content: {response.text}")
             
@@ -48,7 +51,7 @@ def test_system_control():
     # Test health before changes
     print("\n1. Initial health check:")
     try:
-        response = requests.get(f"{BASE_URL}/health", timeout=10)
+        response = SESSION.get(f"{BASE_URL}/health", timeout=10)
         print(f"Status: {response.status_code}")
         print(f"Content: {response.text}")
     except Exception as e:
@@ -57,7 +60,7 @@ def test_system_control():
     # Test fall (system down)
     print("\n2. Setting system down:")
     try:
-        response = requests.post(f"{BASE_URL}/fall", timeout=10)
+        response = SESSION.post(f"{BASE_URL}/fall", timeout=10)
         print(f"Status: {response.status_code}")
         print(f"Content: {response.text}")
     except Exception as e:
@@ -66,7 +69,7 @@ def test_system_control():
     # Test health after fall
     print("\n3. Health check after fall:")
     try:
-        response = requests.get(f"{BASE_URL}/health", timeout=10)
+        response = SESSION.get(f"{BASE_URL}/health", timeout=10)
         print(f"Status: {response.status_code}")
         print(f"Content: {response.text}")
     except Exception as e:
@@ -75,7 +78,7 @@ def test_system_control():
     # Test revive (system up)
     print("\n4. Reviving system:")
     try:
-        response = requests.post(f"{BASE_URL}/revive", timeout=10)
+        response = SESSION.post(f"{BASE_URL}/revive", timeout=10)
         print(f"Status: {response.status_code}")
         print(f"Content: {response.text}")
     except Exception as e:
@@ -84,7 +87,7 @@ def test_system_control():
     # Test health after revive
     print("\n5. Health check after revive:")
     try:
-        response = requests.get(f"{BASE_URL}/health", timeout=10)
+        response = SESSION.get(f"{BASE_URL}/health", timeout=10)
         print(f"Status: {response.status_code}")
         print(f"Content: {response.text}")
     except Exception as e:
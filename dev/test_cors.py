@@ -1,7 +1,49 @@
 #!/usr/bin/env python3
 
 import requests
+from http_session import make_session
 import json
+import asyncio
+import httpx
+
+SESSION = make_session()
+
+REQUIRED_CORS_HEADERS = ('Access-Control-Allow-Origin', 'Access-Control-Allow-Methods', 'Access-Control-Allow-Headers')
+
+# JSON bodies sent with the POST probes
+POST_BODIES = {
+    '/login': {"username": "testuser"},
+    '/messages': {"userId": 1, "groupId": 1, "content": "test"},
+}
+
+# Responses already fetched, keyed by (base_url, method, path, body, headers). The headers
+# are part of the key, so a browser-like preflight (Origin, Access-Control-Request-*) is
+# really sent instead of reusing the plain probe made by test_cors_headers.
+_probe_cache = {}
+
+def _cache_key(base_url, method, path, json_body=None, headers=None):
+    return (base_url, method, path,
+            None if json_body is None else json.dumps(json_body, sort_keys=True),
+            None if headers is None else tuple(sorted(headers.items())))
+
+def cached_request(base_url, method, path, json_body=None, headers=None):
+    """Send a request once per (base_url, method, path, body, headers) and reuse the response afterwards"""
+    key = _cache_key(base_url, method, path, json_body, headers)
+    if key not in _probe_cache:
+        _probe_cache[key] = SESSION.request(method, f"{base_url}{path}", json=json_body, headers=headers, timeout=10)
+    return _probe_cache[key]
+
+async def probe(client, method, endpoint):
+    """Send one CORS probe; returns the response or the exception raised"""
+    try:
+        return await client.request(method, endpoint, json=POST_BODIES.get(endpoint) if method == 'POST' else None)
+    except httpx.HTTPError as e:
+        return e
+
+async def probe_all(base_url, endpoints_to_test):
+    """Fire all probes at once over a single (HTTP/2 when available) connection"""
+    async with httpx.AsyncClient(base_url=base_url, http2=True, timeout=10) as client:
+        return await asyncio.gather(*[probe(client, method, endpoint) for endpoint, method in endpoints_to_test])
 
 def test_cors_headers(base_url):
     """Test CORS headers on various endpoints"""
@@ -18,62 +60,44 @@ def test_cors_headers(base_url):
         ('/login', 'OPTIONS'),   # Preflight request
     ]
     
-    for endpoint, method in endpoints_to_test:
+    results = asyncio.run(probe_all(base_url, endpoints_to_test))
+    for (endpoint, method), response in zip(endpoints_to_test, results):
+        if not isinstance(response, Exception):
+            body = POST_BODIES.get(endpoint) if method == 'POST' else None
+            _probe_cache[_cache_key(base_url, method, endpoint, body)] = response
+    
+    for (endpoint, method), response in zip(endpoints_to_test, results):
         print(f"\n🔍 Testing {method} {endpoint}")
         
-        try:
-            if method == 'GET':
-                response = requests.get(f"{base_url}{endpoint}", timeout=10)
-            elif method == 'POST':
-                if endpoint == '/login':
-                    data = {"username": "testuser"}
-                    response = requests.post(
-                        f"{base_url}{endpoint}", 
-                        json=data,
-                        headers={'Content-Type': 'application/json'},
-                        timeout=10
-                    )
-                elif endpoint == '/messages':
-                    data = {"userId": 1, "groupId": 1, "content": "test"}
-                    response = requests.post(
-                        f"{base_url}{endpoint}", 
-                        json=data,
-                        headers={'Content-Type': 'application/json'},
-                        timeout=10
-                    )
-                else:
-                    response = requests.post(f"{base_url}{endpoint}", timeout=10)
-            elif method == 'OPTIONS':
-                response = requests.options(f"{base_url}{endpoint}", timeout=10)
-            
-            print(f"📊 Status: {response.status_code}")
-            
-            # Check CORS headers
-            cors_headers = {
-                'Access-Control-Allow-Origin': response.headers.get('Access-Control-Allow-Origin'),
-                'Access-Control-Allow-Methods': response.headers.get('Access-Control-Allow-Methods'),
-                'Access-Control-Allow-Headers': response.headers.get('Access-Control-Allow-Headers'),
-                'Access-Control-Max-Age': response.headers.get('Access-Control-Max-Age'),
-            }
-            
-            print("🔒 CORS Headers:")
-            for header, value in cors_headers.items():
-                if value:
-                    print(f"  ✅ {header}: {value}")
-                else:
-                    print(f"  ❌ {header}: Missing")
-            
-            # Check if all required CORS headers are present
-            required_headers = ['Access-Control-Allow-Origin', 'Access-Control-Allow-Methods', 'Access-Control-Allow-Headers']
-            missing_headers = [h for h in required_headers if not cors_headers[h.replace('-', '_').lower()]]
-            
-            if not missing_headers:
-                print("  🎉 All required CORS headers present!")
+        if isinstance(response, Exception):
+            print(f"❌ Error: {response}")
+            print("-" * 40)
+            continue
+        
+        print(f"📊 Status: {response.status_code}")
+        
+        # Check CORS headers
+        cors_headers = {
+            'Access-Control-Allow-Origin': response.headers.get('Access-Control-Allow-Origin'),
+            'Access-Control-Allow-Methods': response.headers.get('Access-Control-Allow-Methods'),
+            'Access-Control-Allow-Headers': response.headers.get('Access-Control-Allow-Headers'),
+            'Access-Control-Max-Age': response.headers.get('Access-Control-Max-Age'),
+        }
+        
+        print("🔒 CORS Headers:")
+        for header, value in cors_headers.items():
+            if value:
+                print(f"  ✅ {header}: {value}")
             else:
-                print(f"  ⚠️  Missing headers: {missing_headers}")
-                
-        except requests.exceptions.RequestException as e:
-            print(f"❌ Error: {e}")
+                print(f"  ❌ {header}: Missing")
+        
+        # Check if all required CORS headers are present
+        missing_headers = [h for h in REQUIRED_CORS_HEADERS if not cors_headers.get(h)]
+        
+        if not missing_headers:
+            print("  🎉 All required CORS headers present!")
+        else:
+            print(f"  ⚠️  Missing headers: {missing_headers}")
         
         print("-" * 40)
 
@@ -91,11 +115,7 @@ def test_browser_like_request(base_url):
             'Access-Control-Request-Headers': 'Content-Type'
         }
         
-        response = requests.options(
-            f"{base_url}/login",
-            headers=preflight_headers,
-            timeout=10
-        )
+        response = cached_request(base_url, 'OPTIONS', '/login', headers=preflight_headers)
         
         print(f"📊 Preflight Status: {response.status_code}")
         
@@ -121,12 +141,7 @@ def test_browser_like_request(base_url):
                     'Content-Type': 'application/json'
                 }
                 
-                actual_response = requests.post(
-                    f"{base_url}/login",
-                    json={"username": "corstest"},
-                    headers=actual_headers,
-                    timeout=10
-                )
+                actual_response = cached_request(base_url, 'POST', '/login', json_body={"username": "corstest"}, headers=actual_headers)
                 
                 print(f"📊 Actual request status: {actual_response.status_code}")
                 
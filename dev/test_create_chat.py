@@ -4,122 +4,128 @@ Test script for the /create-chat endpoint
 """
 
 import requests
+from http_session import JSON_HEADERS, make_session
 import json
+from functools import lru_cache
+
+SESSION = make_session(pool_connections=4, pool_maxsize=16, max_retries=0, headers=JSON_HEADERS)
 
 # Server URL
 BASE_URL = "http://127.0.0.1:8082"
 
+# Login bodies never change within a run, so they are serialized once up front
+# (the session already sends Content-Type: application/json)
+LOGIN_PAYLOADS = {
+    username: json.dumps({"username": username}).encode('utf-8')
+    for username in ("testcreator", "member1", "member2")
+}
+
+@lru_cache(maxsize=64)
+def _login(base_url, username):
+    """Logs in once per (base_url, username) and returns the user_id; failures are not cached"""
+    payload = LOGIN_PAYLOADS.get(username) or json.dumps({"username": username}).encode('utf-8')
+    response = SESSION.post(f"{base_url}/login", data=payload)
+    response_json = response.json()
+    print(f"{username} login response: {response.status_code} - {response_json}")
+    if response.status_code != 200:
+        raise RuntimeError(f"login failed for {username}: {response.status_code}")
+    return response_json['user_id']
+
+def create_chat_scenarios(creator_id):
+    """
+    All /create-chat scenarios as (description, payload, expected_status).
+    Covers both the endpoint checks and the group-name edge cases that used to
+    live in test_chat_integration.py.
+    """
+    create_chat_data = {
+        "groupName": "Test Group",
+        "creatorId": creator_id
+    }
+    return [
+        ("Create chat (creator only)", create_chat_data, 200),
+        ("Create group with members", {
+            "groupName": "Group With Members",
+            "creatorId": creator_id,
+            "members": ["member1", "member2"]
+        }, 200),
+        ("Create group with invalid members", {
+            "groupName": "Group With Invalid Members",
+            "creatorId": creator_id,
+            "members": ["member1", "nonexistent_user", "member2"]
+        }, 200),
+        ("Create group with creator in members", {
+            "groupName": "Group Creator Duplicate Test",
+            "creatorId": creator_id,
+            "members": ["testcreator", "member1"]  # Creator's username in members
+        }, 200),
+        ("Duplicate name", create_chat_data, 200),  # Duplicate group names are allowed
+        ("Invalid creator", {
+            "groupName": "Another Test Group",
+            "creatorId": 99999
+        }, 404),
+        ("Missing field", {"groupName": "Incomplete Group"}, 400),
+        ("Empty body", {}, 400),
+        ("Empty group name", {"groupName": "", "creatorId": creator_id}, 200),
+        ("Very long group name", {"groupName": "A" * 500, "creatorId": creator_id}, 400),
+        ("Special characters in group name", {
+            "groupName": "Test Group 🚀 with émojis & spëcial chars!",
+            "creatorId": creator_id
+        }, 200),
+    ]
+
 def test_create_chat():
     """Test creating a new chat group"""
     print("Testing /create-chat endpoint...")
     
     # First, create test users
     print("\n1. Creating test users first...")
-    login_data1 = {"username": "testcreator"}
-    response1 = requests.post(f"{BASE_URL}/login", json=login_data1)
-    print(f"Creator login response: {response1.status_code} - {response1.json()}")
-    
-    login_data2 = {"username": "member1"}
-    response2 = requests.post(f"{BASE_URL}/login", json=login_data2)
-    print(f"Member1 login response: {response2.status_code} - {response2.json()}")
-    
-    login_data3 = {"username": "member2"}
-    response3 = requests.post(f"{BASE_URL}/login", json=login_data3)
-    print(f"Member2 login response: {response3.status_code} - {response3.json()}")
+    try:
+        creator_id = _login(BASE_URL, "testcreator")
+        member1_id = _login(BASE_URL, "member1")
+        member2_id = _login(BASE_URL, "member2")
+        print(f"Member IDs: member1={member1_id}, member2={member2_id}")
+    except RuntimeError as e:
+        print(f"Failed to create test users: {e}")
+        return None
     
-    if response1.status_code == 200:
-        creator_id = response1.json()['user_id']
+    if creator_id:
         print(f"Creator user ID: {creator_id}")
         
-        # Test creating a new chat group without additional members
-        print("\n2. Creating a new chat group (creator only)...")
-        create_chat_data = {
-            "groupName": "Test Group",
-            "creatorId": creator_id
-        }
-        response = requests.post(f"{BASE_URL}/create-chat", json=create_chat_data)
-        print(f"Create chat response: {response.status_code} - {response.json()}")
+        # Every create-chat scenario goes to the server in a single batch request
+        print("\n2. Creating chat groups in one /create-chat/batch request...")
+        scenarios = create_chat_scenarios(creator_id)
+        batch_payload = json.dumps([payload for _, payload, _ in scenarios]).encode('utf-8')
+        response = SESSION.post(f"{BASE_URL}/create-chat/batch", data=batch_payload)
+        print(f"Batch response: {response.status_code}")
+        if response.status_code != 200:
+            print(f"Batch request failed: {response.text}")
+            return None
         
-        if response.status_code == 200:
-            group_data = response.json()
+        results = response.json()['results']
+        for i, ((description, _, expected_status), result) in enumerate(zip(scenarios, results), 1):
+            mark = "✅" if result['status'] == expected_status else "❌"
+            print(f"  {mark} {i}. {description}: {result['status']} (expected {expected_status}) - {result['body']}")
+        
+        group_data = results[0]['body']
+        if results[0]['status'] == 200:
             print(f"Successfully created group: {group_data}")
             
-            # Test creating a group with multiple members
-            print("\n3. Creating a group with multiple members...")
-            create_chat_with_members = {
-                "groupName": "Group With Members",
-                "creatorId": creator_id,
-                "members": ["member1", "member2"]
-            }
-            response = requests.post(f"{BASE_URL}/create-chat", json=create_chat_with_members)
-            print(f"Create group with members response: {response.status_code} - {response.json()}")
-            
-            # Test creating a group with non-existent members
-            print("\n4. Creating a group with non-existent members...")
-            create_chat_invalid_members = {
-                "groupName": "Group With Invalid Members",
-                "creatorId": creator_id,
-                "members": ["member1", "nonexistent_user", "member2"]
-            }
-            response = requests.post(f"{BASE_URL}/create-chat", json=create_chat_invalid_members)
-            print(f"Create group with invalid members response: {response.status_code} - {response.json()}")
-            
-            # Test creating a group with creator in members list (should not duplicate)
-            print("\n5. Creating a group with creator in members list...")
-            create_chat_creator_in_members = {
-                "groupName": "Group Creator Duplicate Test",
-                "creatorId": creator_id,
-                "members": ["testcreator", "member1"]  # Creator's username in members
-            }
-            response = requests.post(f"{BASE_URL}/create-chat", json=create_chat_creator_in_members)
-            print(f"Create group with creator in members response: {response.status_code} - {response.json()}")
-            
-            # Test creating a group with duplicate group name
-            print("\n6. Testing duplicate group name...")
-            response = requests.post(f"{BASE_URL}/create-chat", json=create_chat_data)
-            print(f"Duplicate name response: {response.status_code} - {response.json()}")
-            
-            # Test creating a group with non-existent creator
-            print("\n7. Testing non-existent creator...")
-            invalid_data = {
-                "groupName": "Another Test Group",
-                "creatorId": 99999
-            }
-            response = requests.post(f"{BASE_URL}/create-chat", json=invalid_data)
-            print(f"Invalid creator response: {response.status_code} - {response.json()}")
-            
-            # Test missing required fields
-            print("\n8. Testing missing required fields...")
-            incomplete_data = {"groupName": "Incomplete Group"}
-            response = requests.post(f"{BASE_URL}/create-chat", json=incomplete_data)
-            print(f"Missing field response: {response.status_code} - {response.json()}")
-            
-            # Test empty request body
-            print("\n9. Testing empty request body...")
-            response = requests.post(f"{BASE_URL}/create-chat", json={})
-            print(f"Empty body response: {response.status_code} - {response.json()}")
-            
             # Verify the groups appear in users' chats
-            print("\n10. Verifying groups appear in users' chats...")
-            response = requests.get(f"{BASE_URL}/chats?userId={creator_id}")
+            print("\n3. Verifying groups appear in users' chats...")
+            response = SESSION.get(f"{BASE_URL}/chats?userId={creator_id}")
             print(f"Creator chats response: {response.status_code} - {response.json()}")
             
-            if response2.status_code == 200:
-                member1_id = response2.json()['user_id']
-                response = requests.get(f"{BASE_URL}/chats?userId={member1_id}")
-                print(f"Member1 chats response: {response.status_code} - {response.json()}")
+            response = SESSION.get(f"{BASE_URL}/chats?userId={member1_id}")
+            print(f"Member1 chats response: {response.status_code} - {response.json()}")
             
             return group_data.get('group_id')
-    else:
-        print("Failed to create test users")
-        return None
 
 def test_cors_for_create_chat():
     """Test CORS preflight for /create-chat endpoint"""
     print("\n\nTesting CORS preflight for /create-chat...")
     
     # Test OPTIONS request
-    response = requests.options(f"{BASE_URL}/create-chat")
+    response = SESSION.options(f"{BASE_URL}/create-chat")
     print(f"OPTIONS response: {response.status_code}")
     print(f"CORS headers: {dict(response.headers)}")
 
@@ -1,21 +1,61 @@
 #!/usr/bin/env python3
 
-import requests
-import time
-import json
+from http_session import JSON_HEADERS, make_session
+import asyncio
+import httpx
+
+SESSION = make_session(pool_connections=4, pool_maxsize=16, max_retries=0, headers=JSON_HEADERS)
 
 # Configuration
 BASE_URL = "https://bondy-backend-python-mi3a.onrender.com"
 # BASE_URL = "http://localhost:8083"  # Uncomment for local testing
 
-def test_error_conditions():
+# Paths built once at import instead of being formatted on every run
+LONG_NAME_PATH = "/user/" + "a" * 1000 + "/groups"  # Very long name
+SPECIAL_NAMES = [
+    "user@domain.com",
+    "user with spaces",
+    "user/with/slashes",
+    "user?with=query",
+    "user#with%encoding",
+]
+SPECIAL_NAME_PATHS = ["".join(("/user/", name, "/groups")) for name in SPECIAL_NAMES]
+
+# Only the start of each response body is printed, so only that much is downloaded
+PREVIEW_BYTES = 4096
+
+async def probe(client, method, path, **kwargs):
+    """Send one request; returns (status, body preview) or (None, error message)"""
+    try:
+        async with client.stream(method, path, **kwargs) as response:
+            text = ""
+            async for chunk in response.aiter_text(PREVIEW_BYTES):
+                text = chunk
+                break
+            return response.status_code, text
+    except httpx.HTTPError as e:
+        return None, str(e)
+
+def fetch_preview(method, url):
+    """Blocking counterpart of probe() for the ordered system-down checks"""
+    with SESSION.request(method, url, timeout=10, stream=True) as response:
+        return response.status_code, next(response.iter_content(PREVIEW_BYTES, decode_unicode=True), "")
+
+def print_probe(result):
+    """Print a probe result in the same format as the sequential tests"""
+    status, text = result
+    if status is None:
+        print(f"  Error: {text}")
+    else:
+        print(f"  Status: {status}")
+        print(f"  Content: {text}")
+
+async def test_error_conditions():
     """Test various error conditions and edge cases"""
     print("=" * 50)
     print("TESTING ERROR CONDITIONS & EDGE CASES")
     print("=" * 50)
     
-    # 1. Test invalid endpoints
-    print("\n1. Testing invalid endpoints:")
     invalid_endpoints = [
         "/invalid",
         "/user",
@@ -27,18 +67,6 @@ def test_error_conditions():
         "/subscribe",
         "/subscribe/invalid",
     ]
-    
-    for endpoint in invalid_endpoints:
-        try:
-            print(f"Testing {endpoint}:")
-            response = requests.get(f"{BASE_URL}{endpoint}", timeout=10)
-            print(f"  Status: {response.status_code}")
-            print(f"  Content: {response.text}")
-        except Exception as e:
-            print(f"  Error: {e}")
-    
-    # 2. Test invalid HTTP methods
-    print("\n2. Testing invalid HTTP methods:")
     invalid_methods = [
         ("PUT", "/health"),
         ("PATCH", "/health"),
@@ -47,21 +75,6 @@ def test_error_conditions():
         ("PUT", "/groups"),
         ("DELETE", "/groups"),
     ]
-    
-    for method, endpoint in invalid_methods:
-        try:
-            print(f"Testing {method} {endpoint}:")
-            response = requests.request(method, f"{BASE_URL}{endpoint}", timeout=10)
-            print(f"  Status: {response.status_code}")
-            print(f"  Content: {response.text}")
-        except Exception as e:
-            print(f"  Error: {e}")
-    
-    # 3. Test invalid JSON payloads
-    print("\n3. Testing invalid JSON payloads:")
-    
-    # Invalid JSON for user groups
-    print("Testing invalid JSON for user groups:")
     invalid_payloads = [
         {},  # Missing groups
         {"groups": "not_an_array"},  # Groups not an array
@@ -69,62 +82,60 @@ def test_error_conditions():
         {"groups": []},  # Empty groups (should work but remove user)
     ]
     
-    for payload in invalid_payloads:
-        try:
-            print(f"Testing payload: {payload}")
-            response = requests.post(
-                f"{BASE_URL}/user/testuser/groups",
-                json=payload,
-                headers={'Content-Type': 'application/json'},
-                timeout=10
-            )
-            print(f"  Status: {response.status_code}")
-            print(f"  Content: {response.text}")
-        except Exception as e:
-            print(f"  Error: {e}")
+    # None of these probes depend on each other, so they are all sent at once. Over HTTPS they
+    # are multiplexed on one HTTP/2 connection; against the raw-socket server directly they use
+    # HTTP/1.1, whose connections it keeps alive (except after HEAD and errors) and answers one
+    # request at a time, so the concurrent probes spread over the pool's connections.
+    limits = httpx.Limits(max_connections=20, keepalive_expiry=30)
+    async with httpx.AsyncClient(base_url=BASE_URL, timeout=10, limits=limits, http2=True) as client:
+        (endpoint_results, method_results, payload_results,
+         missing_param_result, long_name_result, special_results) = await asyncio.gather(
+            asyncio.gather(*(probe(client, "GET", endpoint) for endpoint in invalid_endpoints)),
+            asyncio.gather(*(probe(client, method, endpoint) for method, endpoint in invalid_methods)),
+            asyncio.gather(*(probe(client, "POST", "/user/testuser/groups", json=payload) for payload in invalid_payloads)),
+            probe(client, "GET", "/subscribe/user"),
+            probe(client, "GET", LONG_NAME_PATH),
+            asyncio.gather(*(probe(client, "GET", path) for path in SPECIAL_NAME_PATHS)),
+        )
+    
+    # 1. Test invalid endpoints
+    print("\n1. Testing invalid endpoints:")
+    for endpoint, result in zip(invalid_endpoints, endpoint_results):
+        print(f"Testing {endpoint}:")
+        print_probe(result)
+    
+    # 2. Test invalid HTTP methods
+    print("\n2. Testing invalid HTTP methods:")
+    for (method, endpoint), result in zip(invalid_methods, method_results):
+        print(f"Testing {method} {endpoint}:")
+        print_probe(result)
+    
+    # 3. Test invalid JSON payloads
+    print("\n3. Testing invalid JSON payloads:")
+    
+    # Invalid JSON for user groups
+    print("Testing invalid JSON for user groups:")
+    for payload, result in zip(invalid_payloads, payload_results):
+        print(f"Testing payload: {payload}")
+        print_probe(result)
     
     # 4. Test missing query parameters
     print("\n4. Testing missing query parameters:")
     
     # Subscribe user without user_id
-    try:
-        print("Testing /subscribe/user without user_id:")
-        response = requests.get(f"{BASE_URL}/subscribe/user", timeout=10)
-        print(f"  Status: {response.status_code}")
-        print(f"  Content: {response.text}")
-    except Exception as e:
-        print(f"  Error: {e}")
+    print("Testing /subscribe/user without user_id:")
+    print_probe(missing_param_result)
     
     # 5. Test very long group/user names
     print("\n5. Testing very long names:")
-    long_name = "a" * 1000  # Very long name
-    
-    try:
-        print("Testing very long user name:")
-        response = requests.get(f"{BASE_URL}/user/{long_name}/groups", timeout=10)
-        print(f"  Status: {response.status_code}")
-        print(f"  Content: {response.text}")
-    except Exception as e:
-        print(f"  Error: {e}")
+    print("Testing very long user name:")
+    print_probe(long_name_result)
     
     # 6. Test special characters in names
     print("\n6. Testing special characters:")
-    special_names = [
-        "user@domain.com",
-        "user with spaces",
-        "user/with/slashes",
-        "user?with=query",
-        "user#with%encoding",
-    ]
-    
-    for name in special_names:
-        try:
-            print(f"Testing user name: '{name}'")
-            response = requests.get(f"{BASE_URL}/user/{name}/groups", timeout=10)
-            print(f"  Status: {response.status_code}")
-            print(f"  Content: {response.text}")
-        except Exception as e:
-            print(f"  Error: {e}")
+    for name, result in zip(SPECIAL_NAMES, special_results):
+        print(f"Testing user name: '{name}'")
+        print_probe(result)
 
 def test_system_down_behavior():
     """Test behavior when system is down"""
@@ -135,7 +146,7 @@ def test_system_down_behavior():
     # 1. Set system down
     print("\n1. Setting system down:")
     try:
-        response = requests.post(f"{BASE_URL}/fall", timeout=10)
+        response = SESSION.post(f"{BASE_URL}/fall", timeout=10)
         print(f"Status: {response.status_code}")
         print(f"Content: {response.text}")
     except Exception as e:
@@ -154,9 +165,7 @@ def test_system_down_behavior():
     for endpoint in endpoints_when_down:
         try:
             print(f"Testing {endpoint}:")
-            response = requests.get(f"{BASE_URL}{endpoint}", timeout=10)
-            print(f"  Status: {response.status_code}")
-            print(f"  Content: {response.text}")
+            print_probe(fetch_preview("GET", f"{BASE_URL}{endpoint}"))
         except Exception as e:
             print(f"  Error: {e}")
     
@@ -170,21 +179,19 @@ def test_system_down_behavior():
     for method, endpoint in control_endpoints:
         try:
             print(f"Testing {method} {endpoint}:")
-            response = requests.request(method, f"{BASE_URL}{endpoint}", timeout=10)
-            print(f"  Status: {response.status_code}")
-            print(f"  Content: {response.text}")
+            print_probe(fetch_preview(method, f"{BASE_URL}{endpoint}"))
         except Exception as e:
             print(f"  Error: {e}")
     
     # 4. Revive system
     print("\n4. Reviving system:")
     try:
-        response = requests.post(f"{BASE_URL}/revive", timeout=10)
+        response = SESSION.post(f"{BASE_URL}/revive", timeout=10)
         print(f"Status: {response.status_code}")
         print(f"Content: {response.text}")
     except Exception as e:
         print(f"Error: {e}")
 
 if __name__ == "__main__":
-    test_error_conditions()
+    asyncio.run(test_error_conditions())
     test_system_down_behavior()
@@ -1,10 +1,29 @@
 #!/usr/bin/env python3
 
 import requests
+from requests.adapters import HTTPAdapter
 import json
-import time
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
 
-def test_get_endpoints(base_url):
+def create_session():
+    """Session shared by all tests of a run: keeps connections alive instead of a new TCP/TLS handshake per request"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_maxsize=8)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.headers.update({'Content-Type': 'application/json', 'Connection': 'keep-alive'})
+    return session
+
+@lru_cache(maxsize=64)
+def _login(base_url, session, username):
+    """Logs in once per (base_url, username) and returns the user_id; failures are not cached"""
+    response = session.post(f"{base_url}/login", json={"username": username}, timeout=10)
+    if response.status_code != 200:
+        raise RuntimeError(response.text)
+    return response.json()['user_id']
+
+def test_get_endpoints(base_url, session):
     """Test GET endpoints with query parameters"""
     print(f"\n📡 Testing GET endpoints with query parameters for {base_url}")
     print("=" * 60)
@@ -12,19 +31,11 @@ def test_get_endpoints(base_url):
     # First, create a user to test with
     print("\n1️⃣  Creating test user...")
     try:
-        login_response = requests.post(
-            f"{base_url}/login",
-            json={"username": "testuser_get"},
-            headers={'Content-Type': 'application/json'},
-            timeout=10
-        )
-        if login_response.status_code == 200:
-            user_data = login_response.json()
-            user_id = user_data['user_id']
-            print(f"✅ User created/found with ID: {user_id}")
-        else:
-            print(f"❌ Failed to create user: {login_response.text}")
-            return
+        user_id = _login(base_url, session, "testuser_get")
+        print(f"✅ User created/found with ID: {user_id}")
+    except RuntimeError as e:
+        print(f"❌ Failed to create user: {e}")
+        return
     except Exception as e:
         print(f"❌ Error creating user: {e}")
         return
@@ -81,13 +92,19 @@ def test_get_endpoints(base_url):
         }
     ]
     
+    # Looked up once instead of on every iteration
+    get = session.get
+    dumps = json.dumps
+    JSONDecodeError = json.JSONDecodeError
+    RequestException = requests.exceptions.RequestException
+    
     for i, test_case in enumerate(test_cases, 2):
         print(f"\n{i}️⃣  {test_case['name']}")
         print(f"🔗 URL: {test_case['url']}")
         print(f"📝 Description: {test_case['description']}")
         
         try:
-            response = requests.get(test_case['url'], timeout=10)
+            response = get(test_case['url'], timeout=10)
             print(f"📊 Status: {response.status_code}")
             
             if response.status_code in test_case['expected_status']:
@@ -97,42 +114,50 @@ def test_get_endpoints(base_url):
             
             try:
                 response_json = response.json()
-                print(f"📨 Response: {json.dumps(response_json, indent=2)}")
-            except json.JSONDecodeError:
+                print(f"📨 Response: {dumps(response_json, indent=2)}")
+            except JSONDecodeError:
                 print(f"📨 Response (raw): {response.text}")
                 
-        except requests.exceptions.RequestException as e:
+        except RequestException as e:
             print(f"❌ Request error: {e}")
         
         print("-" * 40)
 
-def test_query_parameter_combinations(base_url):
+QUERY_PARAMETER_URL_TEMPLATES = (
+    "{base_url}/chats?userId=1&extra=param",  # Extra parameters should be ignored
+    "{base_url}/messages?groupId=1&limit=10",  # Extra parameters should be ignored
+    "{base_url}/group-users?groupId=1&sort=name",  # Extra parameters should be ignored
+    "{base_url}/chats?wrongParam=1",  # Wrong parameter name
+    "{base_url}/messages?userId=1",  # Wrong parameter for endpoint
+)
+
+def test_query_parameter_combinations(base_url, session):
     """Test various query parameter combinations"""
     print(f"\n🔍 Testing query parameter combinations")
     print("=" * 60)
     
-    test_urls = [
-        f"{base_url}/chats?userId=1&extra=param",  # Extra parameters should be ignored
-        f"{base_url}/messages?groupId=1&limit=10",  # Extra parameters should be ignored
-        f"{base_url}/group-users?groupId=1&sort=name",  # Extra parameters should be ignored
-        f"{base_url}/chats?wrongParam=1",  # Wrong parameter name
-        f"{base_url}/messages?userId=1",  # Wrong parameter for endpoint
-    ]
+    test_urls = [template.format(base_url=base_url) for template in QUERY_PARAMETER_URL_TEMPLATES]
+    
+    # Looked up once instead of on every iteration
+    get = session.get
+    dumps = json.dumps
+    JSONDecodeError = json.JSONDecodeError
+    RequestException = requests.exceptions.RequestException
     
     for i, url in enumerate(test_urls, 1):
         print(f"\n{i}️⃣  Testing: {url}")
         
         try:
-            response = requests.get(url, timeout=10)
+            response = get(url, timeout=10)
             print(f"📊 Status: {response.status_code}")
             
             try:
                 response_json = response.json()
-                print(f"📨 Response: {json.dumps(response_json, indent=2)}")
-            except json.JSONDecodeError:
+                print(f"📨 Response: {dumps(response_json, indent=2)}")
+            except JSONDecodeError:
                 print(f"📨 Response (raw): {response.text}")
                 
-        except requests.exceptions.RequestException as e:
+        except RequestException as e:
             print(f"❌ Request error: {e}")
         
         print("-" * 40)
@@ -157,34 +182,34 @@ def create_curl_examples():
     
     print("\n" + "=" * 60)
 
-# Test local server
-print("🧪 GET ENDPOINTS WITH QUERY PARAMETERS TESTING")
-print("=" * 60)
-
-local_base_url = "http://localhost:8080"
-
-test_get_endpoints(local_base_url)
-test_query_parameter_combinations(local_base_url)
+if __name__ == "__main__":
+    print("🧪 GET ENDPOINTS WITH QUERY PARAMETERS TESTING")
+    print("=" * 60)
 
-# Test remote server
-print("\n" + "=" * 60)
-print("🌐 TESTING REMOTE SERVER")
-print("=" * 60)
+    local_base_url = "http://localhost:8080"
+    remote_base_url = "https://bondy-backend-python-mi3a.onrender.com"
 
-remote_base_url = "https://bondy-backend-python-mi3a.onrender.com"
+    def run_suite(base_url):
+        """Run both test functions against one host with its own session"""
+        with create_session() as session:
+            test_get_endpoints(base_url, session)
+            test_query_parameter_combinations(base_url, session)
 
-test_get_endpoints(remote_base_url)
-test_query_parameter_combinations(remote_base_url)
+    # Local and remote are independent hosts, so both suites run at the same time
+    print(f"🌐 Testing local ({local_base_url}) and remote ({remote_base_url}) servers in parallel")
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        for future in [executor.submit(run_suite, url) for url in (local_base_url, remote_base_url)]:
+            future.result()
 
-# Show curl examples
-create_curl_examples()
+    # Show curl examples
+    create_curl_examples()
 
-print("\n" + "=" * 60)
-print("✅ GET ENDPOINTS TESTING COMPLETED")
-print("=" * 60)
-print("\n💡 Summary of changes:")
-print("✅ GET /chats now uses ?userId=123")
-print("✅ GET /messages now uses ?groupId=123") 
-print("✅ GET /group-users now uses ?groupId=123")
-print("✅ All endpoints properly validate query parameters")
-print("✅ Middleware updated to handle paths with query parameters")
+    print("\n" + "=" * 60)
+    print("✅ GET ENDPOINTS TESTING COMPLETED")
+    print("=" * 60)
+    print("\n💡 Summary of changes:")
+    print("✅ GET /chats now uses ?userId=123")
+    print("✅ GET /messages now uses ?groupId=123") 
+    print("✅ GET /group-users now uses ?groupId=123")
+    print("✅ All endpoints properly validate query parameters")
+    print("✅ Middleware updated to handle paths with query parameters")
@@ -1,48 +1,66 @@
 #!/usr/bin/env python3
 
-import requests
-import time
-
-# Test local server
-print("Testing local server...")
-
-if False:
-    try:
-        # Test /
-        print("Testing /...")
-        response = requests.get("http://localhost:8083/", timeout=5)
-        print(f"Status: {response.status_code}")
-        print(f"Content: {response.text}")
-        print()
-        
-        # Test /health  
-        print("Testing /health...") 
-        response = requests.get("http://localhost:8083/health", timeout=5)
-        print(f"Status: {response.status_code}")
-        print(f"Content: {response.text}")
-        print()
-        
-    except requests.exceptions.RequestException as e:
-        print(f"Error: {e}")
+import argparse
+import asyncio
+import httpx
+import urllib3
 
-# Test remote server
-print("Testing remote server...")
+PATHS = ("/", "/health")
 
-remote_server = 'https://bondy-backend-python-mi3a.onrender.com/' if True else 'https://bondy-oru7l52q.b4a.run/'
-try:
-    # Test /
-    print("Testing /...")
-    response = requests.get(remote_server, timeout=10)
-    print(f"Status: {response.status_code}")
-    print(f"Content: {response.text}")
-    print()
-     
-    # Test /health  
-    print("Testing /health...")
-    response = requests.get(f"{remote_server}health", timeout=10)
-    print(f"Status: {response.status_code}")
-    print(f"Content: {response.text}")
-    print()
+# Plain-HTTP (local) probes go straight through urllib3: no HTTP/2 to gain there, and it
+# skips the client wrapper overhead. One pool manager is reused for every probe.
+HTTP = urllib3.PoolManager(num_pools=2, maxsize=4, retries=False)
+
+def fetch_plain(base_url, timeout):
+    """GET each path over plain HTTP; returns (status, text) or the exception per path"""
+    results = []
+    for path in PATHS:
+        try:
+            response = HTTP.request('GET', base_url.rstrip('/') + path, timeout=urllib3.Timeout(timeout))
+            results.append((response.status, response.data.decode('utf-8', errors='replace')))
+        except urllib3.exceptions.HTTPError as e:
+            results.append(e)
+    return results
+
+async def fetch_multiplexed(base_url, timeout):
+    """GET all paths at once; over HTTPS they share one multiplexed HTTP/2 connection"""
+    async with httpx.AsyncClient(base_url=base_url, http2=True, timeout=timeout) as client:
+        responses = await asyncio.gather(*(client.get(path) for path in PATHS), return_exceptions=True)
+    return [r if isinstance(r, Exception) else (r.status_code, r.text) for r in responses]
+
+async def test_server(name, base_url, timeout):
+    """Test / and /health on one server"""
+    if base_url.startswith("https://"):
+        results = await fetch_multiplexed(base_url, timeout)
+    else:
+        results = await asyncio.to_thread(fetch_plain, base_url, timeout)
     
-except requests.exceptions.RequestException as e:
-    print(f"Error: {e}")
+    print(f"Testing {name} server...")
+    for path, result in zip(PATHS, results):
+        print(f"Testing {path}...")
+        if isinstance(result, Exception):
+            print(f"Error: {result}")
+            continue
+        status, text = result
+        print(f"Status: {status}")
+        print(f"Content: {text}")
+        print()
+
+local_server = "http://localhost:8083/"
+remote_server = 'https://bondy-backend-python-mi3a.onrender.com/' if True else 'https://bondy-oru7l52q.b4a.run/'
+
+parser = argparse.ArgumentParser(description="Probe / and /health on the remote server")
+parser.add_argument('--local', action='store_true', help=f"also probe the local server at {local_server} (plain HTTP, via urllib3)")
+args = parser.parse_args()
+
+# (name, url, timeout, enabled)
+servers = [
+    ("local", local_server, 5, args.local),
+    ("remote", remote_server, 10, True),
+]
+
+async def main():
+    # The servers are independent, so they are tested at the same time
+    await asyncio.gather(*(test_server(name, url, timeout) for name, url, timeout, enabled in servers if enabled))
+
+asyncio.run(main())
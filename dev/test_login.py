@@ -1,11 +1,42 @@
 #!/usr/bin/env python3
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import json
-import time
+import orjson
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-# Test login endpoint
-print("Testing /login endpoint...")
+# Set TEST_LOGIN_VERBOSE=1 to also log request/response bodies
+VERBOSE = os.environ.get("TEST_LOGIN_VERBOSE") == "1"
+
+# One keep-alive session per base_url, so calls to the same host reuse the TCP/TLS connection
+SESSIONS = {}
+
+# Retries transient cold-start errors (502/503/504, resets) with 0.5s, 1s, 2s backoff
+RETRY = Retry(
+    total=3,
+    backoff_factor=0.5,
+    status_forcelist=(502, 503, 504),
+    allowed_methods=frozenset(['GET', 'POST']),
+    respect_retry_after_header=True,
+)
+
+def _sess(base_url):
+    """Returns the shared session for base_url, creating it on first use"""
+    session = SESSIONS.get(base_url)
+    if session is None:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=RETRY)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        SESSIONS[base_url] = session
+    return session
+
+def parse(response):
+    """Parses a JSON response body straight from bytes with orjson"""
+    return orjson.loads(response.content)
 
 # Test data
 test_users = [
@@ -16,123 +47,128 @@ test_users = [
 ]
 
 def test_login(base_url, username):
-    """Test login with a specific username"""
-    print(f"\nTesting login with username: '{username}'")
+    """Test login with a specific username
+
+    The report is built first and printed in one go, so logins running in
+    parallel threads don't interleave their output.
+    """
+    lines = [f"\nTesting login with username: '{username}'"]
     
     try:
         # Prepare the request
         url = f"{base_url}/login"
-        headers = {'Content-Type': 'application/json'}
         data = {"username": username}
         
-        print(f"POST {url}")
-        print(f"Request body: {json.dumps(data)}")
+        lines.append(f"POST {url}")
+        if VERBOSE:
+            lines.append(f"Request body: {json.dumps(data)}")
         
         # Send the request
-        response = requests.post(url, json=data, headers=headers, timeout=10)
+        response = _sess(base_url).post(url, json=data, timeout=10)
         
-        print(f"Status: {response.status_code}")
-        print(f"Response headers: {dict(response.headers)}")
+        lines.append(f"Status: {response.status_code}")
+        if VERBOSE:
+            lines.append(f"Content-Type: {response.headers.get('content-type')}")
         
         try:
-            response_json = response.json()
-            print(f"Response body: {json.dumps(response_json, indent=2)}")
+            response_json = parse(response)
+            if VERBOSE:
+                lines.append(f"Response body: {response.text[:512]}")
             
             # Check if user was created or already existed
             if 'created' in response_json and response_json['created']:
-                print(f"✅ New user created with ID: {response_json['user_id']}")
+                lines.append(f"✅ New user created with ID: {response_json['user_id']}")
             elif 'user_id' in response_json:
-                print(f"✅ Existing user found with ID: {response_json['user_id']}")
+                lines.append(f"✅ Existing user found with ID: {response_json['user_id']}")
             else:
-                print("❌ Unexpected response format")
+                lines.append("❌ Unexpected response format")
                 
         except json.JSONDecodeError:
-            print(f"Response text: {response.text}")
+            lines.append(f"Response text: {response.text}")
             
     except requests.exceptions.RequestException as e:
-        print(f"❌ Error: {e}")
+        lines.append(f"❌ Error: {e}")
     
-    print("-" * 50)
+    lines.append("-" * 50)
+    print("\n".join(lines))
+
+def test_logins_parallel(base_url):
+    """Runs test_login for every test user concurrently (the calls are pure I/O wait)"""
+    _sess(base_url)  # create the shared session before the threads race for it
+    max_workers = min(len(test_users), min(32, (os.cpu_count() or 1) * 5))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(test_login, base_url, user_data["username"]) for user_data in test_users]
+        for future in as_completed(futures):
+            future.result()
+
+# Login error cases: (title, keyword arguments for the POST)
+ERROR_CASES = [
+    ("Test 1: Missing username", {"json": {}}),  # No username
+    ("Test 2: Empty username", {"json": {"username": ""}}),  # Empty username
+    ("Test 3: Invalid JSON", {"data": "invalid json", "headers": {'Content-Type': 'application/json'}}),
+]
 
 def test_login_error_cases(base_url):
-    """Test error cases for login"""
-    print("\nTesting error cases...")
+    """Test error cases for login (report printed once, like test_login)
+
+    The cases are independent, so they are sent at the same time and
+    reported afterwards in their original order.
+    """
+    url = f"{base_url}/login"
+    session = _sess(base_url)
     
-    # Test missing username
-    print("\nTest 1: Missing username")
-    try:
-        url = f"{base_url}/login"
-        headers = {'Content-Type': 'application/json'}
-        data = {}  # No username
-        
-        response = requests.post(url, json=data, headers=headers, timeout=10)
-        print(f"Status: {response.status_code}")
-        print(f"Response: {response.json()}")
-        
-        if response.status_code == 400:
-            print("✅ Correctly returned 400 for missing username")
-        else:
-            print("❌ Expected 400 status code")
-            
-    except Exception as e:
-        print(f"❌ Error: {e}")
+    def send(case):
+        try:
+            return session.post(url, timeout=10, **case[1]), None
+        except Exception as e:
+            return None, e
     
-    # Test empty username
-    print("\nTest 2: Empty username")
-    try:
-        url = f"{base_url}/login"
-        headers = {'Content-Type': 'application/json'}
-        data = {"username": ""}  # Empty username
-        
-        response = requests.post(url, json=data, headers=headers, timeout=10)
-        print(f"Status: {response.status_code}")
-        print(f"Response: {response.json()}")
-        
-    except Exception as e:
-        print(f"❌ Error: {e}")
+    with ThreadPoolExecutor(max_workers=len(ERROR_CASES)) as executor:
+        outcomes = list(executor.map(send, ERROR_CASES))
     
-    # Test invalid JSON
-    print("\nTest 3: Invalid JSON")
-    try:
-        url = f"{base_url}/login"
-        headers = {'Content-Type': 'application/json'}
-        
-        response = requests.post(url, data="invalid json", headers=headers, timeout=10)
-        print(f"Status: {response.status_code}")
-        print(f"Response: {response.text}")
-        
-    except Exception as e:
-        print(f"❌ Error: {e}")
-
-# Test local server
-print("=" * 60)
-print("TESTING LOCAL SERVER")
-print("=" * 60)
+    lines = ["\nTesting error cases..."]
+    for (title, kwargs), (response, error) in zip(ERROR_CASES, outcomes):
+        lines.append(f"\n{title}")
+        try:
+            if error is not None:
+                raise error
+            lines.append(f"Status: {response.status_code}")
+            lines.append(f"Response: {parse(response) if 'json' in kwargs else response.text}")
+            
+            if title.startswith("Test 1"):
+                if response.status_code == 400:
+                    lines.append("✅ Correctly returned 400 for missing username")
+                else:
+                    lines.append("❌ Expected 400 status code")
+                
+        except Exception as e:
+            lines.append(f"❌ Error: {e}")
+    
+    print("\n".join(lines))
 
-local_base_url = None#"http://localhost:8083"
+def run_suite(label, base_url):
+    """Runs the login tests and the error cases against one server"""
+    print("=" * 60)
+    print(f"TESTING {label} SERVER")
+    print("=" * 60)
 
-if local_base_url != None:
     # Test normal login cases
-    for user_data in test_users:
-        test_login(local_base_url, user_data["username"])
+    test_logins_parallel(base_url)
 
     # Test error cases
-    test_login_error_cases(local_base_url)
-
-    # Test remote server
-    print("\n" + "=" * 60)
-print("TESTING REMOTE SERVER")
-print("=" * 60)
+    test_login_error_cases(base_url)
 
-remote_base_url = 'https://bondy-backend-python-mi3a.onrender.com/' if False else "https://bondy-oru7l52q.b4a.run"
+if __name__ == "__main__":
+    # Test login endpoint
+    print("Testing /login endpoint...")
 
-if remote_base_url != None:
-    # Test normal login cases
-    for user_data in test_users:
-        test_login(remote_base_url, user_data["username"])
+    local_base_url = None#"http://localhost:8083"
+    remote_base_url = 'https://bondy-backend-python-mi3a.onrender.com/' if False else "https://bondy-oru7l52q.b4a.run"
 
-    # Test error cases 
-    test_login_error_cases(remote_base_url)
+    # The two servers are independent, so test them at the same time
+    suites = [(label, url) for label, url in (("LOCAL", local_base_url), ("REMOTE", remote_base_url)) if url is not None]
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        list(executor.map(lambda suite: run_suite(*suite), suites))
 
     print("\n" + "=" * 60)
     print("TESTING COMPLETED")
@@ -1,15 +1,72 @@
 #!/usr/bin/env python3
 
+import httpx
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import threading
+from concurrent.futures import ThreadPoolExecutor, wait
 import time
-import json
 
 # Configuration
 BASE_URL = "https://bondy-backend-python-mi3a.onrender.com"
 # BASE_URL = "http://localhost:8083"  # Uncomment for local testing
 
-def test_long_polling():
+# Shared session for the setup calls; transient cold-start errors
+# (502/503/504, resets) are retried with 0.5s, 1s, 2s backoff
+SESSION = requests.Session()
+_retry = Retry(
+    total=3,
+    backoff_factor=0.5,
+    status_forcelist=(502, 503, 504),
+    allowed_methods=frozenset(['GET', 'POST']),
+    respect_retry_after_header=True,
+)
+_adapter = HTTPAdapter(pool_connections=1, pool_maxsize=8, max_retries=_retry)
+SESSION.mount('http://', _adapter)
+SESSION.mount('https://', _adapter)
+
+# The long polls get their own session without retries: a reply after a long
+# wait is their normal outcome, and re-issuing them would hide the result.
+# Both polls are in flight together, so the pool keeps a socket for each.
+POLL_SESSION = requests.Session()
+_poll_adapter = HTTPAdapter(pool_connections=1, pool_maxsize=8, max_retries=0)
+POLL_SESSION.mount('http://', _poll_adapter)
+POLL_SESSION.mount('https://', _poll_adapter)
+
+# Against the HTTPS host the long polls and the notify POSTs share one HTTP/2
+# connection (requests is HTTP/1.1 only, so each in-flight call needs its own
+# socket). Locally plain HTTP/1.1 keep-alive is already free.
+REMOTE = httpx.Client(
+    http2=True,
+    timeout=httpx.Timeout(10.0, read=60.0),
+    limits=httpx.Limits(max_connections=4, max_keepalive_connections=4),
+)
+
+def _stream_client(base_url):
+    """Client for the long polls and the calls that overlap them"""
+    return REMOTE if base_url.startswith("https://") else POLL_SESSION
+
+def _poll(base_url, path, timeout):
+    """GETs a long-poll endpoint and returns (status, first body chunk)
+
+    Only a 200 carries a body worth reading, and the notification payload fits
+    in one chunk, so the response is closed right after it instead of being
+    drained.
+    """
+    url = f"{base_url}{path}"
+    if base_url.startswith("https://"):
+        with REMOTE.stream("GET", url, timeout=timeout) as response:
+            body = next(response.iter_bytes(), b'') if response.status_code == 200 else b''
+            return response.status_code, body.decode('utf-8', 'replace')
+    response = POLL_SESSION.get(url, timeout=timeout, stream=True)
+    try:
+        body = next(response.iter_content(chunk_size=8192), b'') if response.status_code == 200 else b''
+    finally:
+        response.close()
+    return response.status_code, body.decode('utf-8', 'replace')
+
+def test_long_polling(base_url=BASE_URL):
     """Test long-polling endpoints"""
     print("=" * 50)
     print("TESTING LONG-POLLING (NOTIFICATIONS)")
@@ -23,102 +80,102 @@ def test_long_polling():
         ("charlie", ["frontend", "notifications"])
     ]
     
-    for user, groups in setup_data:
+    def setup_user(user_groups):
+        """Sets the groups of one user; returns the line to report"""
+        user, groups = user_groups
         try:
             payload = {"groups": groups}
-            response = requests.post(
-                f"{BASE_URL}/user/{user}/groups", 
+            response = SESSION.post(
+                f"{base_url}/user/{user}/groups", 
                 json=payload, 
-                headers={'Content-Type': 'application/json'},
                 timeout=10
             )
-            print(f"Setup {user} with groups {groups}: {response.status_code}")
+            return f"Setup {user} with groups {groups}: {response.status_code}"
         except Exception as e:
-            print(f"Error setting up {user}: {e}")
+            return f"Error setting up {user}: {e}"
+    
+    # The setup calls are independent, so send them at the same time
+    with ThreadPoolExecutor(max_workers=len(setup_data)) as executor:
+        for line in executor.map(setup_user, setup_data):
+            print(line)
     
     print("\n2. Testing group-specific long-polling:")
     
-    def long_poll_group(group_name, duration=10):
-        """Long poll for a specific group"""
+    def long_poll_group(group_name, duration=10, ready_event=None):
+        """Long poll for a specific group; sets ready_event as the GET is issued"""
         print(f"[Thread] Starting long-poll for group '{group_name}'")
         try:
-            response = requests.get(
-                f"{BASE_URL}/subscribe/status?group={group_name}", 
-                timeout=duration + 5
-            )
+            if ready_event is not None:
+                ready_event.set()
+            status, content = _poll(base_url, f"/subscribe/status?group={group_name}", duration + 5)
             print(f"[Thread] Long-poll for '{group_name}' completed:")
-            print(f"[Thread] Status: {response.status_code}")
-            print(f"[Thread] Content: {response.text}")
-        except requests.exceptions.Timeout:
+            print(f"[Thread] Status: {status}")
+            print(f"[Thread] Content: {content}")
+        except (requests.exceptions.Timeout, httpx.TimeoutException):
             print(f"[Thread] Long-poll for '{group_name}' timed out (expected)")
         except Exception as e:
             print(f"[Thread] Error in long-poll for '{group_name}': {e}")
     
-    def long_poll_user(user_id, duration=10):
-        """Long poll for a specific user"""
+    def long_poll_user(user_id, duration=10, ready_event=None):
+        """Long poll for a specific user; sets ready_event as the GET is issued"""
         print(f"[Thread] Starting long-poll for user '{user_id}'")
         try:
-            response = requests.get(
-                f"{BASE_URL}/subscribe/user?user_id={user_id}", 
-                timeout=duration + 5
-            )
+            if ready_event is not None:
+                ready_event.set()
+            status, content = _poll(base_url, f"/subscribe/user?user_id={user_id}", duration + 5)
             print(f"[Thread] Long-poll for user '{user_id}' completed:")
-            print(f"[Thread] Status: {response.status_code}")
-            print(f"[Thread] Content: {response.text}")
-        except requests.exceptions.Timeout:
+            print(f"[Thread] Status: {status}")
+            print(f"[Thread] Content: {content}")
+        except (requests.exceptions.Timeout, httpx.TimeoutException):
             print(f"[Thread] Long-poll for user '{user_id}' timed out (expected)")
         except Exception as e:
             print(f"[Thread] Error in long-poll for user '{user_id}': {e}")
     
-    # Start background long-polling threads
-    print("\nStarting background long-polling threads...")
-    threads = []
-    
-    # Group-based long polling
-    group_thread = threading.Thread(target=long_poll_group, args=("frontend", 15))
-    group_thread.start()
-    threads.append(group_thread)
-    
-    # User-based long polling
-    user_thread = threading.Thread(target=long_poll_user, args=("alice", 15))
-    user_thread.start()
-    threads.append(user_thread)
-    
-    # Wait a bit for threads to start
-    time.sleep(2)
-    
-    # Test notifications
-    print("\n3. Testing notifications:")
-    
-    # Notify specific group
-    print("\nNotifying 'frontend' group:")
-    try:
-        response = requests.post(f"{BASE_URL}/notify/frontend", timeout=10)
-        print(f"Status: {response.status_code}")
-        print(f"Content: {response.text}")
-    except Exception as e:
-        print(f"Error notifying frontend: {e}")
-    
-    # Wait a bit
-    time.sleep(3)
-    
-    # Notify all groups
-    print("\nNotifying all groups:")
-    try:
-        response = requests.post(f"{BASE_URL}/notify/all", timeout=10)
-        print(f"Status: {response.status_code}")
-        print(f"Content: {response.text}")
-    except Exception as e:
-        print(f"Error notifying all: {e}")
-    
-    # Wait for threads to complete
-    print("\nWaiting for long-polling threads to complete...")
-    for thread in threads:
-        thread.join(timeout=20)
+    # Start background long-polling workers
+    print("\nStarting background long-polling workers...")
+    ready_group = threading.Event()
+    ready_user = threading.Event()
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        futures = [
+            executor.submit(long_poll_group, "frontend", 15, ready_group),  # Group-based long polling
+            executor.submit(long_poll_user, "alice", 15, ready_user),  # User-based long polling
+        ]
+        
+        # Wait until both polls have been issued instead of sleeping a fixed time
+        ready_group.wait(5)
+        ready_user.wait(5)
+        
+        # Test notifications
+        print("\n3. Testing notifications:")
+        
+        # Issued is not parked: a notify that reaches the server before a poll is
+        # registered (/subscribe/user looks up the groups first) is missed by it.
+        # So notify the 'frontend' group and all groups in a single request, and
+        # repeat it until both polls have been answered.
+        deadline = time.monotonic() + 20
+        while True:
+            print("\nNotifying 'frontend' and all groups:")
+            try:
+                response = _stream_client(base_url).post(
+                    f"{base_url}/notify/batch",
+                    json={"groups": ["frontend", "all"]},
+                    timeout=10
+                )
+                print(f"Status: {response.status_code}")
+                print(f"Content: {response.text}")
+            except Exception as e:
+                print(f"Error notifying groups: {e}")
+            
+            # Wait for the long polls to complete
+            print("\nWaiting for long-polling workers to complete...")
+            _, not_done = wait(futures, timeout=1)
+            if not not_done or time.monotonic() >= deadline:
+                break
+            print(f"{len(not_done)} poll(s) not answered yet, notifying again")
     
     print("\nLong-polling test completed!")
 
-def test_short_timeout_polling():
+def test_short_timeout_polling(base_url=BASE_URL):
     """Test long-polling with short timeout to verify timeout behavior"""
     print("\n" + "=" * 50)
     print("TESTING SHORT TIMEOUT POLLING")
@@ -127,12 +184,12 @@ def test_short_timeout_polling():
     print("\nTesting group polling with 3-second timeout (should timeout):")
     try:
         start_time = time.time()
-        response = requests.get(f"{BASE_URL}/subscribe/status?group=test", timeout=5)
+        status, content = _poll(base_url, "/subscribe/status?group=test", 5)
         end_time = time.time()
         duration = end_time - start_time
         
-        print(f"Status: {response.status_code}")
-        print(f"Content: {response.text}")
+        print(f"Status: {status}")
+        print(f"Content: {content}")
         print(f"Duration: {duration:.2f} seconds")
     except Exception as e:
         print(f"Error: {e}")
@@ -140,16 +197,20 @@ def test_short_timeout_polling():
     print("\nTesting user polling with 3-second timeout (should timeout):")
     try:
         start_time = time.time()
-        response = requests.get(f"{BASE_URL}/subscribe/user?user_id=testuser", timeout=5)
+        status, content = _poll(base_url, "/subscribe/user?user_id=testuser", 5)
         end_time = time.time()
         duration = end_time - start_time
         
-        print(f"Status: {response.status_code}")
-        print(f"Content: {response.text}")
+        print(f"Status: {status}")
+        print(f"Content: {content}")
         print(f"Duration: {duration:.2f} seconds")
     except Exception as e:
         print(f"Error: {e}")
 
+def run_suite(base_url=BASE_URL):
+    """Runs every notification test against one server"""
+    test_long_polling(base_url)
+    test_short_timeout_polling(base_url)
+
 if __name__ == "__main__":
-    test_long_polling()
-    test_short_timeout_polling()
+    run_suite()
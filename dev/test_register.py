@@ -1,18 +1,17 @@
-
-
-
-
-
-
 import requests
 
-url = "https://bondy-backend-python-mi3a.onrender.com/register"  # Replace with your actual URL
-response = requests.post(url, json={
-    "username": "asdedwqdodmqw",
-    "password": "testpassword",
-    "email": "asdedwqdodmqw@gmail.com"
-}, timeout=10)
-print(f"Status: {response.status_code}"
-)
-
-print(f"Content: {response.text}")
\ No newline at end of file
+def register(base_url):
+    """Registers a fixed test user and prints the reply"""
+    url = f"{base_url}/register"
+    response = requests.post(url, json={
+        "username": "asdedwqdodmqw",
+        "password": "testpassword",
+        "email": "asdedwqdodmqw@gmail.com"
+    }, timeout=10)
+    print(f"Status: {response.status_code}"
+    )
+
+    print(f"Content: {response.text}")
+
+if __name__ == "__main__":
+    register("https://bondy-backend-python-mi3a.onrender.com")  # Replace with your actual URL
@@ -1,13 +1,47 @@
 #!/usr/bin/env python3
 
 import requests
-import json
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import orjson
 import time
 import threading
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 
-# Test user subscription endpoint
-print("Testing /subscribe/user endpoint...")
+
+# Login and message calls retry transient cold-start errors (502/503/504, resets)
+# with 0.5s, 1s, 2s backoff
+SESSION = requests.Session()
+_retry = Retry(
+    total=3,
+    backoff_factor=0.5,
+    status_forcelist=(502, 503, 504),
+    allowed_methods=frozenset(['GET', 'POST']),
+    respect_retry_after_header=True,
+)
+_adapter = HTTPAdapter(pool_maxsize=16, max_retries=_retry)
+SESSION.mount('http://', _adapter)
+SESSION.mount('https://', _adapter)
+
+# Long polls go through a session without retries: a slow reply is expected there
+POLL_SESSION = requests.Session()
+
+def parse(response):
+    """Parses a JSON response body straight from bytes with orjson"""
+    return orjson.loads(response.content)
+
+def _preconnect(base_url):
+    """Fire-and-forget HEAD /health on the long-poll session
+
+    Runs while the login is in flight, so the dyno wakes up and the TLS
+    handshake for the subscription happens off the critical path.
+    """
+    def probe():
+        try:
+            POLL_SESSION.head(base_url + '/health', timeout=5)
+        except requests.exceptions.RequestException:
+            pass
+    threading.Thread(target=probe, daemon=True).start()
  
 
  
@@ -17,7 +51,6 @@ def send_test_message(base_url, user_id, group_id, content):
     
     try:
         url = f"{base_url}/messages"
-        headers = {'Content-Type': 'application/json'}
         data = {
             "userId": user_id,
             "groupId": group_id, 
@@ -27,7 +60,7 @@ def send_test_message(base_url, user_id, group_id, content):
         print(f"📡 POST {url}")
         print(f"📝 Message: {content}")
         
-        response = requests.post(url, json=data, headers=headers)
+        response = SESSION.post(url, json=data)
         print(f"📊 Status: {response.status_code}")
         
         if response.status_code == 200:
@@ -40,86 +73,88 @@ def send_test_message(base_url, user_id, group_id, content):
 
  
 def demo_subscription_workflow(base_url):
-    """Demonstrate the complete subscription workflow"""
-    print("\n" + "="*60)
-    print("🚀 SUBSCRIPTION WORKFLOW DEMO")
-    print("="*60)
-    
-    # Step 1: Login/create user
-    print("\n1️⃣  Creating/logging in user...")
+    """Demonstrate the complete subscription workflow
+
+    Output is collected and printed once at the end, so workflows running
+    side by side for different hosts don't interleave.
+    """
+    _preconnect(base_url)
+    lines = []
+    log = lines.append
     try:
-        login_response = requests.post(
-            f"{base_url}/login",
-            json={"username": "emily"},
-            headers={'Content-Type': 'application/json'}, 
-        )
-        if login_response.status_code == 200:
-            user_data = login_response.json()
-            user_id = user_data['user_id']
-            print(f"✅ User ID: {user_id}")
-            if user_data.get('created'):
-                print("🆕 New user created")
+        log("\n" + "="*60)
+        log("🚀 SUBSCRIPTION WORKFLOW DEMO")
+        log("="*60)
+    
+        # Step 1: Login/create user
+        log("\n1️⃣  Creating/logging in user...")
+        try:
+            login_response = SESSION.post(
+                f"{base_url}/login",
+                json={"username": "emily"},
+            )
+            if login_response.status_code == 200:
+                user_data = parse(login_response)
+                user_id = user_data['user_id']
+                log(f"✅ User ID: {user_id}")
+                if user_data.get('created'):
+                    log("🆕 New user created")
+                else:
+                    log("👤 Existing user found")
             else:
-                print("👤 Existing user found")
-        else:
-            print(f"❌ Login failed: {login_response.text}")
+                log(f"❌ Login failed: {login_response.text}")
 
+                return
+        except Exception as e:
+            log(f"❌ Login error: {e}")
             return
-    except Exception as e:
-        print(f"❌ Login error: {e}")
-        return
     
-    # Step 2: Start subscription in background with result container
-    print(f"\n2️⃣  Starting subscription for user {user_id}...")
+        # Step 2: Start subscription in background with result container
+        log(f"\n2️⃣  Starting subscription for user {user_id}...")
     
     
     
-    response = requests.get(base_url + '/subscribe/user?user_id=' + str(user_id),  )
+        # Only the first chunk is needed (the notification fits in it), so
+        # the socket is released without draining the response
+        response = POLL_SESSION.get(base_url + '/subscribe/user?user_id=' + str(user_id), stream=True)
+        try:
+            body = next(response.iter_content(chunk_size=8192), b'') if response.status_code != 204 else b''
+        finally:
+            response.close()
    
-    if response.status_code == 200:
-        print("✅ Subscription started successfully!")
-        subscription_result = response.json()
-        print('subscription_result', subscription_result)
-    else:
-        print(f"❌ Failed to start subscription: {response.text}") 
+        if response.status_code == 200:
+            log("✅ Subscription started successfully!")
+            subscription_result = orjson.loads(body)
+            log(f'subscription_result {subscription_result}')
+        else:
+            log(f"❌ Failed to start subscription: {response.status_code} {body.decode('utf-8', 'replace')}") 
         
     
-    # Step 6: Display subscription results
+        # Step 6: Display subscription results
     
-    print("\n✅ Demo completed!")
-
-# Test local server 
-print("TESTING LOCAL SERVER") 
+        log("\n✅ Demo completed!")
+    finally:
+        print("\n".join(lines))
 
-local_base_url = "http://localhost:8082"
+if __name__ == "__main__":
+    # Test user subscription endpoint
+    print("Testing /subscribe/user endpoint...")
 
-local_base_url = 'https://bondy-backend-python-mi3a.onrender.com'
-# Simple subscription test with result capture 
-#simple_result = test_user_subscription(local_base_url, "7", 10)
-#print(f"\n📋 Simple Test Result Summary:")
-#print(f"   Status: {simple_result.get('status', 'unknown')}")
-#print(f"   Duration: {simple_result.get('duration', 'unknown')} seconds")
-#if simple_result.get('response'):
-#    print(f"   Response: {simple_result['response']}")
+    # Test local server 
 
-# Full workflow demo
-demo_subscription_workflow(local_base_url)
+    local_base_url = "http://localhost:8082"
 
-#print("\n" + "=" * 60)
-print("TESTING REMOTE SERVER")
-#print("=" * 60)
+    local_base_url = 'https://bondy-backend-python-mi3a.onrender.com'
 
-remote_base_url = None #"https://bondy-backend-python-mi3a.onrender.com"
+    remote_base_url = None #"https://bondy-backend-python-mi3a.onrender.com"
 
-if remote_base_url is None:
-    print("❌ Remote server URL not set. Skipping remote tests.")
-else:
-    # Simple subscription test  
-    print("\n🧪 Simple subscription test (10 second timeout):")
-    test_user_subscription(remote_base_url, "123", 10)
+    if remote_base_url is None:
+        print("❌ Remote server URL not set. Skipping remote tests.")
 
-    # Full workflow demo
-    demo_subscription_workflow(remote_base_url)
+    # Full workflow demo, for both hosts at the same time
+    base_urls = [url for url in (local_base_url, remote_base_url) if url is not None]
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        list(executor.map(demo_subscription_workflow, base_urls))
 
     print("\n" + "=" * 60)
     print("🏁 ALL TESTS COMPLETED")
@@ -1,32 +1,57 @@
 #!/usr/bin/env python3
 
+import asyncio
+import httpx
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import json
+import orjson
 import time
-import threading
-from datetime import datetime
 
-# Test user subscription endpoint
-print("Testing /subscribe/user endpoint...")
 
-def test_user_subscription(base_url, user_id, timeout=30, result_container=None):
-    """Test user subscription with long polling"""
+# The login retries transient cold-start errors (502/503/504, resets)
+# with 0.5s, 1s, 2s backoff
+SESSION = requests.Session()
+_retry = Retry(
+    total=3,
+    backoff_factor=0.5,
+    status_forcelist=(502, 503, 504),
+    allowed_methods=frozenset(['GET', 'POST']),
+    respect_retry_after_header=True,
+)
+_adapter = HTTPAdapter(pool_maxsize=16, max_retries=_retry)
+SESSION.mount('http://', _adapter)
+SESSION.mount('https://', _adapter)
+
+def parse(response):
+    """Parses a JSON response body straight from bytes with orjson"""
+    return orjson.loads(response.content)
+
+async def test_user_subscription(client, base_url, user_id, timeout=30):
+    """Test user subscription with long polling
+
+    Run it as a task; the result dict comes back when the task is awaited.
+    """
     print(f"\n🔔 Starting long-poll subscription for user {user_id}")
     print(f"⏰ Waiting for notifications (timeout: {timeout}s)...")
     
     result = {"status": "started", "response": None, "error": None}
-    if result_container is not None:
-        result_container.clear()
-        result_container.append(result)
     
     try:
         url = f"{base_url}/subscribe/user?user_id={user_id}"
         print(f"📡 GET {url}")
         
-        start_time = datetime.now()
-        response = requests.get(url, timeout=timeout + 5)  # Add buffer to request timeout
-        end_time = datetime.now()
-        duration = (end_time - start_time).total_seconds()
+        start = time.monotonic()
+        # Add buffer to request timeout. Only the first chunk is read (the
+        # notification fits in it), so the stream is closed without draining
+        async with client.stream("GET", url, timeout=timeout + 5) as response:
+            body = b''
+            if response.status_code != 204:
+                async for body in response.aiter_bytes():
+                    break
+        text = body.decode('utf-8', 'replace')
+        duration = time.monotonic() - start
         
         print(f"⏱️  Response received after {duration:.1f} seconds")
         print(f"📊 Status: {response.status_code}")
@@ -37,10 +62,10 @@ def test_user_subscription(base_url, user_id, timeout=30, result_container=None)
         
         if response.status_code == 200:
             try:
-                response_json = response.json()
+                response_json = orjson.loads(body)
                 result["response"] = response_json
                 print(f"✅ Notification received!")
-                print(f"📨 Response: {json.dumps(response_json, indent=2)}")
+                print(f"📨 Response: {orjson.dumps(response_json, option=orjson.OPT_INDENT_2).decode()}")
                 
                 if response_json.get('change'):
                     print(f"🔔 Change detected in group: {response_json.get('notified_group', 'unknown')}")
@@ -49,113 +74,143 @@ def test_user_subscription(base_url, user_id, timeout=30, result_container=None)
                     print("ℹ️  Status update without specific change")
                     
             except json.JSONDecodeError:
-                result["response"] = response.text
-                print(f"📄 Raw response: {response.text}")
+                result["response"] = text
+                print(f"📄 Raw response: {text}")
                 
         elif response.status_code == 204:
             print(f"⏰ Long-poll timeout - No changes detected")
             result["response"] = "timeout"
             
         elif response.status_code == 400:
-            print(f"❌ Bad request: {response.text}")
-            result["response"] = response.text
+            print(f"❌ Bad request: {text}")
+            result["response"] = text
             
         else:
-            print(f"❓ Unexpected status: {response.text}")
-            result["response"] = response.text
+            print(f"❓ Unexpected status: {text}")
+            result["response"] = text
             
-    except requests.exceptions.Timeout:
+    except httpx.TimeoutException:
         error_msg = f"Request timeout after {timeout + 5}s"
         print(f"⏰ {error_msg}")
         result["status"] = "timeout"
         result["error"] = error_msg
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         error_msg = f"Request error: {e}"
         print(f"❌ Error: {e}")
         result["status"] = "error"
         result["error"] = error_msg
     
-    if result_container is not None:
-        result_container[0] = result
-    
     return result
 
-def send_test_message(base_url, user_id, group_id, content):
+async def send_test_message(client, base_url, user_id, group_id, content):
     """Send a test message to trigger notifications"""
-    print(f"\n📤 Sending test message...")
+    url = f"{base_url}/messages"
+    data = {
+        "userId": user_id,
+        "groupId": group_id, 
+        "content": content
+    }
+    lines = [f"\n📤 Sending test message...", f"📡 POST {url}", f"📝 Message: {content}"]
     
     try:
-        url = f"{base_url}/messages"
-        headers = {'Content-Type': 'application/json'}
-        data = {
-            "userId": user_id,
-            "groupId": group_id, 
-            "content": content
-        }
-        
-        print(f"📡 POST {url}")
-        print(f"📝 Message: {content}")
-        
-        response = requests.post(url, json=data, headers=headers, timeout=10)
-        print(f"📊 Status: {response.status_code}")
+        response = await client.post(url, json=data)
+        lines.append(f"📊 Status: {response.status_code}")
         
         if response.status_code == 200:
-            print(f"✅ Message sent successfully!")
+            lines.append(f"✅ Message sent successfully!")
         else:
-            print(f"❌ Failed to send message: {response.text}")
+            lines.append(f"❌ Failed to send message: {response.text}")
             
-    except Exception as e:
-        print(f"❌ Error sending message: {e}")
+    except httpx.HTTPError as e:
+        lines.append(f"❌ Error sending message: {e}")
+    
+    print("\n".join(lines))
+
+async def trigger_notification(client, base_url, group):
+    """Wake up the long polls waiting on a group ('all' for every group)"""
+    try:
+        response = await client.post(f"{base_url}/notify/{group}")
+        print(f"\n🔔 POST /notify/{group}: {response.status_code}")
+    except httpx.HTTPError as e:
+        print(f"\n❌ Error notifying {group}: {e}")
 
  
-def demo_subscription_workflow(base_url):
-    """Demonstrate the complete subscription workflow"""
+async def demo_subscription_workflow(base_url):
+    """Demonstrate the complete subscription workflow
+
+    Everything after the login is independent, so the test events go out
+    together with asyncio.gather instead of one after another. On HTTPS hosts
+    the long poll and the events share one HTTP/2 connection.
+    """
     print("\n" + "="*60)
     print("🚀 SUBSCRIPTION WORKFLOW DEMO")
     print("="*60)
     
-    # Step 1: Login/create user
-    print("\n1️⃣  Creating/logging in user...")
-    try:
-        login_response = requests.post(
-            f"{base_url}/login",
-            json={"username": "anna", 'password': 'test123'},
-            headers={'Content-Type': 'application/json'},
-            timeout=10
-        )
-        if login_response.status_code == 200:
-            user_data = login_response.json()
-            user_id = user_data['user_id']
-            print(f"✅ User ID: {user_id}")
-            if user_data.get('created'):
-                print("🆕 New user created")
+    timeout = httpx.Timeout(10.0, read=60.0)
+    limits = httpx.Limits(max_connections=4, max_keepalive_connections=4)
+    async with httpx.AsyncClient(http2=True, timeout=timeout, limits=limits) as client:
+        # Preconnect while the login runs: wakes the dyno and opens the HTTP/2
+        # connection the subscription and the events will use
+        preconnect = asyncio.create_task(client.head(f"{base_url}/health", timeout=5))
+        
+        # Step 1: Login/create user (through SESSION, to retry a cold start)
+        print("\n1️⃣  Creating/logging in user...")
+        try:
+            login_response = await asyncio.to_thread(
+                SESSION.post,
+                f"{base_url}/login",
+                json={"username": "anna", 'password': 'test123'},
+                timeout=10
+            )
+            if login_response.status_code == 200:
+                user_data = parse(login_response)
+                user_id = user_data['user_id']
+                print(f"✅ User ID: {user_id}")
+                if user_data.get('created'):
+                    print("🆕 New user created")
+                else:
+                    print("👤 Existing user found")
             else:
-                print("👤 Existing user found")
-        else:
-            print(f"❌ Login failed: {login_response.text}")
+                print(f"❌ Login failed: {login_response.text}")
+                return
+        except Exception as e:
+            print(f"❌ Login error: {e}")
             return
-    except Exception as e:
-        print(f"❌ Login error: {e}")
-        return
-    
-    
-    # Step 4: Trigger notifications
-    print("\n4️⃣  Triggering test events...")
-    
-    # Try to send a message (this might fail if no groups exist)
-    send_test_message(base_url, user_id, 7, f"Test message at {datetime.now()}")
-    
-    time.sleep(2)
-     
+        
+        try:
+            await preconnect
+        except httpx.HTTPError:
+            pass  # only a warm-up; the real calls report their own errors
+        
+        # Step 2: Start the subscription in the background
+        print(f"\n2️⃣  Starting subscription for user {user_id}...")
+        subscription = asyncio.create_task(test_user_subscription(client, base_url, user_id, 10))
+        await asyncio.sleep(0)  # let the poll go out before the events
+        
+        # Step 4: Trigger notifications, all at once
+        print("\n4️⃣  Triggering test events...")
+        
+        # The message might fail if no groups exist; the notify still wakes the poll
+        await asyncio.gather(
+            send_test_message(client, base_url, user_id, 7, f"Test message at {time.time():.3f}"),
+            trigger_notification(client, base_url, "all"),
+        )
+        
+        # Step 5: Collect the subscription result
+        result = await asyncio.wait_for(subscription, timeout=20)
+        print(f"\n5️⃣  Subscription finished: {result['status']}")
      
     print("\n✅ Demo completed!")
 
-# Test local server 
+if __name__ == "__main__":
+    # Test user subscription endpoint
+    print("Testing /subscribe/user endpoint...")
 
-local_base_url = "http://localhost:8082"
+    # Test local server 
 
-local_base_url = 'https://bondy-backend-python-mi3a.onrender.com'
- 
-# Full workflow demo
-demo_subscription_workflow(local_base_url)
- 
\ No newline at end of file
+    local_base_url = "http://localhost:8082"
+
+    local_base_url = 'https://bondy-backend-python-mi3a.onrender.com'
+
+    # Full workflow demo
+    asyncio.run(demo_subscription_workflow(local_base_url))
@@ -1,56 +1,235 @@
 import os
+import sys
 import threading 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection
+from urllib3.util.retry import Retry
 import socket # For raw socket programming
+import re
+import struct
+import selectors # Event loop for accepting and reading connections (epoll on Linux)
 import json   # For handling JSON responses 
-from database.database import SessionLocal, User, Grupo, Message, add_message
+import queue # Hands parked /subscribe/status clients to the long-poll thread
+import collections
+from urllib.parse import parse_qsl, unquote
+import logging
+try:
+    import orjson # Faster JSON encode/decode; dumps already returns bytes and serializes datetimes itself
+    _json_dumps = lambda obj: orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_NAIVE_UTC)
+    _json_loads = orjson.loads
+except ImportError:
+    _json_dumps = lambda obj: json.dumps(obj, default=lambda value: value.isoformat()).encode('utf-8')
+    _json_loads = json.loads
+try:
+    import httptools # C HTTP parser (llhttp); parse_http_request falls back to regexes without it
+except ImportError:
+    httptools = None
+from database.database import SessionLocal, read_session, User, Grupo, Message, add_message, get_user_chats, get_group_messages, get_recent_group_messages, get_group_member_list, MAX_USERNAME_LENGTH, MAX_GROUP_NAME_LENGTH
 import time # Para um pequeno atraso
+from concurrent.futures import ThreadPoolExecutor
 import bcrypt
+
+log = logging.getLogger(__name__)
  
 # --- Global State Variables ---
 # These variables hold the system's operational status.
 # A threading.Lock is used to ensure thread-safe access to these shared variables
 # because both the HTTP server's client handlers (separate threads)
 # and the SyncManager (separate thread) will be reading from and writing to them.
-state_lock = threading.RLock()
+state_lock = threading.Lock() # Never taken twice by one thread, so no RLock owner bookkeeping
 _is_alive = True  # Indicates if the system is fundamentally operational
 _is_active = os.getenv('IS_ACTIVE', 'false').lower() == 'true' # Active in a cluster
 _peer_url = os.getenv('PEER_URL', None) # URL of a peer system for active/passive sync
+_state_version = 0 # Bumped on every _is_alive/_is_active change; /subscribe/status?since= compares against it
 
 # --- Event Notification Mechanism ---
-# Dictionary to store condition variables for different groups
-# Each group has its own condition variable for targeted notifications
-group_conditions = {}
-group_conditions_lock = threading.Lock()  # Protects the group_conditions dictionary
+# Long-poll clients are parked on long_poller (below), indexed by group. A notification
+# wakes only the clients of that group; _state_version lets a reconnecting client tell
+# whether it missed a change, so nothing needs to block on a lock or condition.
 
-def get_or_create_group_condition(group_name):
-    """
-    Gets or creates a condition variable for a specific group.
-    Thread-safe creation of condition variables.
-    """
-    with group_conditions_lock:
-        if group_name not in group_conditions:
-            group_conditions[group_name] = threading.Condition(state_lock)
-        return group_conditions[group_name]
+MAX_PARKED_BYTES = 64 * 1024 # Most a parked client may pipeline before it is disconnected
 
-def get_active_groups():
+class LongPoller(threading.Thread):
     """
-    Returns a list of currently active group names.
-    Useful for debugging and monitoring.
+    Holds every long-poll (/subscribe/status and /subscribe/user) on one thread.
+    The handler parks the client socket here and goes back to the pool; this thread
+    waits on all parked sockets with one selector and answers them when one of
+    their groups is notified (200) or when their 25 seconds run out (204).
     """
-    with group_conditions_lock:
-        return list(group_conditions.keys())
+    def __init__(self, timeout=25):
+        super().__init__(name="LongPollThread")
+        self.daemon = True
+        self.timeout = timeout
+        self.selector = selectors.DefaultSelector()
+        self._commands = queue.SimpleQueue() # Filled by other threads, drained by this one
+        # Writing a byte to this pair wakes the selector when a command arrives
+        self._wake_reader, self._wake_writer = socket.socketpair()
+        self._wake_reader.setblocking(False)
+        self._wake_writer.setblocking(False)
+        self.selector.register(self._wake_reader, selectors.EVENT_READ)
+        # Only touched by this thread
+        self._waiters = {} # conn -> (addr, group_names, on_notify, keep_alive, pipelined bytes)
+        self._groups = {} # group_name -> set of conns
+        self._deadlines = collections.deque() # (deadline, conn); every poll waits the same time, so arrival order is deadline order
+        self._latest = None # (version, is_alive, is_active) of the newest notification seen
+
+    def park(self, conn, addr, group_names, on_notify=None, keep_alive=False, pipelined=b""):
+        """
+        Hands a long-poll client over to this thread, waiting on every group in group_names.
+        Without on_notify the client gets the prebuilt status response. Otherwise
+        on_notify(conn, addr, group_name, leftover) runs on the worker pool to answer it (and close it).
+        With keep_alive the answered connection goes back to the event loop instead of being closed,
+        together with the leftover bytes the client pipelined (pipelined: those already read with the request).
+        """
+        self._commands.put(('park', conn, addr, tuple(group_names), on_notify, keep_alive, pipelined))
+        self._wake()
+
+    def notify(self, group_name, is_alive_val, is_active_val, version):
+        """Answers the clients parked on group_name (all groups when None) with the given state.
+        Does not need state_lock: the version orders notifications that race each other."""
+        self._commands.put(('notify', group_name, is_alive_val, is_active_val, version))
+        self._wake()
+
+    def _wake(self):
+        try:
+            self._wake_writer.send(b'\0')
+        except OSError:
+            pass # Buffer full: a wake-up is already pending
+
+    def _release(self, conn):
+        """Stops waiting on conn and returns its (addr, group_names, on_notify, keep_alive, leftover)."""
+        waiter = self._waiters.pop(conn)
+        for group_name in waiter[1]:
+            conns = self._groups[group_name]
+            conns.discard(conn)
+            if not conns:
+                del self._groups[group_name]
+        self.selector.unregister(conn)
+        return waiter
+
+    def _finish(self, conn, payload):
+        addr, _, _, keep_alive, leftover = self._release(conn)
+        if payload is not None:
+            try:
+                # A few hundred bytes into an empty send buffer: one non-blocking send almost always takes them
+                sent = conn.send(payload)
+            except BlockingIOError:
+                sent = 0
+            except OSError as e:
+                log.error("Failed to answer long-poll for %s: %s", addr, e)
+                sent = None
+            if sent is not None and sent < len(payload):
+                # The rest is sent with a blocking sendall on a worker, so this thread never waits on one client
+                if self._submit(conn, addr, finish_answer, memoryview(payload)[sent:], keep_alive, leftover):
+                    return
+                log.error("Failed to answer long-poll for %s: no worker free for the rest of the answer", addr)
+            elif sent is not None and keep_alive:
+                return_connection(conn, addr, leftover)
+                return
+        try:
+            conn.close()
+        except OSError:
+            pass
+
+    def _submit(self, conn, addr, fn, *args):
+        """Runs fn(conn, addr, *args) on the worker pool, taking a request slot like any request.
+        Returns False, leaving conn untouched, when every slot is in use."""
+        if not request_slots.acquire(blocking=False):
+            return False
+        conn.setblocking(True)
+        request_executor.submit(run_in_slot, fn, conn, addr, *args)
+        return True
+
+    def _hand_over(self, conn, group_name):
+        """Gives conn back to the worker pool, where its on_notify builds the answer."""
+        addr, _, on_notify, _, leftover = self._release(conn)
+        if self._submit(conn, addr, on_notify, group_name, leftover):
+            return
+        log.debug("Too many requests in flight, answering long-poll %s with 503", addr)
+        try:
+            conn.send(BUSY_RESPONSE)
+        except OSError:
+            pass
+        conn.close()
 
-def remove_group_condition(group_name):
-    """
-    Removes a group condition variable. Use with caution.
-    Should only be called when you're sure no threads are waiting on it.
-    """
-    with group_conditions_lock:
-        if group_name in group_conditions:
-            del group_conditions[group_name]
-            return True
-        return False
+    def _run_commands(self):
+        while True:
+            try:
+                command = self._commands.get_nowait()
+            except queue.Empty:
+                return
+            if command[0] == 'park':
+                _, conn, addr, group_names, on_notify, keep_alive, pipelined = command
+                conn.setblocking(False)
+                self._waiters[conn] = (addr, group_names, on_notify, keep_alive, bytearray(pipelined))
+                for group_name in group_names:
+                    self._groups.setdefault(group_name, set()).add(conn)
+                self._deadlines.append((time.monotonic() + self.timeout, conn))
+                self.selector.register(conn, selectors.EVENT_READ) # Readable means the client hung up
+            else:
+                _, group_name, is_alive_val, is_active_val, version = command
+                # Setters notify after releasing state_lock, so two changes can arrive out of order;
+                # never answer with a state older than one already seen
+                if self._latest is not None and version < self._latest[0]:
+                    version, is_alive_val, is_active_val = self._latest
+                else:
+                    self._latest = (version, is_alive_val, is_active_val)
+                names = list(self._groups) if group_name is None else [group_name]
+                for name in names:
+                    conns = self._groups.get(name)
+                    if not conns:
+                        continue
+                    log.info("Notified of state change in group '%s'. Answering %s client(s).", name, len(conns))
+                    payload = None # One status response per group, shared by every client of that group
+                    for conn in list(conns):
+                        if self._waiters[conn][2] is not None:
+                            self._hand_over(conn, name)
+                            continue
+                        if payload is None:
+                            payload = status_change_response(name, is_alive_val, is_active_val, version)
+                        self._finish(conn, payload)
+
+    def _expire(self):
+        now = time.monotonic()
+        while self._deadlines and self._deadlines[0][0] <= now:
+            _, conn = self._deadlines.popleft()
+            if conn in self._waiters: # Otherwise it was already answered
+                addr, group_names = self._waiters[conn][:2]
+                log.info("Long-poll timeout for %s in groups %s. No state change. Sending 204.", addr, list(group_names))
+                self._finish(conn, NO_CHANGE_RESPONSE)
+
+    def run(self):
+        while True:
+            timeout = self._deadlines[0][0] - time.monotonic() if self._deadlines else None
+            for key, _ in self.selector.select(timeout if timeout is None else max(timeout, 0)):
+                if key.fileobj is self._wake_reader:
+                    try:
+                        while self._wake_reader.recv(4096):
+                            pass
+                    except BlockingIOError:
+                        pass
+                elif key.fileobj in self._waiters:
+                    try:
+                        data = key.fileobj.recv(4096)
+                        hung_up = not data
+                    except BlockingIOError:
+                        data, hung_up = b'', False
+                    except OSError:
+                        data, hung_up = b'', True
+                    if hung_up:
+                        self._finish(key.fileobj, None)
+                    else:
+                        # The client's next request, pipelined: kept for when the connection goes back to the event loop
+                        leftover = self._waiters[key.fileobj][4]
+                        leftover.extend(data)
+                        if len(leftover) > MAX_PARKED_BYTES:
+                            log.info("Long-poll client %s sent more than %s bytes while parked. Closing.", self._waiters[key.fileobj][0], MAX_PARKED_BYTES)
+                            self._finish(key.fileobj, None)
+            self._run_commands()
+            self._expire()
+
+long_poller = LongPoller()
 
 # --- Helper functions for thread-safe access to global state ---
 
@@ -61,13 +240,22 @@ def get_is_alive():
 
 def set_is_alive(val):
     """Thread-safe setter for _is_alive."""
-    global _is_alive
+    global _is_alive, _state_version
     with state_lock:
         old_is_alive = _is_alive
         _is_alive = val
-        if old_is_alive != _is_alive:
-            print(f"State Change: _is_alive changed from {old_is_alive} to {_is_alive}. Notifying clients.")
-            notify_clients_of_state_change()
+        if old_is_alive == _is_alive:
+            return
+        _state_version += 1
+        state = (_is_alive, _is_active, _state_version)
+    # Logging and the wake-up happen outside state_lock, so readers are not held up by them
+    log.info("State Change: _is_alive changed from %s to %s. Notifying clients.", old_is_alive, val)
+    long_poller.notify(None, *state)
+
+def get_state():
+    """Thread-safe snapshot of (_is_alive, _is_active) with one lock acquire."""
+    with state_lock:
+        return _is_alive, _is_active
 
 def get_is_active():
     """Thread-safe getter for _is_active."""
@@ -77,37 +265,46 @@ def get_is_active():
 def set_is_active(val):
     """Thread-safe setter for _is_active."""
  
-    global _is_active
+    global _is_active, _state_version
     with state_lock:
         old_is_active = _is_active
         _is_active = val
-        if old_is_active != _is_active:
-            print(f"State Change: _is_active changed from {old_is_active} to {_is_active}. Notifying clients.")
-            notify_clients_of_state_change()
+        if old_is_active == _is_active:
+            return
+        _state_version += 1
+        state = (_is_alive, _is_active, _state_version)
+    # Logging and the wake-up happen outside state_lock, so readers are not held up by them
+    log.info("State Change: _is_active changed from %s to %s. Notifying clients.", old_is_active, val)
+    long_poller.notify(None, *state)
+    if val:
+        membership_changed() # The peer may have changed memberships while this node was passive
 
 def notify_clients_of_state_change(group_name=None):
     """
-    Notifies all threads waiting on condition variables that a state has changed.
-    If group_name is specified, only notifies that specific group.
+    Answers the long-poll clients waiting on group_name with the current state.
     If group_name is None, notifies all groups.
     """
-    with group_conditions_lock:
-        if group_name:
-            # Notify only the specific group
-            if group_name in group_conditions:
-                with group_conditions[group_name]:
-                    group_conditions[group_name].notify_all()
-        else:
-            # Notify all groups
-            for condition in group_conditions.values():
-                with condition:
-                    condition.notify_all()
+    with state_lock:
+        state = (_is_alive, _is_active, _state_version)
+    long_poller.notify(group_name, *state)
 
 # --- SyncManager Class (runs in a separate thread) ---
+class NoDelayAdapter(HTTPAdapter):
+    """HTTPAdapter whose sockets have TCP_NODELAY set (the /health polls are tiny requests)."""
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs['socket_options'] = HTTPConnection.default_socket_options + [(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)]
+        super().init_poolmanager(*args, **kwargs)
+
+PEER_SYNC_GROUP = 'health' # Long-poll group the SyncManager waits on at the peer (state changes notify every group)
+# Retries ride out a peer that is restarting or a proxy hiccup (connection refused, 502/504)
+# without flipping _is_active. Read timeouts are not retried: they would stretch the 30 s
+# long-poll, and 503 is the peer saying it is inactive, so it must reach run().
+PEER_RETRIES = Retry(total=3, connect=3, read=0, status=3, backoff_factor=0.1, status_forcelist=(502, 504))
+
 class SyncManager(threading.Thread):
     """
     Manages synchronization of the 'isActive' status with a peer system.
-    Runs in its own thread to periodically check the peer's health.
+    Runs in its own thread and long-polls the peer's /subscribe/status for changes.
     """
     def __init__(self, get_alive_func, set_active_func, get_active_func, peer_url):
         super().__init__(name="SyncManagerThread") # Assign a name for easier debugging
@@ -117,57 +314,93 @@ class SyncManager(threading.Thread):
         self.peer_url = peer_url
         self._stop_event = threading.Event()
         self.daemon = True
+        # One keep-alive session for every poll, so DNS and the TLS handshake are not repeated
+        self.session = requests.Session()
+        self.session.mount('http://', NoDelayAdapter(pool_connections=1, pool_maxsize=1, max_retries=PEER_RETRIES))
+        self.session.mount('https://', NoDelayAdapter(pool_connections=1, pool_maxsize=1, max_retries=PEER_RETRIES))
+
+    def _apply_peer_state(self, peer_is_active, is_me_primary):
+        if peer_is_active is True:
+            if self.get_active():
+                if not is_me_primary:
+                    # If I'm Secondary and peer is active, I should yield to Primary
+                    self.set_active(False)
+                    log.info("SyncManager: Peer is active, setting self to inactive (yielding to Primary).")
+        elif peer_is_active is False:
+         
+            if not self.get_active():
+                self.set_active(True)
+                log.info("SyncManager: Peer is inactive, setting self to active.")
 
     def run(self):
         if not self.peer_url:
-            print("SyncManager: PEER_URL not set. Skipping peer synchronization.")
+            log.info("SyncManager: PEER_URL not set. Skipping peer synchronization.")
             return
 
-        print(f"SyncManager started, syncing with peer: {self.peer_url}/health")
+        log.info("SyncManager started, long-polling peer: %s/subscribe/status?group=%s", self.peer_url, PEER_SYNC_GROUP)
 
         is_me_primary = os.getenv('IS_PRIMARY', 'false').lower() == 'true' 
+        # The long-poll only reports changes, so the current state is read from /health
+        # at startup and again after any error
+        need_snapshot = True
+        peer_version = None # Last state version the peer reported, sent back as ?since=
         
+        time.sleep(3)
         while not self._stop_event.is_set():
-            time.sleep(3)
             try:
-                if self.get_alive():
-                    response = requests.get(f"{self.peer_url}/health", timeout=5)
-                    response.raise_for_status()
-                    peer_status = response.json()
-                    
-                    peer_is_active = peer_status.get('active') == True
-                     
-                    if peer_is_active is True:
-                        if self.get_active():
-                            if not is_me_primary:
-                                # If I'm Secondary and peer is active, I should yield to Primary
-                                self.set_active(False)
-                                print("SyncManager: Peer is active, setting self to inactive (yielding to Primary).")
-                    elif peer_is_active is False:
-                     
-                        if not self.get_active():
-                            self.set_active(True)
-                            print("SyncManager: Peer is inactive, setting self to active.")
-                    
-                else:
+                if not self.get_alive():
                     if self.get_active():
                         self.set_active(False)
-                        print("SyncManager: This node is not alive, forcing self to inactive.")
+                        log.info("SyncManager: This node is not alive, forcing self to inactive.")
+                    need_snapshot = True
+                    self._stop_event.wait(5)
+                    continue
+
+                if need_snapshot:
+                    response = self.session.get(f"{self.peer_url}/health", timeout=5)
+                    response.raise_for_status()
+                    self._apply_peer_state(response.json().get('active') == True, is_me_primary)
+                    need_snapshot = False
+                    continue
+
+                # The peer holds this request until its state changes, or answers 204 after ~25 s.
+                # With since=, a change made between two polls is answered right away.
+                # Its own group keeps client /notify/{group} calls from waking this poll.
+                since = '' if peer_version is None else f"&since={peer_version}"
+                response = self.session.get(f"{self.peer_url}/subscribe/status?group={PEER_SYNC_GROUP}{since}", timeout=30)
+                if response.status_code == 204:
+                    # No change: the peer served the request, so it is still active
+                    self._apply_peer_state(True, is_me_primary)
+                    continue
+                if response.status_code == 503:
+                    # The peer rejects /subscribe/status while it is not alive or not active
+                    self._apply_peer_state(False, is_me_primary)
+                    need_snapshot = True
+                    self._stop_event.wait(5)
+                    continue
+                response.raise_for_status()
+                peer_status = response.json()
+                peer_version = peer_status.get('version')
+                self._apply_peer_state(peer_status.get('active') == True, is_me_primary)
 
             except requests.exceptions.RequestException as e:
-                print('SyncManager: Error communicating with peer:', e)
+                log.error("SyncManager: Error communicating with peer: %s", e)
                 
-                print('SyncManager: checking if self is active')
+                log.info("SyncManager: checking if self is active")
                 if not self.get_active():
-                    print("SyncManager: Self is not active, setting self to active.")
+                    log.info("SyncManager: Self is not active, setting self to active.")
                     self.set_active(True) 
                 #if self.get_active(): 
                     #self.set_active(False) # This will trigger notify_clients_of_state_change()
                     #print(f"SyncManager: Error communicating with peer ({self.peer_url}/health): {e}. Setting self to inactive.")
+                need_snapshot = True
+                self._stop_event.wait(5)
             except Exception as e:
-                print(f"SyncManager: An unexpected error occurred: {e}")
-              
-            self._stop_event.wait(5)
+                log.info("SyncManager: An unexpected error occurred: %s", e)
+                need_snapshot = True
+                self._stop_event.wait(5)
+
+        self.session.close()
 
     def stop(self):
         self._stop_event.set()
@@ -176,750 +409,1000 @@ class SyncManager(threading.Thread):
 
 HTTP_STATUS_CODES = {
     200: "OK",
+    201: "Created",
     400: "Bad Request",
+    401: "Unauthorized",
     404: "Not Found",
+    409: "Conflict",
     500: "Internal Server Error",
     503: "Service Unavailable",
     204: "No Content" # For long-polling timeout with no data
 }
+# Status and Content-Type lines encoded once at import, so a response only formats its length
+STATUS_LINES = {code: f"HTTP/1.1 {code} {message}\r\n".encode('ascii') for code, message in HTTP_STATUS_CODES.items()}
+CONTENT_TYPE_LINES = {content_type: f"Content-Type: {content_type}\r\n".encode('ascii') for content_type in ('application/json', 'text/plain', 'text/html')}
+
+# Every response shares the same header block; only the status line, content type, length
+# and the Connection line vary. HTTP/1.1 connections stay open unless "Connection: close" is sent.
+CONNECTION_CLOSE = b"Connection: close\r\n"
+_RESP_TMPL = (
+    b"%b" # Status line
+    b"%b" # Content-Type line
+    b"Content-Length: %d\r\n"
+    b"%b"
+    # CORS headers
+    b"Access-Control-Allow-Origin: *\r\n"
+    b"Access-Control-Allow-Methods: GET, POST, PUT, DELETE, OPTIONS, HEAD\r\n"
+    b"Access-Control-Allow-Headers: Content-Type, Authorization, X-Requested-With\r\n"
+    b"Access-Control-Max-Age: 86400\r\n" # Cache preflight for 24 hours
+    b"\r\n"
+)
+
+REQUEST_LINE_RE = re.compile(rb'(\S+) (\S+) (\S+)') # method, path, HTTP version
+HEADER_LINE_RE = re.compile(rb'([^:\r\n]+):[ \t]*([^\r\n]*)')
+CONTENT_LENGTH_RE = re.compile(rb'\r\ncontent-length:[ \t]*(\d+)', re.IGNORECASE)
+
+class Request:
+    """A parsed HTTP request. Slotted: attribute reads are cheaper than dict lookups."""
+    __slots__ = ('method', 'path', 'query', 'headers', 'body', 'keep_alive', 'state', 'pipelined')
+
+    def __init__(self, method, path, headers, body, keep_alive=False):
+        self.method = method
+        self.path = path
+        self.query = None # {name: value} from the query string, filled by handle_client
+        self.headers = headers
+        self.body = body
+        self.keep_alive = keep_alive # HTTP/1.1 client that did not send "Connection: close"
+        self.state = None # (is_alive, is_active), read once by handle_client
+        self.pipelined = b"" # Bytes the client sent after this request, set by handle_client
+
+class _NextRequest(Exception):
+    """Raised by RequestCollector.on_message_begin to stop at the end of its request."""
+
+class RequestCollector:
+    """
+    httptools parser callbacks: collects the method, URL, headers and body of one request.
+    Data can be fed as it arrives; message_complete turns True once the whole
+    request, body included, has been read. Parsing stops there: a pipelined
+    request that follows only sets next_request and is left for a new collector.
+    """
+    def __init__(self):
+        self.method = b""
+        self.url = b""
+        self.headers = {}
+        self.body = b""
+        self.headers_complete = False
+        self.message_complete = False
+        self.next_request = False # Data of another request followed this one
+        self.keep_alive = False
+        self.parser = httptools.HttpRequestParser(self)
+
+    def feed(self, data):
+        """Parses the next piece of the request. Raises httptools.HttpParserError on bad input."""
+        try:
+            self.parser.feed_data(data)
+        except httptools.HttpParserCallbackError:
+            if not self.next_request:
+                raise # Otherwise on_message_begin stopped the parser on purpose
+
+    def on_message_begin(self):
+        if self.message_complete:
+            self.next_request = True
+            raise _NextRequest() # Aborts feed_data before the next request's callbacks run
+
+    def on_url(self, url):
+        self.url += url # May arrive in several pieces
+
+    def on_header(self, name, value):
+        self.headers[name.strip().lower().decode('utf-8')] = value.rstrip().decode('utf-8')
+
+    def on_headers_complete(self):
+        self.headers_complete = True
+        self.method = self.parser.get_method()
+        self.keep_alive = self.parser.get_http_version() == '1.1' and self.parser.should_keep_alive()
 
-def parse_http_request(raw_request_data):
+    def on_body(self, body):
+        self.body += body
+
+    def on_message_complete(self):
+        self.message_complete = True
+
+    def parsed(self):
+        """(method, path, headers, raw_body, keep_alive) once the headers are complete."""
+        return self.method.decode('ascii'), self.url.decode('utf-8'), self.headers, self.body, self.keep_alive
+
+def parse_request_head_httptools(raw_request_data):
     """
-    Manually parses a raw HTTP request.
-    Returns a dictionary with 'method', 'path', 'headers', and 'body'.
+    Parses the request with httptools.
+    Returns (method, path, headers, raw_body, keep_alive), or None when httptools rejects the
+    request or the headers are incomplete, so the regex parser can handle it.
     """
+    collector = RequestCollector()
     try:
-        # Try UTF-8 first, fallback to latin-1 if that fails
-        #try:
-        decoded_data = raw_request_data.decode('utf-8')
-        #except UnicodeDecodeError:
-        #print(f"DEBUG: UTF-8 decode failed, trying latin-1. Raw data length: {len(raw_request_data)}")
-        # latin-1 can decode any byte sequence
-        #decoded_data = raw_request_data.decode('latin-1')
-        
-        print(f"DEBUG: Successfully decoded request data: {decoded_data[:200]}...")  # Show first 200 chars
-        request_lines = decoded_data.split('\r\n')
+        collector.feed(raw_request_data)
+    except httptools.HttpParserError:
+        return None
+    if not collector.headers_complete:
+        return None
+    return collector.parsed()
+
+def parse_request_head_regex(raw_request_data):
+    """Parses the request with the precompiled regexes. Returns (method, path, headers, raw_body, keep_alive)."""
+    # Split once at the end of the headers; the body stays as bytes
+    header_end = raw_request_data.find(b'\r\n\r\n')
+    if header_end == -1:
+        head, raw_body = raw_request_data, b""
+    else:
+        head, raw_body = raw_request_data[:header_end], raw_request_data[header_end + 4:]
+    
+    # Parse request line (e.g., GET /health HTTP/1.1)
+    line_end = head.find(b'\r\n')
+    request_line = head if line_end == -1 else head[:line_end]
+    if not request_line:
+        raise ValueError("Empty request data")
+    
+    match = REQUEST_LINE_RE.match(request_line)
+    if not match:
+        raise ValueError(f"Invalid HTTP request line: {request_line.decode('utf-8')}")
+    
+    method = match.group(1).decode('ascii')
+    path = match.group(2).decode('utf-8')
+    
+    headers = {}
+    if line_end != -1:
+        for name, value in HEADER_LINE_RE.findall(head, line_end + 2):
+            headers[name.strip().lower().decode('utf-8')] = value.rstrip().decode('utf-8')
+    keep_alive = match.group(3) == b'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+    return method, path, headers, raw_body, keep_alive
+
+def find_request_end(buffer, scan_from, size):
+    """
+    For the regex parser (httptools tracks this itself): looks for the end of the
+    headers in buffer[scan_from:size] and returns the length of the whole request,
+    headers plus the Content-Length body they announce, or None while the headers
+    are incomplete. Callers pass the previous size minus 3 as scan_from, so each
+    read is only scanned once and a CRLFCRLF split across two reads is still found.
+    """
+    header_end = buffer.find(b'\r\n\r\n', max(scan_from, 0), size)
+    if header_end == -1:
+        return None
+    match = CONTENT_LENGTH_RE.search(buffer, 0, header_end)
+    return header_end + 4 + (int(match.group(1)) if match else 0)
+
+def parse_http_request(raw_request_data, collector=None):
+    """
+    Parses a raw HTTP request, with httptools when it is installed.
+    collector is the RequestCollector the event loop already fed while reading;
+    when its headers are complete its result is used instead of parsing again.
+    Returns a Request with method, path, headers and body.
+    """
+    try:
+        log.debug("Received request head: %s...", raw_request_data[:200])  # Show first 200 bytes
         
-        # Parse request line (e.g., GET /health HTTP/1.1)
-        if not request_lines or not request_lines[0]:
-            raise ValueError("Empty request data")
-            
-        request_line_parts = request_lines[0].split(' ')
-        if len(request_line_parts) < 3:
-            raise ValueError(f"Invalid HTTP request line: {request_lines[0]}")
+        if collector is not None and collector.headers_complete:
+            parsed = collector.parsed()
+        elif httptools is not None:
+            parsed = parse_request_head_httptools(raw_request_data)
+        else:
+            parsed = None
+        if parsed is None:
+            parsed = parse_request_head_regex(raw_request_data)
+        method, path, headers, raw_body, keep_alive = parsed
         
-        method = request_line_parts[0]
-        path = request_line_parts[1]
-         
-        headers = {}
-        body_start_index = -1
-        for i, line in enumerate(request_lines[1:]):
-            if not line: # Empty line signifies end of headers
-                body_start_index = i + 2 # +2 because we are in request_lines[1:] and adding 1 for current line
-                break
-            parts = line.split(':', 1)
-            if len(parts) == 2:
-                headers[parts[0].strip().lower()] = parts[1].strip()
-
         body = ""
-        if body_start_index != -1 and body_start_index < len(request_lines):
-            body = "\r\n".join(request_lines[body_start_index:])
-            # Simple JSON body parsing for POST requests
-            if 'content-type' in headers and 'application/json' in headers['content-type'] and body:
+        if raw_body:
+            # Simple JSON body parsing for POST requests (the JSON parser takes bytes directly)
+            if 'content-type' in headers and 'application/json' in headers['content-type']:
                 try:
-                    body = json.loads(body)
-                except json.JSONDecodeError:
+                    body = _json_loads(raw_body)
+                except json.JSONDecodeError: # orjson.JSONDecodeError is a subclass
                     body = None # Invalid JSON body
+            else:
+                body = raw_body.decode('utf-8')
 
-        return {'method': method, 'path': path, 'headers': headers, 'body': body}
+        return Request(method, path, headers, body, keep_alive)
         
     except UnicodeDecodeError as e:
-        print(f"DEBUG: Unicode decode error: {e}")
-        print(f"DEBUG: Raw data (first 50 bytes): {raw_request_data[:50]}")
-        print(f"DEBUG: Raw data as hex: {raw_request_data[:50].hex()}")
+        log.debug("Unicode decode error: %s", e)
+        log.debug("Raw data (first 50 bytes): %s", raw_request_data[:50])
+        log.debug("Raw data as hex: %s", raw_request_data[:50].hex())
         raise ValueError(f"Unable to decode request data: {e}")
     except Exception as e:
-        print(f"DEBUG: Error parsing HTTP request: {e}")
-        print(f"DEBUG: Raw data length: {len(raw_request_data)}")
-        print(f"DEBUG: Raw data (first 50 bytes as hex): {raw_request_data[:50].hex()}")
+        log.debug("Error parsing HTTP request: %s", e)
+        log.debug("Raw data length: %s", len(raw_request_data))
+        log.debug("Raw data (first 50 bytes as hex): %s", raw_request_data[:50].hex())
         raise ValueError(f"Invalid HTTP request format: {e}")
 
-def format_http_response(status_code, content_type, body_data):
+def build_http_response(status_code, content_type, body_data, close=False):
     """
     Manually formats an HTTP response.
-    Returns bytes ready to be sent over the socket.
+    close adds "Connection: close", for responses after which the server closes the connection.
+    Returns (header_bytes, body_bytes), kept apart so they can be sent without concatenating.
     """
     try:
-        print(f"DEBUG format_http_response: status={status_code}, content_type={content_type}, body_data={body_data}")
+        log.debug("format_http_response: status=%s, content_type=%s, body_data=%s", status_code, content_type, body_data)
         
-        status_message = HTTP_STATUS_CODES.get(status_code, "Unknown Status")
+        status_line = STATUS_LINES.get(status_code) or b"HTTP/1.1 %d Unknown Status\r\n" % status_code
         
         # Only serialize body_data if it's not None and status_code is not 204 (No Content)
         body_bytes = b""
         if body_data is not None and status_code != 204:
             if isinstance(body_data, dict):
                 
-                body_bytes = json.dumps(body_data).encode('utf-8')
-                print(f"DEBUG: Serialized JSON to {len(body_bytes)} bytes: {body_bytes}")
+                body_bytes = _json_dumps(body_data)
+                log.debug("Serialized JSON to %s bytes: %s", len(body_bytes), body_bytes)
             else:
                 body_bytes = str(body_data).encode('utf-8')
-                print(f"DEBUG: Converted string to {len(body_bytes)} bytes: {body_bytes}")
+                log.debug("Converted string to %s bytes: %s", len(body_bytes), body_bytes)
         
-        print(f"DEBUG: body_bytes length: {len(body_bytes)}")
+        content_type_line = CONTENT_TYPE_LINES.get(content_type) or b"Content-Type: %b\r\n" % content_type.encode('latin-1')
+        response_header = _RESP_TMPL % (status_line, content_type_line, len(body_bytes), CONNECTION_CLOSE if close else b"")
         
-        # Build HTTP response with proper CRLF line endings and CORS headers
-        headers = [
-            f"HTTP/1.1 {status_code} {status_message}",
-            f"Content-Type: {content_type}",
-            f"Content-Length: {len(body_bytes)}", 
-            "Connection: close",
-            # CORS headers
-            "Access-Control-Allow-Origin: *",
-            "Access-Control-Allow-Methods: GET, POST, PUT, DELETE, OPTIONS, HEAD",
-            "Access-Control-Allow-Headers: Content-Type, Authorization, X-Requested-With",
-            "Access-Control-Max-Age: 86400"  # Cache preflight for 24 hours
-        ]
-        
-        # Properly format HTTP response: headers + \r\n\r\n + body
-        response_header = "\r\n".join(headers) + "\r\n\r\n"
-        result = response_header.encode('utf-8') + body_bytes
-        
-        print(f"DEBUG: Final response length: {len(result)} bytes")
-        print(f"DEBUG: Response headers: {response_header}")
-        print(f"DEBUG: Complete response: {result}")
-        return result
+        log.debug("Response headers: %s", response_header)
+        return response_header, body_bytes
         
     except Exception as e:
-        print(f"ERROR in format_http_response: {e}")
-        import traceback
-        traceback.print_exc()
+        log.exception("in format_http_response: %s", e)
         # Return a simple error response
         error_response = b"HTTP/1.1 500 Internal Server Error\r\nContent-Length: 0\r\nConnection: close\r\n\r\n"
-        return error_response
+        return error_response, b""
+
+def format_http_response(status_code, content_type, body_data, close=False):
+    """
+    Manually formats an HTTP response.
+    Returns bytes ready to be sent over the socket (used for the prebuilt responses).
+    """
+    response_header, body_bytes = build_http_response(status_code, content_type, body_data, close)
+    return response_header + body_bytes
+
+def send_http_response(client_socket, status_code, content_type, body_data, close=False):
+    """
+    Formats and sends an HTTP response. Header and body go to the kernel as two
+    buffers in one sendmsg call, so they are never copied into a joined bytes object.
+    """
+    response_header, body_bytes = build_http_response(status_code, content_type, body_data, close)
+    sendmsg = getattr(client_socket, 'sendmsg', None)
+    if sendmsg is None or not body_bytes:
+        write_once(client_socket, response_header + body_bytes)
+        return
+    sent = sendmsg([response_header, body_bytes])
+    # sendmsg may send only part of the data; finish with sendall on what is left
+    if sent < len(response_header):
+        client_socket.sendall(memoryview(response_header)[sent:])
+        client_socket.sendall(body_bytes)
+    elif sent < len(response_header) + len(body_bytes):
+        client_socket.sendall(memoryview(body_bytes)[sent - len(response_header):])
+
+def write_once(client_socket, data):
+    """
+    Sends a small prebuilt response. One send() almost always takes all of it on a
+    fresh socket; sendall only runs for whatever is left over.
+    """
+    sent = client_socket.send(data)
+    if sent < len(data):
+        client_socket.sendall(memoryview(data)[sent:])
 
  
       
+# --- Prebuilt responses ---
+# /health can only return four bodies, so they are serialized once at startup
+HEALTH_RESPONSES = {
+    (is_alive_val, is_active_val): format_http_response(
+        200 if is_alive_val else 503, 'application/json',
+        {'status': 'alive' if is_alive_val else 'down', 'active': is_active_val})
+    for is_alive_val in (True, False) for is_active_val in (True, False)
+}
+# HEAD connections are closed after the answer (see handle_client), so these say so
+HEAD_HEALTH_RESPONSES = {is_alive_val: format_http_response(200 if is_alive_val else 503, 'application/json', None, close=True) for is_alive_val in (True, False)}
+# Static pages never change either
+ROOT_RESPONSE = format_http_response(200, 'text/plain', "Render Sanity check!")
+HOME_RESPONSE = format_http_response(200, 'text/html', "<html> <body>Chat</body> </html>")
+NOT_FOUND_RESPONSE = format_http_response(404, 'application/json', {'error': 'Not Found'})
+UNAVAILABLE_RESPONSE = format_http_response(503, 'application/json', {'error': 'system not available'})
+# Same answers for connections that are closed afterwards
+NOT_FOUND_CLOSE_RESPONSE = format_http_response(404, 'application/json', {'error': 'Not Found'}, close=True)
+UNAVAILABLE_CLOSE_RESPONSE = format_http_response(503, 'application/json', {'error': 'system not available'}, close=True)
+NO_CHANGE_RESPONSE = format_http_response(204, 'application/json', None)
+LINGER_ON_CLOSE = struct.pack('ii', 1, 1) # SO_LINGER on, 1 second timeout
+
+def unhandled_path_response(is_alive_val, is_active_val, close=False):
+    """404 for unknown paths while the system is up, 503 otherwise."""
+    if close:
+        return NOT_FOUND_CLOSE_RESPONSE if is_alive_val and is_active_val else UNAVAILABLE_CLOSE_RESPONSE
+    return NOT_FOUND_RESPONSE if is_alive_val and is_active_val else UNAVAILABLE_RESPONSE
+
+def status_change_response(group_name, is_alive_val, is_active_val, version):
+    """200 answer to /subscribe/status; clients send version back as ?since= on the next poll."""
+    return format_http_response(200, 'application/json', {'status': 'alive' if is_alive_val else 'down', 'active': is_active_val, 'change': True, 'group': group_name, 'version': version})
+
+# --- Membership response cache ---
+# /chats and /group-users only change when group membership does. Their responses are
+# cached as ready-to-send bytes under the membership version they were built at; every
+# membership change bumps the version, so an entry built before it is never served again.
+membership_lock = threading.Lock()
+_membership_version = 0
+membership_responses = {} # (path, id) -> (membership version, response bytes)
+
+def membership_changed():
+    """Invalidates the cached /chats and /group-users responses. Call after the commit."""
+    global _membership_version
+    with membership_lock:
+        _membership_version += 1
+        membership_responses.clear()
+
+def cached_membership_response(cache_key):
+    """The cached response for cache_key if it is still current, else None."""
+    entry = membership_responses.get(cache_key)
+    if entry is not None and entry[0] == _membership_version:
+        return entry[1]
+    return None
+
+def cache_membership_response(cache_key, version, response):
+    """Stores a response built from data read at membership version `version` and returns it."""
+    with membership_lock:
+        if version == _membership_version: # Otherwise membership changed while it was being built
+            membership_responses[cache_key] = (version, response)
+    return response
+
+def create_chat(body):
+    """
+    Creates a chat group from a /create-chat payload.
+    Returns (status_code, response_data).
+    """
+    if not isinstance(body, dict) or not all(k in body for k in ('groupName', 'creatorId')):
+        return 400, {'error': 'groupName and creatorId are required'}
+    if not isinstance(body['groupName'], str):
+        return 400, {'error': 'groupName must be a string'}
+    if not isinstance(body['creatorId'], int) or isinstance(body['creatorId'], bool):
+        return 400, {'error': 'creatorId must be an integer'}
+    members_list = body.get('members') or []
+    if not isinstance(members_list, list) or not all(isinstance(username, str) for username in members_list):
+        return 400, {'error': 'members must be a list of usernames'}
+    if len(body['groupName']) > MAX_GROUP_NAME_LENGTH:
+        return 400, {'error': f'groupName must have at most {MAX_GROUP_NAME_LENGTH} characters'}
+
+    with SessionLocal() as session:
+        # Check if creator user exists
+        creator = session.get(User, body['creatorId'])
+        if not creator:
+            return 404, {'error': 'Creator user not found'}
+
+        # Create new group
+        new_group = Grupo(name=body['groupName'])
+        session.add(new_group)
+        session.flush()  # To get the ID before commit
+        
+        # Add creator as member
+        new_group.members.append(creator)
+        added_members = [{'id': creator.id, 'username': creator.username}]
+        
+        # Process additional members if provided
+        not_found_members = []
+        
+        if members_list:
+            for username in members_list:
+                if username != creator.username:  # Skip creator (already added)
+                    member_user = session.query(User).filter(User.username == username).first()
+                    if member_user:
+                        # Check if member is not already in the group
+                        if member_user not in new_group.members:
+                            new_group.members.append(member_user)
+                            added_members.append({'id': member_user.id, 'username': member_user.username})
+                    else:
+                        not_found_members.append(username)
+        
+        session.commit()
+        membership_changed()
+        session.refresh(new_group)
+        
+        # Sync user groups for all members
+        for member in new_group.members:
+            sync_user_groups_from_database(member.id)
+        
+        response_data = {
+            'group_id': new_group.id,
+            'group_name': new_group.name,
+            'creator_id': creator.id,
+            'members': added_members
+        }
+        
+        # Include warning about not found members if any
+        if not_found_members:
+            response_data['warning'] = f'Users not found: {", ".join(not_found_members)}'
+        
+        log.debug("Created new group '%s' (ID: %s) with creator %s and %s additional members", new_group.name, new_group.id, creator.username, len(added_members) - 1)
+        return 200, response_data
+
+# --- Route Handlers ---
+def handle_login(client_socket, addr, request_info):
+    """POST /login: returns the user id for a valid username and password."""
+    status_code = 200
+    response_data = {}
+    # Login: retorna o id do usuário pelo username
+    body = request_info.body
+    if not body or 'username' not in body or 'password' not in body:
+        status_code = 400
+        response_data = {'error': 'username é obrigatório'}
+    else:
+        with read_session() as session:
+            user = session.query(User.id, User.password_hash).filter(User.username == body['username']).first()
+        # bcrypt runs after the session is closed, so the pooled connection is not held while it hashes
+        if user and bcrypt.checkpw(body['password'].encode('utf-8'), user.password_hash.encode('utf-8')):
+            response_data = {'user_id': user.id}
+            #response_data = {'user_id': user.id, mantive isso porque não entendi o porquê da vírgula
+            #                 }
+        else: # Errados
+            status_code = 401 # Unauthorized
+            response_data = {'error': 'Invalid username or password'}
+    send_http_response(client_socket, status_code, 'application/json', response_data)
+
+def handle_register(client_socket, addr, request_info):
+    """POST /register: creates a user with a bcrypt password hash."""
+    status_code = 200
+    response_data = {}
+    body = request_info.body
+    if not isinstance(body, dict) or 'username' not in body or 'password' not in body:
+        status_code = 400
+        response_data = {'error': 'username and password are required'}
+    elif not isinstance(body['username'], str) or not isinstance(body['password'], str):
+        status_code = 400
+        response_data = {'error': 'username and password must be strings'}
+    elif len(body['username']) > MAX_USERNAME_LENGTH:
+        status_code = 400
+        response_data = {'error': f'username must have at most {MAX_USERNAME_LENGTH} characters'}
+    else:
+        with SessionLocal() as session:
+            # Check if user already exists
+            existing_user = session.query(User).filter(User.username == body['username']).first()
+            if existing_user:
+                status_code = 409 # Conflict
+                response_data = {'error': 'Username already exists'}
+            else:
+                # Hash the password
+                password_bytes = body['password'].encode('utf-8')
+                salt = bcrypt.gensalt()
+                hashed_password = bcrypt.hashpw(password_bytes, salt)
+
+                new_user = User(
+                    username=body['username'],
+                    password_hash=hashed_password.decode('utf-8') # Store as a string
+                )
+                session.add(new_user)
+                session.commit()
+                session.refresh(new_user)
+
+                status_code = 201 # Created
+                response_data = {'user_id': new_user.id, 'message': 'User created successfully'}
+
+    send_http_response(client_socket, status_code, 'application/json', response_data)
+
+def handle_chats(client_socket, addr, request_info):
+    """GET /chats?userId=: lists the groups of a user with their members."""
+    status_code = 200
+    response_data = {}
+    # Lista os grupos do usuário - using query parameters
+    user_id = request_info.query.get('userId')
+
+    if not user_id:
+        status_code = 400
+        response_data = {'error': 'userId query parameter é obrigatório'}
+    else:
+        user_id = int(user_id) # A non-numeric id raises ValueError -> 400
+        cache_key = ('/chats', user_id)
+        response = cached_membership_response(cache_key)
+        if response is None:
+            version = _membership_version # Read before the query, see cache_membership_response
+            with read_session() as session:
+                chats = get_user_chats(session, user_id) # One columns-only SELECT for groups and members
+            if chats is not None:
+                response = cache_membership_response(cache_key, version, format_http_response(200, 'application/json', {'user_id': user_id, 'chats': chats}))
+            else:
+                status_code = 404
+                response_data = {'error': 'Usuário não encontrado'}
+        if response is not None:
+            write_once(client_socket, response)
+            return
+    send_http_response(client_socket, status_code, 'application/json', response_data)
+
+def handle_get_messages(client_socket, addr, request_info):
+    """GET /messages?groupId=: lists the messages of a group."""
+    status_code = 200
+    response_data = {}
+    # Lista mensagens de um grupo - using query parameters
+    group_id = request_info.query.get('groupId')
+
+    if not group_id:
+        status_code = 400
+        response_data = {'error': 'groupId query parameter é obrigatório'}
+    else:
+        group_id = int(group_id) # A non-numeric id raises ValueError -> 400
+        with read_session() as session:
+            messages = get_group_messages(session, group_id) # Columns only, no ORM objects
+            if messages is not None:
+                response_data = {'group_id': group_id, 'messages': messages}
+            else:
+                status_code = 404
+                response_data = {'error': 'Grupo não encontrado'}
+    send_http_response(client_socket, status_code, 'application/json', response_data)
+
+def handle_post_message(client_socket, addr, request_info):
+    """POST /messages: sends a message to a group and notifies it."""
+    status_code = 200
+    response_data = {}
+    # Envia mensagem para um grupo
+    body = request_info.body
+    log.debug("Received body for /messages: %s", body)
+    if not body or not all(k in body for k in ('userId', 'groupId', 'content')):
+        status_code = 400
+        response_data = {'error': 'userId, groupId e content são obrigatórios'}
+    else:
+        with SessionLocal() as session:
+            user = session.get(User, body['userId'])
+            group = session.get(Grupo, body['groupId'])
+            if not user or not group:
+                status_code = 404
+                response_data = {'error': 'Usuário ou grupo não encontrado'}
+            else:
+                add_message(session, user, group, body['content'], commit=True)
+                # Notify group members of new message
+                notify_group_of_change(group.name)
+                response_data = {'message': 'Mensagem enviada'}
+    send_http_response(client_socket, status_code, 'application/json', response_data)
+
+def handle_group_users(client_socket, addr, request_info):
+    """GET /group-users?groupId=: lists the members of a group."""
+    status_code = 200
+    response_data = {}
+    # Lista usuários de um grupo - using query parameters
+    group_id = request_info.query.get('groupId')
+
+    if not group_id:
+        status_code = 400
+        response_data = {'error': 'groupId query parameter é obrigatório'}
+    else:
+        group_id = int(group_id) # A non-numeric id raises ValueError -> 400
+        cache_key = ('/group-users', group_id)
+        response = cached_membership_response(cache_key)
+        if response is None:
+            version = _membership_version # Read before the query, see cache_membership_response
+            with read_session() as session:
+                users = get_group_member_list(session, group_id) # Columns only, no ORM objects
+            if users is not None:
+                response = cache_membership_response(cache_key, version, format_http_response(200, 'application/json', {'group_id': group_id, 'users': users}))
+            else:
+                status_code = 404
+                response_data = {'error': 'Grupo não encontrado'}
+        if response is not None:
+            write_once(client_socket, response)
+            return
+    send_http_response(client_socket, status_code, 'application/json', response_data)
+
+def handle_users(client_socket, addr, request_info):
+    """GET /users?username=: searches users by (partial) name."""
+    status_code = 200
+    response_data = {}
+    # Busca usuários por filtro de nome (parcial ou exato)
+
+    filtro_nome = request_info.query.get('username')
+
+    with read_session() as session:
+        query = session.query(User.id, User.username) # Columns only, no ORM objects
+        if filtro_nome:
+            query = query.filter(User.username.ilike(f"%{filtro_nome}%"))
+        users = [{'id': user_id, 'username': username} for user_id, username in query.all()]
+        response_data = {'users': users}
+    send_http_response(client_socket, status_code, 'application/json', response_data)
+
+def handle_delete_message(client_socket, addr, request_info):
+    """DELETE /messages: removes a message by id."""
+    status_code = 200
+    response_data = {}
+    # Remove mensagem por id
+    body = request_info.body
+    if not body or 'messageId' not in body:
+        status_code = 400
+        response_data = {'error': 'messageId é obrigatório'}
+    else:
+        with SessionLocal() as session:
+            message = session.get(Message, body['messageId'])
+            if message:
+                session.delete(message)
+                session.commit()
+                response_data = {'message': 'Mensagem removida'}
+            else:
+                status_code = 404
+                response_data = {'error': 'Mensagem não encontrada'}
+    send_http_response(client_socket, status_code, 'application/json', response_data)
+
+def handle_create_chat(client_socket, addr, request_info):
+    """POST /create-chat: creates a chat group."""
+    # Create a new chat group
+    status_code, response_data = create_chat(request_info.body)
+    send_http_response(client_socket, status_code, 'application/json', response_data)
+
+def handle_create_chat_batch(client_socket, addr, request_info):
+    """POST /create-chat/batch: creates several chat groups, each with its own status."""
+    status_code = 200
+    response_data = {}
+    # Create several chat groups in one request; each item gets its own status
+    body = request_info.body
+    if not isinstance(body, list):
+        status_code = 400
+        response_data = {'error': 'body must be a JSON array of create-chat payloads'}
+    else:
+        results = []
+        for item in body:
+            item_status, item_body = create_chat(item)
+            results.append({'status': item_status, 'body': item_body})
+        response_data = {'results': results}
+    send_http_response(client_socket, status_code, 'application/json', response_data)
+
+def handle_root(client_socket, addr, request_info):
+    """GET /"""
+    # Send a simple response for the root path
+    write_once(client_socket, ROOT_RESPONSE)
+
+def handle_health(client_socket, addr, request_info):
+    """GET /health: prebuilt status response."""
+    log.debug("Processing /health request")
+    try:
+
+        is_alive_val, is_active_val = request_info.state
+        log.debug("State - alive=%s, active=%s", is_alive_val, is_active_val)
+        response_bytes = HEALTH_RESPONSES[(is_alive_val, is_active_val)] # Prebuilt, no serialization per request
+        log.debug("Sending response, length=%s", len(response_bytes))
+        write_once(client_socket, response_bytes)
+        log.debug("/health response sent successfully")
+    except Exception as e:
+        log.exception("in /health handler: %s", e)
+
+def handle_home(client_socket, addr, request_info):
+    """GET /home"""
+    write_once(client_socket, HOME_RESPONSE)
+
+def handle_subscribe_status(client_socket, addr, request_info):
+    """GET /subscribe/status?group=&since=: long-poll, answered by long_poller.
+    Returns True when the socket now belongs to long_poller and must not be closed here."""
+    # Extract group from query parameters or use default
+    group_name = request_info.query.get('group', "default")
+    try:
+        since = int(request_info.query['since']) # Last state version the client saw
+    except (KeyError, ValueError):
+        since = None # Missing or malformed: just wait
+
+    with state_lock:
+        behind = since is not None and _state_version > since
+        if behind:
+            state = (_is_alive, _is_active, _state_version)
+        else:
+            # Park the socket on the long-poll thread, which answers it on a state
+            # change or after 25 seconds; this worker goes back to the pool.
+            # Parked under state_lock, so a change cannot slip in between the version check and the park.
+            long_poller.park(client_socket, addr, (group_name,), keep_alive=request_info.keep_alive, pipelined=request_info.pipelined)
+
+    if not behind:
+        log.info("Client %s started long-polling for status changes in group '%s'.", addr, group_name)
+        return True
+    # The state changed after the client's last poll: answer now instead of waiting
+    log.info("Client %s is behind (since=%s) in group '%s'. Sending current status.", addr, since, group_name)
+    write_once(client_socket, status_change_response(group_name, *state))
+
+def handle_subscribe_user(client_socket, addr, request_info):
+    """GET /subscribe/user?user_id=: long-poll on every group of a user, answered via long_poller.
+    Returns True when the socket now belongs to long_poller and must not be closed here."""
+    # --- User-based Multi-Group Subscription ---
+    # Extract user_id from query parameters
+    user_id = request_info.query.get('user_id')
+
+    if not user_id: 
+        status_code = 400
+        response_data = {'error': 'user_id parameter is required'}
+        send_http_response(client_socket, status_code, 'application/json', response_data)
+        return
+
+    user_group_list = list(get_user_groups(user_id))
+    if not user_group_list:
+        # User has no groups, nothing to wait on
+        log.info("User '%s' has no groups to wait on. Sending 204.", user_id)
+        write_once(client_socket, NO_CHANGE_RESPONSE)
+        return
+
+    log.info("Client %s started user-based long-polling for user '%s' on groups %s.", addr, user_id, user_group_list)
+    # Wait on all of the user's groups at once on the long-poll thread; the first
+    # notified group is answered by send_user_notification back on the worker pool
+    keep_alive = request_info.keep_alive
+    long_poller.park(client_socket, addr, user_group_list,
+                     lambda conn, conn_addr, notified_group, leftover: send_user_notification(conn, conn_addr, user_id, notified_group, user_group_list, keep_alive, leftover),
+                     keep_alive=keep_alive, pipelined=request_info.pipelined)
+    return True
+
+def finish_answer(client_socket, addr, rest, keep_alive, leftover):
+    """Sends what LongPoller._finish could not write without blocking, then keeps or closes the connection."""
+    try:
+        client_socket.sendall(rest)
+    except OSError as e:
+        log.error("Failed to answer long-poll for %s: %s", addr, e)
+        keep_alive = False
+    if keep_alive:
+        return_connection(client_socket, addr, leftover)
+        return
+    try:
+        client_socket.close()
+    except OSError:
+        pass
+
+def send_user_notification(client_socket, addr, user_id, notified_group, user_group_list, keep_alive=False, leftover=b''):
+    """Answers a /subscribe/user long-poll whose group was notified, then closes the socket
+    (or, with keep_alive, gives it and the leftover pipelined bytes back to the event loop for the client's next request)."""
+    log.info("User '%s' notified of change in group '%s'. Sending current status.", user_id, notified_group)
+    try:
+        # Get recent messages from the notified group
+        recent_messages = []
+        try:
+            with read_session() as session:
+                # The last 10 messages of the group, oldest first, from one columns-only SELECT
+                recent_messages = get_recent_group_messages(session, notified_group, limit=10)
+        except Exception as e: 
+            log.error("getting recent messages for group %s: %s", notified_group, e)
+
+        response_data = { 
+            'change': True, 
+            'user_id': user_id,
+            'notified_group': notified_group,
+            'user_groups': user_group_list,
+            'recent_messages': recent_messages,
+            'messages_count': len(recent_messages)
+        }
+        send_http_response(client_socket, 200, 'application/json', response_data)
+    except Exception as e:
+        log.error("Failed to answer user long-poll for %s: %s", addr, e)
+        keep_alive = False
+    if keep_alive:
+        return_connection(client_socket, addr, leftover)
+        return
+    try:
+        client_socket.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, LINGER_ON_CLOSE)
+        client_socket.close()
+    except OSError:
+        pass
+
+def handle_fall(client_socket, addr, request_info):
+    """POST /fall: marks the system down."""
+    set_is_alive(False) # This will trigger notify_clients_of_state_change()
+    set_is_active(False) # This will trigger notify_clients_of_state_change()
+    log.info("System status set to DOWN (isAlive=False, isActive=False).")
+    response_data = {'status': 'system down', 'active': get_is_active()}
+    send_http_response(client_socket, 200, 'application/json', response_data)
+
+def handle_revive(client_socket, addr, request_info):
+    """POST /revive: marks the system alive again."""
+    set_is_alive(True) # This will trigger notify_clients_of_state_change()
+    log.info("System status set to REVIVED (isAlive=True).")
+    response_data = {'status': 'system revived', 'active': get_is_active()}
+    send_http_response(client_socket, 200, 'application/json', response_data)
+
+def handle_notify_batch(client_socket, addr, request_info):
+    """POST /notify/batch: notifies several groups in one request."""
+    status_code = 200
+    response_data = {}
+    # Notify several groups in one request: {"groups": ["group1", "all", ...]}
+    body = request_info.body
+    groups = body.get('groups') if isinstance(body, dict) else None
+    if not isinstance(groups, list) or not all(isinstance(g, str) and g for g in groups):
+        status_code = 400
+        response_data = {'error': 'body must be {"groups": [group_name, ...]}'}
+    elif 'all' in groups:
+        notify_clients_of_state_change()  # Notify all groups (covers the others too)
+        log.info("Triggered batch notification for ALL groups.")
+        response_data = {'message': 'notification sent to all groups', 'groups': ['all']}
+    else:
+        notified = list(dict.fromkeys(groups))  # dedupe, keep order
+        for group_target in notified:
+            notify_clients_of_state_change(group_target)
+        log.info("Triggered batch notification for groups %s.", notified)
+        response_data = {'message': 'notification sent to groups', 'groups': notified}
+    send_http_response(client_socket, status_code, 'application/json', response_data)
+
+def handle_notify(client_socket, addr, request_info):
+    """POST /notify/{group_name} or /notify/all"""
+    status_code = 200
+    response_data = {}
+    path = request_info.path.partition('?')[0]
+    # New endpoint to trigger notifications for specific groups
+    # Example: POST /notify/group1 or POST /notify/all
+    path_parts = path.split('/')
+    if len(path_parts) >= 3:
+        group_target = unquote(path_parts[2]) # Percent-decoded, like the ?group= of /subscribe/status
+        if group_target == 'all':
+            notify_clients_of_state_change()  # Notify all groups
+            log.info("Triggered notification for ALL groups.")
+            response_data = {'message': 'notification sent to all groups'}
+        else:
+            notify_clients_of_state_change(group_target)  # Notify specific group
+            log.info("Triggered notification for group '%s'.", group_target)
+            response_data = {'message': f'notification sent to group {group_target}'}
+    else:
+        status_code = 400
+        response_data = {'error': 'Invalid notify path. Use /notify/{group_name} or /notify/all'}
+    send_http_response(client_socket, status_code, 'application/json', response_data)
+
+def handle_options(client_socket, addr, request_info):
+    """OPTIONS on any path: CORS preflight."""
+    # Handle CORS preflight requests
+    log.debug("Processing OPTIONS request for CORS preflight")
+    # Return 200 OK with CORS headers (no body needed)
+    send_http_response(client_socket, 200, 'text/plain', None)
+    log.debug("OPTIONS response sent successfully")
+
+def handle_head_health(client_socket, addr, request_info):
+    """HEAD /health"""
+    log.debug("Processing HEAD /health request (for health check)")
+    is_alive_val, is_active_val = request_info.state
+    # A resposta HEAD não tem corpo, mas os cabeçalhos são os mesmos do GET
+    # format_http_response já lida com body_data=None para 204. Para HEAD, podemos enviar
+    # um corpo vazio, mas o importante é que o método HEAD NÃO TEM CORPO.
+    # O status code deve ser o mesmo do GET /health (200 ou 503, já nas respostas pré-montadas).
+
+    # Para HEAD, o corpo deve ser vazio, mas Content-Length deve ser 0
+    # Modifique format_http_response para lidar com isso explicitamente se necessário.
+    # No seu format_http_response atual, se body_data é None, body_bytes será b"", o que é bom.
+    response_bytes = HEAD_HEALTH_RESPONSES[is_alive_val] # Sem corpo para HEAD (pré-montada)
+
+    # Certifique-se de que o Content-Length seja 0 para HEAD
+    # format_http_response já calcula isso com len(body_bytes)
+    write_once(client_socket, response_bytes)
+    log.debug("HEAD /health response sent successfully")
+
+def handle_head_root(client_socket, addr, request_info):
+    """HEAD /"""
+    # Se o sistema está ok, responda 200 OK com corpo vazio para HEAD /
+    is_alive_val, is_active_val = request_info.state
+    if is_alive_val and is_active_val:
+        status_code = 200
+        response_data = None # Sem corpo para HEAD
+    else: # Se o sistema não está ativo, retorne 503 mesmo para HEAD /
+        status_code = 503
+        response_data = {'error': 'system not available'} # Pode ou não ter corpo dependendo da plataforma
+    send_http_response(client_socket, status_code, 'application/json', response_data, close=True)
+
+def handle_unhandled(client_socket, addr, request_info):
+    """Any method/path without a route."""
+    write_once(client_socket, unhandled_path_response(*request_info.state, close=not request_info.keep_alive))
+
+# --- Middleware and Route Tables ---
+# Paths that are always allowed regardless of system state
+ALWAYS_ALLOWED_PATHS = frozenset({'/health', '/fall', '/revive'})
+# Paths that require the system to be active
+ACTIVE_REQUIRED_PATHS = frozenset({'/register', '/groups', '/users', '/login', '/chats', '/messages', '/group-users', '/create-chat', '/create-chat/batch'})
+# Prefixes that require the system to be active (a tuple, so one str.startswith call checks them all)
+ACTIVE_REQUIRED_PATTERNS = ('/subscribe/status', '/subscribe/user', '/notify/', '/user/')
+
+# (method, path without query string) -> handler(client_socket, addr, request_info)
+ROUTES = {
+    ('POST', '/login'): handle_login,
+    ('POST', '/register'): handle_register,
+    ('GET', '/chats'): handle_chats,
+    ('GET', '/messages'): handle_get_messages,
+    ('POST', '/messages'): handle_post_message,
+    ('DELETE', '/messages'): handle_delete_message,
+    ('GET', '/group-users'): handle_group_users,
+    ('GET', '/users'): handle_users,
+    ('POST', '/create-chat'): handle_create_chat,
+    ('POST', '/create-chat/batch'): handle_create_chat_batch,
+    ('GET', '/'): handle_root,
+    ('GET', '/health'): handle_health,
+    ('GET', '/home'): handle_home,
+    ('GET', '/subscribe/status'): handle_subscribe_status,
+    ('GET', '/subscribe/user'): handle_subscribe_user,
+    ('POST', '/fall'): handle_fall,
+    ('POST', '/revive'): handle_revive,
+    ('POST', '/notify/batch'): handle_notify_batch, # Other /notify/{group} paths go to handle_notify
+    ('HEAD', '/health'): handle_head_health,
+    ('HEAD', '/'): handle_head_root,
+}
+
 # Handler de cliente
-def handle_client(client_socket, addr):
+def handle_client(client_socket, addr, raw_request_data, collector=None, pipelined=b""):
+    """
+    Handles one HTTP request, then closes the connection or, for a keep-alive
+    client, gives it back to the event loop to wait for the next request.
+    raw_request_data is the request already read by the server's event loop;
+    pipelined holds any bytes of the client's next request read along with it.
+    The /subscribe/* long-polls hand the socket to long_poller, which answers it.
+    """
+    handed_off = False
+    keep_alive = False
     try:
-        # Read the HTTP request data
-        raw_request_data = b""
-        client_socket.settimeout(10)  # Set timeout for reading
-        
-        # Read the request in chunks
-        while True:
-            try:
-                chunk = client_socket.recv(4096)
-                if not chunk:
-                    break
-                raw_request_data += chunk
-                # Check if we have received the complete headers (look for \r\n\r\n)
-                if b'\r\n\r\n' in raw_request_data:
-                    break
-            except socket.timeout:
-                print(f"[{threading.current_thread().name}] Socket timeout while reading from {addr}")
-                break
-            
         if not raw_request_data:
-            print(f"[{threading.current_thread().name}] DEBUG: No data from {addr}, closing.")
+            log.debug("No data from %s, closing.", addr)
             return
 
-        print(f"[{threading.current_thread().name}] DEBUG: Received {len(raw_request_data)} bytes from {addr}")
+        log.debug("Received %s bytes from %s", len(raw_request_data), addr)
 
         try:
-            print(f"[{threading.current_thread().name}] DEBUG: Parsing HTTP request")
-            request_info = parse_http_request(raw_request_data)
-            method = request_info['method']
-            path = request_info['path']
-            print(f"[{threading.current_thread().name}] DEBUG: Parsed request - method={method}, path={path}")
-            # body = request_info['body'] # Not used for this logic, but available
+            log.debug("Parsing HTTP request")
+            request_info = parse_http_request(raw_request_data, collector)
+            request_info.pipelined = pipelined
+            method = request_info.method
+            path = request_info.path
+            log.debug("Parsed request - method=%s, path=%s", method, path)
+            # Some HEAD answers carry a body, which would desync a reused connection; the
+            # handlers read request_info.keep_alive to send "Connection: close" when it is False
+            keep_alive = request_info.keep_alive = request_info.keep_alive and method != 'HEAD'
+            # body = request_info.body # Not used for this logic, but available
 
             # --- Middleware Logic ---
-            # Extract base path without query parameters for middleware check
-            base_path = path.split('?')[0]
-            print('checking path ' + base_path + ' for allowed')
-            
-            # Define paths that are always allowed regardless of system state
-            always_allowed_paths = ['/health', '/fall', '/revive']
-            
-            # Define paths that require the system to be active
-            active_required_paths = ['/register','/groups', '/users', '/login', '/chats', '/messages', '/group-users', '/create-chat']
-            
-            # Define patterns that require the system to be active
-            active_required_patterns = ['/subscribe/status', '/subscribe/user', '/notify/', '/user/']
+            # Split the query string off once; the middleware and the routes use the base path,
+            # the handlers read their parameters (percent-decoded) from request_info.query
+            base_path, _, query_string = path.partition('?')
+            request_info.query = dict(parse_qsl(query_string)) if query_string else {}
+            # Read the system state once; the middleware and the handlers share this snapshot
+            is_alive_val, is_active_val = request_info.state = get_state()
+            log.debug("checking path %s for allowed", base_path)
             
             is_allowed_by_middleware = False
             
             # Always allow certain paths regardless of system state
-            if base_path in always_allowed_paths:
+            if base_path in ALWAYS_ALLOWED_PATHS:
                 is_allowed_by_middleware = True
             # For other paths, check if system is active
-            elif get_is_alive() and get_is_active():
-                # System is active, allow all other paths
-                if base_path in active_required_paths:
-                    is_allowed_by_middleware = True
-                else:
-                    # Check active required patterns
-                    for pattern in active_required_patterns:
-                        if base_path.startswith(pattern):
-                            is_allowed_by_middleware = True
-                            break
+            elif is_alive_val and is_active_val:
+                # System is active, allow the active-only paths and patterns
+                is_allowed_by_middleware = base_path in ACTIVE_REQUIRED_PATHS or base_path.startswith(ACTIVE_REQUIRED_PATTERNS)
 
             if not is_allowed_by_middleware and method != 'OPTIONS': 
-                if not get_is_alive():
-                    print(f"[{threading.current_thread().name}] Request to {path} blocked: System not alive")
-                    response_bytes = format_http_response(503, 'application/json', {'error': 'system not available - not alive'})
-                elif not get_is_active():
-                    print(f"[{threading.current_thread().name}] Request to {path} blocked: System not active")
-                    response_bytes = format_http_response(503, 'application/json', {'error': 'system not available - not active'})
+                if not is_alive_val:
+                    log.info("Request to %s blocked: System not alive", path)
+                    send_http_response(client_socket, 503, 'application/json', {'error': 'system not available - not alive'}, close=not keep_alive)
+                elif not is_active_val:
+                    log.info("Request to %s blocked: System not active", path)
+                    send_http_response(client_socket, 503, 'application/json', {'error': 'system not available - not active'}, close=not keep_alive)
                 else:
-                    print(f"[{threading.current_thread().name}] Request to {path} blocked: Path not allowed")
-                    print(f'only allows: ' + str(always_allowed_paths + active_required_paths + active_required_patterns))
-                    response_bytes = format_http_response(404, 'application/json', {'error': 'Not Found'})
-                client_socket.sendall(response_bytes)
+                    log.info("Request to %s blocked: Path not allowed", path)
+                    log.debug("only allows: %s", sorted(ALWAYS_ALLOWED_PATHS | ACTIVE_REQUIRED_PATHS) + list(ACTIVE_REQUIRED_PATTERNS))
+                    write_once(client_socket, NOT_FOUND_RESPONSE if keep_alive else NOT_FOUND_CLOSE_RESPONSE)
                 return # End connection after sending error
 
             # --- Route Handling ---
-            response_data = {}
-            status_code = 200
-
-            if method == 'POST' and path == '/login':
-                # Login: retorna o id do usuário pelo username
-                body = request_info.get('body')
-                if not body or 'username' not in body or 'password' not in body:
-                    status_code = 400
-                    response_data = {'error': 'username é obrigatório'}
-                else:
-                    with SessionLocal() as session:
-                        user = session.query(User).filter(User.username == body['username']).first()
-                        if user and bcrypt.checkpw(body['password'].encode('utf-8'), user.password_hash.encode('utf-8')):
-                            response_data = {'user_id': user.id}
-                            #response_data = {'user_id': user.id, mantive isso porque não entendi o porquê da vírgula
-                            #                 }
-                        else: # Errados
-                            status_code = 401 # Unauthorized
-                            response_data = {'error': 'Invalid username or password'}
-                response_bytes = format_http_response(status_code, 'application/json', response_data)
-                client_socket.sendall(response_bytes)
-
-            elif method == 'POST' and path == '/register':
-                body = request_info.get('body')
-                if not body or 'username' not in body or 'password' not in body:
-                    status_code = 400
-                    response_data = {'error': 'username and password are required'}
-                else:
-                    with SessionLocal() as session:
-                        # Check if user already exists
-                        existing_user = session.query(User).filter(User.username == body['username']).first()
-                        if existing_user:
-                            status_code = 409 # Conflict
-                            response_data = {'error': 'Username already exists'}
-                        else:
-                            # Hash the password
-                            password_bytes = body['password'].encode('utf-8')
-                            salt = bcrypt.gensalt()
-                            hashed_password = bcrypt.hashpw(password_bytes, salt)
-                            
-                            new_user = User(
-                                username=body['username'],
-                                password_hash=hashed_password.decode('utf-8') # Store as a string
-                            )
-                            session.add(new_user)
-                            session.commit()
-                            session.refresh(new_user)
-                            
-                            status_code = 201 # Created
-                            response_data = {'user_id': new_user.id, 'message': 'User created successfully'}
-                            
-                response_bytes = format_http_response(status_code, 'application/json', response_data)
-                client_socket.sendall(response_bytes)
-
-            elif method == 'GET' and path.startswith('/chats'):
-                # Lista os grupos do usuário - using query parameters
-                user_id = None
-                if '?' in path:
-                    query_part = path.split('?', 1)[1]
-                    for param in query_part.split('&'):
-                        if param.startswith('userId='):
-                            user_id = param.split('=', 1)[1]
-                            break
-                
-                if not user_id:
-                    status_code = 400
-                    response_data = {'error': 'userId query parameter é obrigatório'}
-                else:
-                    with SessionLocal() as session:
-                        user = session.query(User).filter(User.id == user_id).first()
-                        if user:
-                            chats = [
-                                {
-                                    'id': g.id, 
-                                    'name': g.name,
-                                    'members': [{'id': m.id, 'username': m.username} for m in g.members]
-                                } 
-                                for g in user.groups
-                            ]
- 
-                            response_data = {'user_id': user.id, 'chats': chats}
-                        else:
-                            status_code = 404
-                            response_data = {'error': 'Usuário não encontrado'}
-                response_bytes = format_http_response(status_code, 'application/json', response_data)
-                client_socket.sendall(response_bytes)
-
-            elif method == 'GET' and path.startswith('/messages'):
-                # Lista mensagens de um grupo - using query parameters
-                group_id = None
-                if '?' in path:
-                    query_part = path.split('?', 1)[1]
-                    for param in query_part.split('&'):
-                        if param.startswith('groupId='):
-                            group_id = param.split('=', 1)[1]
-                            break
-                
-                if not group_id:
-                    status_code = 400
-                    response_data = {'error': 'groupId query parameter é obrigatório'}
-                else:
-                    with SessionLocal() as session:
-                        group = session.query(Grupo).filter(Grupo.id == group_id).first()
-                        if group:
-                            messages = [
-                                {
-                                    'id': m.id,
-                                    'sender': m.sender.username,
-                                    'content': m.content,
-                                    'timestamp': m.timestamp.isoformat()
-                                }
-                                for m in group.messages
-                            ]
-                            response_data = {'group_id': group.id, 'messages': messages}
-                        else:
-                            status_code = 404
-                            response_data = {'error': 'Grupo não encontrado'}
-                response_bytes = format_http_response(status_code, 'application/json', response_data)
-                client_socket.sendall(response_bytes)
-
-            elif method == 'POST' and path == '/messages':
-                # Envia mensagem para um grupo
-                body = request_info.get('body')
-                print(f"[{threading.current_thread().name}] DEBUG: Received body for /messages: {body}")
-                if not body or not all(k in body for k in ('userId', 'groupId', 'content')):
-                    status_code = 400
-                    response_data = {'error': 'userId, groupId e content são obrigatórios'}
-                else:
-                    with SessionLocal() as session:
-                        user = session.query(User).filter(User.id == body['userId']).first()
-                        group = session.query(Grupo).filter(Grupo.id == body['groupId']).first()
-                        if not user or not group:
-                            status_code = 404
-                            response_data = {'error': 'Usuário ou grupo não encontrado'}
-                        else:
-                            add_message(session, user, group, body['content'])
-                            # Notify group members of new message
-                            notify_group_of_change(group.name)
-                            response_data = {'message': 'Mensagem enviada'}
-                response_bytes = format_http_response(status_code, 'application/json', response_data)
-                client_socket.sendall(response_bytes)
-
-            elif method == 'GET' and path.startswith('/group-users'):
-                # Lista usuários de um grupo - using query parameters
-                group_id = None
-                if '?' in path:
-                    query_part = path.split('?', 1)[1]
-                    for param in query_part.split('&'):
-                        if param.startswith('groupId='):
-                            group_id = param.split('=', 1)[1]
-                            break
-                
-                if not group_id:
-                    status_code = 400
-                    response_data = {'error': 'groupId query parameter é obrigatório'}
-                else:
-                    with SessionLocal() as session:
-                        group = session.query(Grupo).filter(Grupo.id == group_id).first()
-                        if group:
-                            users = [{'id': u.id, 'username': u.username} for u in group.members]
-                            response_data = {'group_id': group.id, 'users': users}
-                        else:
-                            status_code = 404
-                            response_data = {'error': 'Grupo não encontrado'}
-                response_bytes = format_http_response(status_code, 'application/json', response_data)
-                client_socket.sendall(response_bytes)
-            
-            elif method == 'GET' and path == '/users':
-                # Busca usuários por filtro de nome (parcial ou exato)
-                 
-                filtro_nome = None
-
-                if '?' in path:
-                    query_part = path.split('?', 1)[1]
-                    for param in query_part.split('&'):
-                        if param.startswith('username='):
-                            filtro_nome = param.split('=', 1)[1]
-                            break
-                
-                with SessionLocal() as session:
-                    query = session.query(User)
-                    if filtro_nome:
-                        query = query.filter(User.username.ilike(f"%{filtro_nome}%"))
-                    users = [{'id': u.id, 'username': u.username} for u in query.all()]
-                    response_data = {'users': users}
-                response_bytes = format_http_response(status_code, 'application/json', response_data)
-                client_socket.sendall(response_bytes)
-
-            elif method == 'DELETE' and path == '/messages':
-                # Remove mensagem por id
-                body = request_info.get('body')
-                if not body or 'messageId' not in body:
-                    status_code = 400
-                    response_data = {'error': 'messageId é obrigatório'}
-                else:
-                    with SessionLocal() as session:
-                        message = session.query(Message).filter(Message.id == body['messageId']).first()
-                        if message:
-                            session.delete(message)
-                            session.commit()
-                            response_data = {'message': 'Mensagem removida'}
-                        else:
-                            status_code = 404
-                            response_data = {'error': 'Mensagem não encontrada'}
-                response_bytes = format_http_response(status_code, 'application/json', response_data)
-                client_socket.sendall(response_bytes)
-
-            elif method == 'POST' and path == '/create-chat':
-                # Create a new chat group
-                body = request_info.get('body')
-                if not body or not all(k in body for k in ('groupName', 'creatorId')):
-                    status_code = 400
-                    response_data = {'error': 'groupName and creatorId are required'}
-                else:
-                    with SessionLocal() as session:
-                        # Check if creator user exists
-                        creator = session.query(User).filter(User.id == body['creatorId']).first()
-                        if not creator:
-                            status_code = 404
-                            response_data = {'error': 'Creator user not found'}
-                        else:
-                            # Check if group name already exists
-                            #existing_group = session.query(Grupo).filter(Grupo.name == body['groupName']).first()
-                            #if existing_group:
-                            #    status_code = 409
-                            #    response_data = {'error': 'Group name already exists'}
-                            #else:
-                                # Create new group
-                                new_group = Grupo(name=body['groupName'])
-                                session.add(new_group)
-                                session.flush()  # To get the ID before commit
-                                
-                                # Add creator as member
-                                new_group.members.append(creator)
-                                added_members = [{'id': creator.id, 'username': creator.username}]
-                                
-                                # Process additional members if provided
-                                members_list = body.get('members', [])
-                                not_found_members = []
-                                
-                                if members_list:
-                                    for username in members_list:
-                                        if username != creator.username:  # Skip creator (already added)
-                                            member_user = session.query(User).filter(User.username == username).first()
-                                            if member_user:
-                                                # Check if member is not already in the group
-                                                if member_user not in new_group.members:
-                                                    new_group.members.append(member_user)
-                                                    added_members.append({'id': member_user.id, 'username': member_user.username})
-                                            else:
-                                                not_found_members.append(username)
-                                
-                                session.commit()
-                                session.refresh(new_group)
-                                
-                                # Sync user groups for all members
-                                for member in new_group.members:
-                                    sync_user_groups_from_database(member.id)
-                                
-                                response_data = {
-                                    'group_id': new_group.id,
-                                    'group_name': new_group.name,
-                                    'creator_id': creator.id,
-                                    'members': added_members
-                                }
-                                
-                                # Include warning about not found members if any
-                                if not_found_members:
-                                    response_data['warning'] = f'Users not found: {", ".join(not_found_members)}'
-                                
-                                print(f"DEBUG: Created new group '{new_group.name}' (ID: {new_group.id}) with creator {creator.username} and {len(added_members)-1} additional members")
-                response_bytes = format_http_response(status_code, 'application/json', response_data)
-                client_socket.sendall(response_bytes)
-            # ...existing code...
-            elif method == 'GET':
-
-                    if path == '/':
-                        # Send a simple response for the root path
-                        response_content = "Render Sanity check!"
-                        response_bytes = format_http_response(200, 'text/plain', response_content)
-                        client_socket.sendall(response_bytes)
-                    elif path == '/health':
-                        print(f"[{threading.current_thread().name}] DEBUG: Processing /health request")
-                        try:
-                            
-                            print(f"[{threading.current_thread().name}] DEBUG: Processing /health get_is_alive")
-                            is_alive_val = get_is_alive()
-                            print(f"[{threading.current_thread().name}] DEBUG: Processing /health get_is_active")
-                            is_active_val = get_is_active()
-                            print(f"[{threading.current_thread().name}] DEBUG: State - alive={is_alive_val}, active={is_active_val}")
-                            response_data = {'status': 'alive' if is_alive_val else 'down', 'active': is_active_val}
-                            status_code = 200 if is_alive_val else 503
-                            print(f"[{threading.current_thread().name}] DEBUG: Response prepared - status={status_code}, data={response_data}")
-                            response_bytes = format_http_response(status_code, 'application/json', response_data)
-                            print(f"[{threading.current_thread().name}] DEBUG: Sending response, length={len(response_bytes)}")
-                            client_socket.sendall(response_bytes)
-                            print(f"[{threading.current_thread().name}] DEBUG: /health response sent successfully")
-                        except Exception as e:
-                            print(f"[{threading.current_thread().name}] ERROR in /health handler: {e}")
-                            import traceback 
-                            traceback.print_exc()
-                    elif path == "/home":
-                        html = "<html> <body>Chat</body> </html>"
-                        status_code = 200 
-                        response_bytes = format_http_response(status_code, 'text/html', html)
-                        client_socket.sendall(response_bytes)
-                    elif path.startswith('/subscribe/status'):
-                        # --- Long-Polling Logic with Group Support ---
-                        # Extract group from query parameters or use default
-                        group_name = "default"  # Default group
-                        if '?' in path:
-                            query_part = path.split('?', 1)[1]
-                            for param in query_part.split('&'):
-                                if param.startswith('group='):
-                                    group_name = param.split('=', 1)[1]
-                                    break
-                        
-                        print(f"[{threading.current_thread().name}] Client {addr} started long-polling for status changes in group '{group_name}'.")
-                        
-                        # Get or create the condition variable for this group
-                        group_condition = get_or_create_group_condition(group_name)
-                        
-                        # Acquire lock before waiting on condition. Wait up to 25 seconds.
-                        # The condition variable will release the lock while waiting and re-acquire it upon waking.
-                        with group_condition:
-                            # Wait for a notification OR for the timeout to expire
-                            # This returns True if notified, False if timed out.
-                            notified = group_condition.wait(timeout=25) 
-                        
-                        is_alive_val = get_is_alive() # Get latest state after waiting
-                        is_active_val = get_is_active() # Get latest state after waiting
-                    
-                        if notified:
-                            print(f"[{threading.current_thread().name}] Notified of state change for {addr} in group '{group_name}'. Sending current status.")
-                            response_data = {'status': 'alive' if is_alive_val else 'down', 'active': is_active_val, 'change': True, 'group': group_name}
-                            status_code = 200
-                            response_bytes = format_http_response(status_code, 'application/json', response_data)
-                            client_socket.sendall(response_bytes)
-                        else:
-                            print(f"[{threading.current_thread().name}] Long-poll timeout for {addr} in group '{group_name}'. No state change. Sending 204.")
-                            # Send 204 No Content if no change within timeout
-                            response_bytes = format_http_response(204, 'application/json', None) 
-                            client_socket.sendall(response_bytes)
-                    elif path.startswith('/subscribe/user'):
-                        # --- User-based Multi-Group Subscription ---
-                        # Extract user_id from query parameters
-                        user_id = None
-                        if '?' in path:
-                            query_part = path.split('?', 1)[1]
-                            for param in query_part.split('&'):
-                                if param.startswith('user_id='):
-                                    user_id = param.split('=', 1)[1]
-                                    break
-                        
-                        if not user_id: 
-                            status_code = 400
-                            response_data = {'error': 'user_id parameter is required'}
-                            response_bytes = format_http_response(status_code, 'application/json', response_data)
-                            client_socket.sendall(response_bytes)
-                        else:
-                            print(f"[{threading.current_thread().name}] Client {addr} started user-based long-polling for user '{user_id}'.")
-                            
-                            # Wait for notifications on any of the user's groups
-                            notified, notified_group, user_group_list = wait_for_user_group_notifications(user_id, timeout=25)
-                            
-                            is_alive_val = get_is_alive()
-                            is_active_val = get_is_active()
-
-                            if notified:
-                                print(f"[{threading.current_thread().name}] User '{user_id}' notified of change in group '{notified_group}'. Sending current status.")
-                                
-                                # Get recent messages from the notified group
-                                recent_messages = []
-                                if notified_group:
-                                    try:
-                                        with SessionLocal() as session:
-                                            group = session.query(Grupo).filter(Grupo.name == notified_group).first()
-                                            if group:
-                                                # Get the last 10 messages from this group
-                                                messages = session.query(Message).filter(
-                                                    Message.group_id == group.id
-                                                ).order_by(Message.timestamp.desc()).limit(10).all()
-                                                
-                                                recent_messages = [
-                                                    {
-                                                        'id': m.id,
-                                                        'sender': m.sender.username,
-                                                        'content': m.content,
-                                                        'timestamp': m.timestamp.isoformat(),
-                                                        'group_id': m.group_id,
-                                                        'group_name': group.name
-                                                    }
-                                                    for m in reversed(messages)  # Reverse to get chronological order
-                                                ]
-                                    except Exception as e: 
-                                        print(f"ERROR getting recent messages for group {notified_group}: {e}")
-                                
-                                response_data = { 
-                                    'change': True, 
-                                    'user_id': user_id,
-                                    'notified_group': notified_group,
-                                    'user_groups': user_group_list,
-                                    'recent_messages': recent_messages,
-                                    'messages_count': len(recent_messages)
-                                }
-                                status_code = 200
-                                response_bytes = format_http_response(status_code, 'application/json', response_data)
-                                client_socket.sendall(response_bytes)
-                            else:
-                                print(f"[{threading.current_thread().name}] Long-poll timeout for user '{user_id}'. No state change. Sending 204.")
-                                response_bytes = format_http_response(204, 'application/json', None)
-                                client_socket.sendall(response_bytes)
-                    else: # Unhandled GET paths
-                            if get_is_alive() and get_is_active():
-                                status_code = 404
-                                response_data = {'error': 'Not Found'}
-                            else:
-                                status_code = 503
-                                response_data = {'error': 'system not available'}
-                            response_bytes = format_http_response(status_code, 'application/json', response_data)
-                            client_socket.sendall(response_bytes)
-            elif method == 'POST':
-                if path == '/fall':
-                    set_is_alive(False) # This will trigger notify_clients_of_state_change()
-                    set_is_active(False) # This will trigger notify_clients_of_state_change()
-                    print(f"[{threading.current_thread().name}] System status set to DOWN (isAlive=False, isActive=False).")
-                    response_data = {'status': 'system down', 'active': get_is_active()}
-                elif path == '/revive':
-                    set_is_alive(True) # This will trigger notify_clients_of_state_change()
-                    print(f"[{threading.current_thread().name}] System status set to REVIVED (isAlive=True).")
-                    response_data = {'status': 'system revived', 'active': get_is_active()}
-                elif path.startswith('/notify/'):
-                    # New endpoint to trigger notifications for specific groups
-                    # Example: POST /notify/group1 or POST /notify/all
-                    path_parts = path.split('/')
-                    if len(path_parts) >= 3:
-                        group_target = path_parts[2]
-                        if group_target == 'all':
-                            notify_clients_of_state_change()  # Notify all groups
-                            print(f"[{threading.current_thread().name}] Triggered notification for ALL groups.")
-                            response_data = {'message': 'notification sent to all groups'}
-                        else:
-                            notify_clients_of_state_change(group_target)  # Notify specific group
-                            print(f"[{threading.current_thread().name}] Triggered notification for group '{group_target}'.")
-                            response_data = {'message': f'notification sent to group {group_target}'}
-                    else:
-                        status_code = 400
-                        response_data = {'error': 'Invalid notify path. Use /notify/{group_name} or /notify/all'}
-                
-                else: # Unhandled POST paths
-                    if get_is_alive() and get_is_active():
-                        status_code = 404
-                        response_data = {'error': 'Not Found'}
-                    else:
-                        status_code = 503
-                        response_data = {'error': 'system not available'}
-                response_bytes = format_http_response(status_code, 'application/json', response_data)
-                client_socket.sendall(response_bytes)
-            elif method == 'OPTIONS': # <-- CORS Preflight requests
-                # Handle CORS preflight requests
-                print(f"[{threading.current_thread().name}] DEBUG: Processing OPTIONS request for CORS preflight")
-                # Return 200 OK with CORS headers (no body needed)
-                response_bytes = format_http_response(200, 'text/plain', None)
-                client_socket.sendall(response_bytes)
-                print(f"[{threading.current_thread().name}] DEBUG: OPTIONS response sent successfully")
-            elif method == 'HEAD': # <-- NOVO BLOCO PARA HEAD
-                if path == '/health':
-                    print(f"[{threading.current_thread().name}] DEBUG: Processing HEAD /health request (for health check)")
-                    is_alive_val = get_is_alive()
-                    is_active_val = get_is_active()
-                    # A resposta HEAD não tem corpo, mas os cabeçalhos são os mesmos do GET
-                    # format_http_response já lida com body_data=None para 204. Para HEAD, podemos enviar
-                    # um corpo vazio, mas o importante é que o método HEAD NÃO TEM CORPO.
-                    # O status code deve ser o mesmo do GET /health.
-                    status_code = 200 if is_alive_val else 503
-                    
-                    # Para HEAD, o corpo deve ser vazio, mas Content-Length deve ser 0
-                    # Modifique format_http_response para lidar com isso explicitamente se necessário.
-                    # No seu format_http_response atual, se body_data é None, body_bytes será b"", o que é bom.
-                    response_bytes = format_http_response(status_code, 'application/json', None) # Sem corpo para HEAD
-                    
-                    # Certifique-se de que o Content-Length seja 0 para HEAD
-                    # format_http_response já calcula isso com len(body_bytes)
-                    client_socket.sendall(response_bytes)
-                    print(f"[{threading.current_thread().name}] DEBUG: HEAD /health response sent successfully")
-                elif path == '/': # Plataformas podem checar a raiz com HEAD
-                    # Se o sistema está ok, responda 200 OK com corpo vazio para HEAD /
-                    if get_is_alive() and get_is_active():
-                        status_code = 200
-                        response_data = None # Sem corpo para HEAD
-                    else: # Se o sistema não está ativo, retorne 503 mesmo para HEAD /
-                        status_code = 503
-                        response_data = {'error': 'system not available'} # Pode ou não ter corpo dependendo da plataforma
-                    response_bytes = format_http_response(status_code, 'application/json', response_data)
-                    client_socket.sendall(response_bytes)
-                else: # Unhandled HEAD paths
-                    if get_is_alive() and get_is_active():
-                        status_code = 404
-                        response_data = {'error': 'Not Found'}
-                    else:
-                        status_code = 503
-                        response_data = {'error': 'system not available'}
-                    response_bytes = format_http_response(status_code, 'application/json', response_data)
-                    client_socket.sendall(response_bytes) 
-            else: # Unhandled methods
-                if get_is_alive() and get_is_active():
-                    status_code = 404
-                    response_data = {'error': 'Not Found'}
+            handler = ROUTES.get((method, base_path))
+            if handler is None:
+                if method == 'OPTIONS': # CORS preflight, any path
+                    handler = handle_options
+                elif method == 'POST' and base_path.startswith('/notify/'):
+                    handler = handle_notify
                 else:
-                    status_code = 503
-                    response_data = {'error': 'system not available'}
-                response_bytes = format_http_response(status_code, 'application/json', response_data)
-                client_socket.sendall(response_bytes)
+                    handler = handle_unhandled
+            # The /subscribe/* handlers return True when they handed the socket to long_poller
+            handed_off = bool(handler(client_socket, addr, request_info))
 
         except ValueError as e:
-            print(f"[{threading.current_thread().name}] ERROR: Bad Request from {addr}: {e}")
-            response_bytes = format_http_response(400, 'application/json', {'error': 'Bad Request'})
-            client_socket.sendall(response_bytes)
+            keep_alive = False
+            log.error("Bad Request from %s: %s", addr, e)
+            send_http_response(client_socket, 400, 'application/json', {'error': 'Bad Request'}, close=True)
         except socket.timeout:
-            print(f"[{threading.current_thread().name}] ERROR: Socket timeout for {addr} (initial read).")
+            keep_alive = False
+            log.error("Socket timeout for %s (initial read).", addr)
         except Exception as e:
-            print(f"[{threading.current_thread().name}] ERROR: Exception handling client {addr}: {e}")
-            import traceback
-            traceback.print_exc()
+            keep_alive = False
+            log.exception("Exception handling client %s: %s", addr, e)
             try:
-                response_bytes = format_http_response(500, 'application/json', {'error': 'Internal Server Error'})
-                client_socket.sendall(response_bytes)
+                send_http_response(client_socket, 500, 'application/json', {'error': 'Internal Server Error'}, close=True)
             except:
-                print(f"[{threading.current_thread().name}] ERROR: Failed to send error response to {addr}")
-        # Adiciona um pequeno atraso antes de fechar o socket (pode ajudar com proxies)
-        time.sleep(0.1) 
-        
+                log.error("Failed to send error response to %s", addr)
     except Exception as e:
-        print(f"Error handling client {addr}: {e}")
+        keep_alive = False
+        log.error("Error handling client %s: %s", addr, e)
     finally:
-        print(f"[{threading.current_thread().name}] DEBUG: Closing connection with {addr}.")
-        try:
-            client_socket.close()
-        except:
-            print(f"[{threading.current_thread().name}] ERROR: Failed to close socket for {addr}")
+        if keep_alive and not handed_off:
+            return_connection(client_socket, addr, pipelined)
+        elif not handed_off:
+            log.debug("Closing connection with %s.", addr)
+            try:
+                # close() waits up to 1s for the response to leave the send buffer (replaces the old 100ms sleep)
+                client_socket.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, LINGER_ON_CLOSE)
+                client_socket.close()
+            except:
+                log.error("Failed to close socket for %s", addr)
 
 # --- User-Group Management ---
 # Database-based user group management (replaces in-memory dictionary)
@@ -930,15 +1413,15 @@ def get_user_groups(user_id):
     Returns a set of group names.
     """
     try:
-        with SessionLocal() as session:
-            user = session.query(User).filter(User.id == user_id).first()
+        with read_session() as session:
+            user = session.get(User, user_id)
             if user:
                 group_names = {group.name for group in user.groups}
                 return group_names
             else:
                 return set()
     except Exception as e:
-        print(f"ERROR getting user groups for user {user_id}: {e}")
+        log.error("getting user groups for user %s: %s", user_id, e)
         return set()
 
 def add_user_to_group(user_id, group_name):
@@ -947,23 +1430,24 @@ def add_user_to_group(user_id, group_name):
     """
     try:
         with SessionLocal() as session:
-            user = session.query(User).filter(User.id == user_id).first()
+            user = session.get(User, user_id)
             group = session.query(Grupo).filter(Grupo.name == group_name).first()
             
             if user and group:
                 if group not in user.groups:
                     user.groups.append(group)
                     session.commit()
-                    print(f"DEBUG: Added user {user_id} to group {group_name}")
+                    membership_changed()
+                    log.debug("Added user %s to group %s", user_id, group_name)
                     return True
                 else:
-                    print(f"DEBUG: User {user_id} already in group {group_name}")
+                    log.debug("User %s already in group %s", user_id, group_name)
                     return True
             else:
-                print(f"DEBUG: User {user_id} or group {group_name} not found")
+                log.debug("User %s or group %s not found", user_id, group_name)
                 return False
     except Exception as e:
-        print(f"ERROR adding user {user_id} to group {group_name}: {e}")
+        log.error("adding user %s to group %s: %s", user_id, group_name, e)
         return False
 
 def remove_user_from_group(user_id, group_name):
@@ -972,23 +1456,24 @@ def remove_user_from_group(user_id, group_name):
     """
     try:
         with SessionLocal() as session:
-            user = session.query(User).filter(User.id == user_id).first()
+            user = session.get(User, user_id)
             group = session.query(Grupo).filter(Grupo.name == group_name).first()
             
             if user and group:
                 if group in user.groups:
                     user.groups.remove(group)
                     session.commit()
-                    print(f"DEBUG: Removed user {user_id} from group {group_name}")
+                    membership_changed()
+                    log.debug("Removed user %s from group %s", user_id, group_name)
                     return True
                 else:
-                    print(f"DEBUG: User {user_id} not in group {group_name}")
+                    log.debug("User %s not in group %s", user_id, group_name)
                     return True
             else:
-                print(f"DEBUG: User {user_id} or group {group_name} not found")
+                log.debug("User %s or group %s not found", user_id, group_name)
                 return False
     except Exception as e:
-        print(f"ERROR removing user {user_id} from group {group_name}: {e}")
+        log.error("removing user %s from group %s: %s", user_id, group_name, e)
         return False
 
 def set_user_groups(user_id, group_names):
@@ -997,7 +1482,7 @@ def set_user_groups(user_id, group_names):
     """
     try:
         with SessionLocal() as session:
-            user = session.query(User).filter(User.id == user_id).first()
+            user = session.get(User, user_id)
             if user:
                 # Clear existing groups
                 user.groups.clear()
@@ -1008,16 +1493,17 @@ def set_user_groups(user_id, group_names):
                     if group:
                         user.groups.append(group)
                     else:
-                        print(f"DEBUG: Group {group_name} not found when setting user groups")
+                        log.debug("Group %s not found when setting user groups", group_name)
                 
                 session.commit()
-                print(f"DEBUG: Set user {user_id} groups to: {group_names}")
+                membership_changed()
+                log.debug("Set user %s groups to: %s", user_id, group_names)
                 return True
             else:
-                print(f"DEBUG: User {user_id} not found")
+                log.debug("User %s not found", user_id)
                 return False
     except Exception as e:
-        print(f"ERROR setting user groups for user {user_id}: {e}")
+        log.error("setting user groups for user %s: %s", user_id, e)
         return False
 
 def get_all_users_in_group(group_name):
@@ -1026,7 +1512,7 @@ def get_all_users_in_group(group_name):
     Returns a list of user IDs as strings.
     """
     try:
-        with SessionLocal() as session:
+        with read_session() as session:
             group = session.query(Grupo).filter(Grupo.name == group_name).first()
             if group:
                 user_ids = [str(member.id) for member in group.members]
@@ -1034,7 +1520,7 @@ def get_all_users_in_group(group_name):
             else:
                 return []
     except Exception as e:
-        print(f"ERROR getting users in group {group_name}: {e}")
+        log.error("getting users in group %s: %s", group_name, e)
         return []
 
 def get_all_user_groups():
@@ -1042,7 +1528,7 @@ def get_all_user_groups():
     Returns a dictionary of all user-group mappings from the database.
     """
     try:
-        with SessionLocal() as session:
+        with read_session() as session:
             user_groups_dict = {}
             users = session.query(User).all()
             for user in users:
@@ -1051,99 +1537,9 @@ def get_all_user_groups():
                     user_groups_dict[str(user.id)] = group_names
             return user_groups_dict
     except Exception as e:
-        print(f"ERROR getting all user groups: {e}")
+        log.error("getting all user groups: %s", e)
         return {}
 
-def wait_for_user_group_notifications(user_id, timeout=25):
-    """
-    Waits for notifications on any of the groups that a user belongs to.
-    Returns (notified, group_that_notified, user_groups).
-    """
-    user_group_list = list(get_user_groups(user_id))
-    
-    if not user_group_list:
-        # User has no groups, return immediately
-        print(f"DEBUG: User {user_id} has no groups to wait on.")
-        return False, None, []
-    
-    # Create condition variables for all user groups
-    conditions = []
-    for group_name in user_group_list:
-        print('DEBUG: Waiting on group condition for:', group_name)
-        conditions.append(get_or_create_group_condition(group_name))
-    
-    # Use a shared event to coordinate between multiple condition waits
-    notification_event = threading.Event()
-    # Use a list to share the notified group name between threads
-    notified_group_container = [None]
-    
-    def wait_on_condition(condition, group_name):
-        """Helper function to wait on a single condition"""
-        try:
-            with condition:
-                if condition.wait(timeout=timeout):
-                    notified_group_container[0] = group_name
-                    print(f"DEBUG: Notified for group {group_name}")
-                    notification_event.set()
-        except Exception as e: 
-            print(f"Error waiting on condition for group {group_name}: {e}")
-    
-    # Start threads to wait on each condition
-    wait_threads = []
-    for condition, group_name in zip(conditions, user_group_list):
-        thread = threading.Thread(
-            target=wait_on_condition, 
-            args=(condition, group_name),
-            name=f"GroupWaiter-{group_name}"
-        )
-        thread.daemon = True
-        thread.start()
-        wait_threads.append(thread)
-    
-    # Wait for either a notification or timeout
-    notified = notification_event.wait(timeout=timeout)
-    
-    # Clean up - try to join threads quickly
-    for thread in wait_threads:
-        thread.join(timeout=0.1)
-    
-    # Get the notified group from the container
-    notified_group = notified_group_container[0]
-    print(f"DEBUG: Final notified_group value: {notified_group}")
-    
-    return notified, notified_group, user_group_list
-
-# --- Enhanced Group Functions ---
-
-def enhanced_notify_clients_of_state_change(group_name=None):
-    """
-    Enhanced notification function that also considers user-group memberships.
-    Notifies all threads waiting on condition variables that a state has changed.
-    If group_name is specified, only notifies that specific group.
-    If group_name is None, notifies all groups.
-    """
-    with group_conditions_lock:
-        if group_name:
-            # Notify only the specific group
-            if group_name in group_conditions:
-                with group_conditions[group_name]:
-                    group_conditions[group_name].notify_all()
-            
-            # Also notify users in this group
-            users_in_group = get_all_users_in_group(group_name)
-            for user_id in users_in_group:
-                user_groups = get_user_groups(user_id)
-                for user_group in user_groups:
-                    if user_group != group_name: # Avoid notifying the same group twice
-                        with group_conditions[user_group]:
-                            group_conditions[user_group].notify_all()
-        else:
-            # Notify all groups
-            for condition in group_conditions.values():
-                with condition:
-                    condition.notify_all()
-
-
 # Test function to verify HTTP response format
 def test_format_http_response():
     """Test the HTTP response formatting function"""
@@ -1165,110 +1561,285 @@ def sync_user_groups_from_database(user_id):
     """
     try:
         group_names = list(get_user_groups(user_id))
-        print(f"DEBUG: User {user_id} groups from database: {group_names}")
+        log.debug("User %s groups from database: %s", user_id, group_names)
         return group_names
     except Exception as e:
-        print(f"ERROR syncing user groups for user {user_id}: {e}")
+        log.error("syncing user groups for user %s: %s", user_id, e)
         return []
 
 def notify_group_of_change(group_name):
     """
     Notifies a specific group of changes (like new messages).
     """
-    print(f"DEBUG: Notifying group '{group_name}' of changes")
+    log.debug("Notifying group '%s' of changes", group_name)
     notify_clients_of_state_change(group_name)
 
 
 
 # --- Main Server Loop ---
+READ_TIMEOUT = 10 # Seconds a client has to send its request headers
+KEEP_ALIVE_TIMEOUT = int(os.getenv('KEEP_ALIVE_TIMEOUT', 5)) # Seconds an idle keep-alive connection is kept open
+READ_BUFFER_SIZE = 8192 # Bytes read per recv_into
+
+# Keep-alive connections come back from the worker pool and long_poller through this
+# queue; writing a byte to the socket pair wakes the event loop to register them again
+returned_connections = queue.SimpleQueue()
+_return_wake_reader, _return_wake_writer = socket.socketpair()
+_return_wake_reader.setblocking(False)
+_return_wake_writer.setblocking(False)
+
+def return_connection(conn, addr, leftover=b''):
+    """Gives an answered keep-alive connection back to the event loop, which waits for its next request.
+    leftover holds bytes of that request the client already sent (pipelined while it was parked)."""
+    returned_connections.put((conn, addr, bytes(leftover)))
+    try:
+        _return_wake_writer.send(b'\0')
+    except OSError:
+        pass # Buffer full: a wake-up is already pending
+
+# Requests are handled on a fixed pool of threads. Long-polls wait on long_poller,
+# not on a worker, but handlers still block on the database, so the pool is sized
+# well above the core count.
+MAX_WORKERS = int(os.getenv('MAX_WORKERS', max(32, 4 * (os.cpu_count() or 1))))
+MAX_QUEUED_REQUESTS = int(os.getenv('MAX_QUEUED_REQUESTS', 64)) # Beyond this, shed load with 503
+request_executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="ClientHTTPHandler")
+request_slots = threading.BoundedSemaphore(MAX_WORKERS + MAX_QUEUED_REQUESTS)
+BUSY_RESPONSE = format_http_response(503, 'application/json', {'error': 'server busy'}, close=True)
+
+def run_in_slot(fn, *args):
+    """Runs fn on a pool worker and frees the request slot taken for it afterwards."""
+    try:
+        fn(*args)
+    finally:
+        request_slots.release()
+
+def dispatch_request(conn, addr, raw_request_data, collector=None, pipelined=b""):
+    """Hands a fully read request to the worker pool (routes block on the DB).
+    pipelined holds the bytes that followed it, handed back with the connection for the next request."""
+    if not request_slots.acquire(blocking=False):
+        log.debug("Too many requests in flight, rejecting %s with 503", addr)
+        try:
+            write_once(conn, BUSY_RESPONSE)
+        except OSError:
+            pass
+        conn.close()
+        return
+    request_executor.submit(run_in_slot, handle_client, conn, addr, raw_request_data, collector, pipelined)
+
+def new_collector():
+    """A RequestCollector for a new connection, or None without httptools."""
+    return RequestCollector() if httptools is not None else None
+
+def read_client_data(selector, conn, pending, read_view):
+    """
+    Called by the event loop when a client socket is readable.
+    Feeds the data to the connection's httptools parser and dispatches the request
+    once it is complete, body included. Without httptools (or if it rejects the
+    request) the data is buffered until the headers and their Content-Length body are in.
+    read_view is the event loop's reusable receive buffer: recv_into fills it
+    without allocating a bytes object per read.
+    """
+    try:
+        n = conn.recv_into(read_view)
+    except (BlockingIOError, InterruptedError):
+        return
+    except OSError as e:
+        log.debug("Error reading from %s: %s", pending[conn][0], e)
+        n = 0
+    
+    if n and not buffer_client_data(conn, pending, read_view[:n]):
+        return # Request not complete yet, wait for more data
+    finish_client_read(selector, conn, pending)
+
+def buffer_client_data(conn, pending, chunk):
+    """Adds chunk to conn's pending request. Returns True once the request is complete, body included."""
+    addr, buffer, deadline, collector, request_end = pending[conn]
+    buffer += chunk
+    scan_from = len(buffer) - len(chunk) - 3 # Only the new bytes (and a possibly split CRLFCRLF)
+    if collector is not None:
+        try:
+            collector.feed(chunk)
+        except httptools.HttpParserError:
+            collector = None # Let the regex parser deal with it
+            scan_from = 0 # The regex path has not looked at this buffer yet
+    if collector is not None:
+        return collector.message_complete
+    if request_end is None:
+        request_end = find_request_end(buffer, scan_from, len(buffer))
+        pending[conn] = (addr, buffer, deadline, collector, request_end)
+    return request_end is not None and len(buffer) >= request_end
+
+def finish_client_read(selector, conn, pending):
+    """Stops reading conn and hands what it sent to the worker pool (or closes it when it sent nothing)."""
+    addr, buffer, _, collector, request_end = pending[conn]
+    selector.unregister(conn)
+    del pending[conn]
+    if not buffer:
+        log.debug("No data from %s, closing.", addr)
+        conn.close()
+        return
+    if collector is not None and collector.message_complete:
+        if 'transfer-encoding' in collector.headers:
+            # A chunked body's end is not known here, so what follows cannot be split off: answer and close
+            request_end = None
+            if collector.next_request:
+                collector.keep_alive = False
+        else:
+            request_end = find_request_end(buffer, 0, len(buffer))
+    # Bytes past the end of the request belong to the client's next (pipelined) request
+    pipelined = b""
+    if request_end is not None and len(buffer) > request_end:
+        pipelined = bytes(buffer[request_end:])
+        del buffer[request_end:]
+    conn.setblocking(True) # The handler thread uses blocking sends
+    dispatch_request(conn, addr, bytes(buffer), collector, pipelined)
+
+def register_returned_connections(selector, pending):
+    """Event loop side of return_connection: waits for the next request on each returned connection."""
+    try:
+        while _return_wake_reader.recv(4096):
+            pass
+    except BlockingIOError:
+        pass
+    deadline = time.monotonic() + KEEP_ALIVE_TIMEOUT
+    while True:
+        try:
+            conn, addr, leftover = returned_connections.get_nowait()
+        except queue.Empty:
+            return
+        conn.setblocking(False)
+        pending[conn] = (addr, bytearray(), deadline, new_collector(), None)
+        selector.register(conn, selectors.EVENT_READ)
+        if leftover and buffer_client_data(conn, pending, leftover):
+            finish_client_read(selector, conn, pending) # Already complete: no read event would come for it
+
+def expire_idle_clients(selector, pending):
+    """Closes connections that did not send their request within READ_TIMEOUT (KEEP_ALIVE_TIMEOUT once idle)."""
+    now = time.monotonic()
+    for conn in [c for c, (_, _, deadline, _, _) in pending.items() if deadline < now]:
+        addr, buffer, _, collector, _ = pending.pop(conn)
+        selector.unregister(conn)
+        log.debug("Socket timeout while reading from %s", addr)
+        if buffer:
+            conn.setblocking(True)
+            dispatch_request(conn, addr, bytes(buffer), collector) # Same as before: handle what was received
+        else:
+            conn.close()
+
 def start_server_manual_http():
     """
-    Starts the HTTP server using raw sockets and a while True loop.
-    Each incoming connection is handled in a new thread.
+    Starts the HTTP server using raw sockets and a selectors event loop
+    (epoll on Linux). Connections are accepted and read without a thread each;
+    once a request is complete it is handled on the bounded worker pool.
     """
     port = int(os.getenv('PORT', 8082))
     host = '0.0.0.0' # Listen on all interfaces
 
-    print(f"DEBUG: Starting server initialization...")
-    print(f"DEBUG: Environment PORT={os.getenv('PORT')}, using port={port}")
-    print(f"DEBUG: Binding to host={host}")
+    log.debug("Starting server initialization...")
+    log.debug("Environment PORT=%s, using port=%s", os.getenv('PORT'), port)
+    log.debug("Binding to host=%s", host)
 
     server_socket = None
     try:
-        print(f"DEBUG: Creating socket...")
+        log.debug("Creating socket...")
         server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if hasattr(socket, 'SO_REUSEPORT'):
+            # Lets several server processes bind the same port; the kernel spreads connections across them
+            server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
         
-        print(f"DEBUG: Attempting to bind to {host}:{port}")
+        log.debug("Attempting to bind to %s:%s", host, port)
         server_socket.bind((host, port))
         
-        print(f"DEBUG: Starting to listen...")
+        log.debug("Starting to listen...")
         server_socket.listen(5) # Max 5 queued connections
         
-        print(f"SUCCESS: HTTP Server listening on http://{host}:{port}/")
-        print(f"DEBUG: Server ready to accept connections")
-
-        while True: # Main loop for accepting connections
-            print(f"DEBUG: Waiting for connection...")
-            conn, addr = server_socket.accept() # Blocks until a new connection
-            print(f"DEBUG: Accepted connection from {addr}")
-            
-            client_thread = threading.Thread(target=handle_client, args=(conn, addr), name=f"ClientHTTPHandler-{addr[0]}:{addr[1]}")
-            # The client threads are daemon threads, meaning they will not prevent the main program from exiting
-            # if only daemon threads are left. This is suitable for server handlers.
-            client_thread.daemon = True 
-            client_thread.start()
-            print(f"DEBUG: Started thread {client_thread.name} for {addr}")
+        log.info("SUCCESS: HTTP Server listening on http://%s:%s/", host, port)
+        log.debug("Server ready to accept connections")
+
+        server_socket.setblocking(False)
+        selector = selectors.DefaultSelector()
+        selector.register(server_socket, selectors.EVENT_READ)
+        selector.register(_return_wake_reader, selectors.EVENT_READ)
+        pending = {} # conn -> (addr, request buffer, read deadline, RequestCollector or None, request end for the regex parser)
+        read_view = memoryview(bytearray(READ_BUFFER_SIZE)) # Shared by every read on this thread
+        if not long_poller.is_alive():
+            long_poller.start()
+
+        while True: # Event loop: accept connections and read requests
+            for key, _ in selector.select(timeout=1):
+                if key.fileobj is server_socket:
+                    try:
+                        conn, addr = server_socket.accept()
+                    except (BlockingIOError, InterruptedError):
+                        continue
+                    # Each handler writes one short response: send it right away instead of letting Nagle hold it
+                    conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                    # Lets the kernel detect clients that disappeared without closing the connection
+                    conn.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+                    conn.setblocking(False)
+                    log.debug("Accepted connection from %s", addr)
+                    pending[conn] = (addr, bytearray(), time.monotonic() + READ_TIMEOUT, new_collector(), None)
+                    selector.register(conn, selectors.EVENT_READ)
+                elif key.fileobj is _return_wake_reader:
+                    register_returned_connections(selector, pending)
+                else:
+                    read_client_data(selector, key.fileobj, pending, read_view)
+            expire_idle_clients(selector, pending)
 
     except OSError as e:
         if e.errno == 98:
-            print(f"Erro: Porta {port} já em uso. Tente novamente mais tarde ou use outra porta.")
+            log.error("Erro: Porta %s já em uso. Tente novamente mais tarde ou use outra porta.", port)
         else:
-            print(f"Erro de OSError no servidor: {e}")
+            log.error("Erro de OSError no servidor: %s", e)
     except KeyboardInterrupt:
-        print("\nServer shutting down due to user interrupt.")
+        log.info("Server shutting down due to user interrupt.")
     except Exception as e:
-        print(f"Erro inesperado no servidor: {e}")
+        log.error("Erro inesperado no servidor: %s", e)
     finally:
         if server_socket:
-            print("Servidor encerrando. Fechando o socket do servidor.")
+            log.info("Servidor encerrando. Fechando o socket do servidor.")
             server_socket.close()
 
 # --- Main Execution Block ---
 if __name__ == '__main__':
-    print("="*50)
-    print("DEBUG: Application starting...")
-    print(f"DEBUG: Python version: {os.sys.version}")
-    print(f"DEBUG: Current working directory: {os.getcwd()}")
-    print(f"DEBUG: Environment variables:")
-    print(f"  PORT: {os.getenv('PORT', 'NOT SET')}")
-    print(f"  IS_ACTIVE: {os.getenv('IS_ACTIVE', 'NOT SET')}")
-    print(f"  PEER_URL: {os.getenv('PEER_URL', 'NOT SET')}")
-    print("="*50)
+    logging.basicConfig(
+        level=os.getenv('LOG_LEVEL', 'INFO').upper(),
+        format='%(asctime)s %(levelname)s [%(threadName)s] %(message)s',
+    )
+    log.debug("Application starting...")
+    log.debug("Python version: %s", sys.version)
+    # On a free-threaded build (python3.13t) the handler threads run in parallel. State shared
+    # between threads is only touched under state_lock or through thread-safe queues, so nothing
+    # relies on the GIL; an extension module without free-threading support re-enables it at import.
+    log.info("GIL enabled: %s", getattr(sys, '_is_gil_enabled', lambda: True)())
+    log.debug("Current working directory: %s", os.getcwd())
+    log.debug("Environment variables:")
+    log.info("  PORT: %s", os.getenv('PORT', 'NOT SET'))
+    log.info("  IS_ACTIVE: %s", os.getenv('IS_ACTIVE', 'NOT SET'))
+    log.info("  PEER_URL: %s", os.getenv('PEER_URL', 'NOT SET'))
     
-    print(f"Initial State from Environment: IS_ACTIVE={os.getenv('IS_ACTIVE')}, PEER_URL={_peer_url}")
-    print(f"Parsed Initial State: isAlive={get_is_alive()}, isActive={get_is_active()}")
+    log.info("Initial State from Environment: IS_ACTIVE=%s, PEER_URL=%s", os.getenv('IS_ACTIVE'), _peer_url)
+    log.info("Parsed Initial State: isAlive=%s, isActive=%s", get_is_alive(), get_is_active())
     
     # Initialize Sync Manager
     sync_manager = SyncManager(get_is_alive, set_is_active, get_is_active, _peer_url)
     if _peer_url:
-        print(f"DEBUG: Starting SyncManager with peer URL: {_peer_url}")
+        log.debug("Starting SyncManager with peer URL: %s", _peer_url)
         sync_manager.start()
     else:
-        print("DEBUG: No PEER_URL set, skipping SyncManager")
+        log.debug("No PEER_URL set, skipping SyncManager")
 
     try:
-        print("DEBUG: About to start HTTP server...")
+        log.debug("About to start HTTP server...")
         start_server_manual_http()
     except Exception as e:
-        print(f"FATAL ERROR: Exception in main: {e}")
-        import traceback
-        traceback.print_exc()
+        log.exception("Exception in main: %s", e)
     finally:
         if _peer_url:
-            print("Stopping SyncManager thread...")
+            log.info("Stopping SyncManager thread...")
             sync_manager.stop()
             sync_manager.join(timeout=2)
-            print("SyncManager thread stopped.")
-        print("Application shut down cleanly.")
+            log.info("SyncManager thread stopped.")
+        log.info("Application shut down cleanly.")
 
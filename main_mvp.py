@@ -1,8 +1,8 @@
 # main.py (VERSÃO ULTRA-SIMPLIFICADA PARA TESTE DE CONECTIVIDADE)
 import os
 import socket
+import struct
 import threading
-import time # Para um pequeno atraso
 
 # Configuração da porta
 PORT = int(os.environ.get('PORT'))
@@ -11,11 +11,20 @@ HOST = '0.0.0.0'
 # Resposta HTTP fixa para qualquer requisição
 FIXED_RESPONSE = b"HTTP/1.1 200 OK\r\n" \
                  b"Content-Type: text/plain\r\n" \
-                 b"Content-Length: 12\r\n" \
+                 b"Content-Length: 13\r\n" \
                  b"Connection: close\r\n" \
                  b"\r\n" \
                  b"Hello Render!"
 
+# SO_LINGER ligado com timeout de 1 segundo
+LINGER_ON_CLOSE = struct.pack('ii', 1, 1)
+
+def write_once(client_socket, data):
+    """Envia a resposta com um único send(); sendall só para o que sobrar."""
+    sent = client_socket.send(data)
+    if sent < len(data):
+        client_socket.sendall(memoryview(data)[sent:])
+
 # Handler de cliente
 def handle_client(client_socket, addr):
     try:
@@ -24,10 +33,7 @@ def handle_client(client_socket, addr):
         print(f"Received request from {addr}. Sending fixed response.")
         
         # Envia a resposta fixa
-        client_socket.sendall(FIXED_RESPONSE)
-        
-        # Adiciona um pequeno atraso antes de fechar o socket (pode ajudar com proxies)
-        time.sleep(0.1) 
+        write_once(client_socket, FIXED_RESPONSE)
         
     except Exception as e:
         print(f"Error handling client {addr}: {e}")
@@ -45,6 +51,10 @@ def start_server():
 
     while True:
         conn, addr = server_socket.accept()
+        # Resposta curta e única: envia imediatamente, sem esperar o Nagle
+        conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        # O close() espera até 1s a resposta sair do buffer (em vez do antigo sleep de 100ms)
+        conn.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, LINGER_ON_CLOSE)
         thread = threading.Thread(target=handle_client, args=(conn, addr))
         thread.daemon = True
         thread.start()